@@ -0,0 +1,93 @@
+"""
+Cost of pretty-printing a transformation result: minidom against Saxon's indentation.
+
+The backend used to re-parse every result with minidom to indent it; it now lets Saxon's
+serializer indent the result of the last stage, and only when pretty output is requested.
+This reproduces the comparison on the draw.io models of semantics/draw.io_models and on the
+example models, in-process through run_pipeline:
+
+- xslt:         the transformation, serialized without indentation
+- +minidom:     the same, then minidom.parseString(...).toprettyxml()
+- saxon indent: the transformation with pretty=True (Saxon's !indent property)
+
+The PIM models run PIM-PSM.xsl; the CIM model runs CIM-PIM.xsl + CIM-PIM-Aux.xsl.
+
+Usage:
+    python pretty_output.py                 # median of 15 rounds per model
+    python pretty_output.py --rounds 7 --json pretty_output.json
+"""
+import argparse
+import glob
+import json
+import os
+from xml.dom import minidom
+
+from run_benchmarks import measure
+from synthetic_models import REPO_DIR, XSL_DIR
+
+DRAWIO_DIR = os.path.join(REPO_DIR, 'semantics', 'draw.io_models')
+EXAMPLE_DIR = os.path.join(REPO_DIR, 'example', 'models')
+
+PIM_PSM = (["PIM-PSM.xsl"], {"platform": "arduino", "comm_tech": "mqtt"})
+CIM_PIM = (["CIM-PIM.xsl", "CIM-PIM-Aux.xsl"], {})
+
+
+def models():
+    """(label, path, stylesheet names, parameters) of every model compared."""
+    for path in sorted(glob.glob(os.path.join(DRAWIO_DIR, 'PIM_*.xml'))):
+        yield (os.path.basename(path), path) + PIM_PSM
+    yield ("example 03-PIM (PrePSM)", os.path.join(EXAMPLE_DIR, '03-PIM-Greenhouse-PrePSM-UserInputApplied.xml')) + PIM_PSM
+    yield ("example 01-CIM (PrePIM)", os.path.join(EXAMPLE_DIR, '01-CIM-Greenhouse-PrePIM-UserInputApplied.xml')) + CIM_PIM
+
+
+def compare(processor, stylesheet_cache, input_xml, stylesheets, parameters, rounds):
+    from pipeline import run_pipeline
+
+    def xslt(pretty=False):
+        return run_pipeline(processor, stylesheet_cache, input_xml, stylesheets, parameters, pretty=pretty)
+
+    return {
+        "xslt": measure(xslt, rounds),
+        "minidom": measure(lambda: minidom.parseString(xslt()).toprettyxml(), rounds),
+        "saxon_indent": measure(lambda: xslt(pretty=True), rounds),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare minidom pretty-printing with Saxon's indentation.")
+    parser.add_argument("--rounds", type=int, default=15, help="Timed rounds per model and variant (default: 15)")
+    parser.add_argument("--json", metavar="PATH", help="Also write the timings to PATH as JSON")
+    args = parser.parse_args()
+
+    from pipeline import new_processor
+    from stylesheet_cache import StylesheetCache
+
+    processor = new_processor()
+    stylesheet_cache = StylesheetCache(processor)
+    results = {}
+
+    print(f"Median wall time in ms over {args.rounds} rounds")
+    print(f"{'model':<30} {'KB':>4} {'xslt':>8} {'+minidom':>9} {'saxon indent':>13}")
+    for label, path, names, parameters in models():
+        with open(path, encoding='utf-8') as file:
+            input_xml = file.read()
+        stylesheets = []
+        for name in names:
+            with open(os.path.join(XSL_DIR, name), encoding='utf-8') as file:
+                stylesheets.append(file.read())
+
+        timings = compare(processor, stylesheet_cache, input_xml, stylesheets, parameters, args.rounds)
+        results[label] = dict(timings, kilobytes=round(len(input_xml.encode('utf-8')) / 1024, 1))
+        median = {variant: stats["median"] * 1000 for variant, stats in timings.items()}
+        print(f"{label:<30} {results[label]['kilobytes']:>4.0f} {median['xslt']:>8.1f} {median['minidom']:>9.1f}"
+              f" {median['saxon_indent']:>13.1f}")
+
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump(results, file, indent=2)
+            file.write("\n")
+        print(f"Timings written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,307 @@
+"""
+Benchmarks of every stage of the transformation chain on synthetic models of growing size.
+
+Each benchmark is timed over several rounds (after a warm-up round) at every scale, and
+the median times are fitted to a power of the model size, so a stage that starts growing
+quadratically shows up as an exponent close to 2 long before it hurts at customer scale.
+The fastest round of each benchmark is compared against the stored baselines (baselines.json),
+scaled by a calibration workload so a slower or busier machine doesn't read as a regression.
+
+Benchmarks:
+- cim_pim: CIM-PIM.xsl on the synthetic CIM.
+- pim_psm: PIM-PSM.xsl on the answered PIM.
+- transform_endpoint: POST /transform of the backend (CIM-PIM.xsl), through the Flask test client.
+- psm_to_code: psm_to_code-arduinomkr1010.py on the PSM.
+
+Usage:
+    python run_benchmarks.py                       # run and compare with baselines.json
+    python run_benchmarks.py --save-baseline       # run and store the results as the new baselines
+    python run_benchmarks.py --scales 1,2 --only cim_pim,pim_psm
+"""
+import argparse
+import contextlib
+import importlib.util
+import json
+import math
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+from synthetic_models import BACKEND_DIR, XSL_DIR, generate_chain, transform
+
+BASELINES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines.json')
+
+# Model parameters at scale 1; the number of actors grows with the scale
+BASE_MODEL = {"actors": 4, "goals": 2, "tasks": 3, "resources": 2, "dependency_density": 0.25}
+
+
+def model_parameters(scale, density):
+    parameters = dict(BASE_MODEL, actors=BASE_MODEL["actors"] * scale)
+    if density is not None:
+        parameters["dependency_density"] = density
+    return parameters
+
+
+def load_generator():
+    spec = importlib.util.spec_from_file_location('psm_to_code', os.path.join(BACKEND_DIR, 'psm_to_code-arduinomkr1010.py'))
+    generator = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(generator)
+    return generator
+
+
+class BenchmarkContext:
+    """Objects shared by all benchmarks: one Saxon processor, stylesheet cache, backend client and generator."""
+
+    def __init__(self):
+        from pipeline import new_processor
+        from stylesheet_cache import StylesheetCache
+
+        self.processor = new_processor()
+        self.stylesheet_cache = StylesheetCache(self.processor)
+        # Generated code goes to memory when possible, so disk writeback doesn't dominate the timings
+        self.work_dir = tempfile.mkdtemp(prefix="mdd4cps-bench-", dir="/dev/shm" if os.path.isdir("/dev/shm") else None)
+        self._client = None
+        self._generator = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            # Keep the per-request log lines out of the benchmark output
+            os.environ.setdefault('LOG_LEVEL', 'WARNING')
+            import backend
+            self._client = backend.app.test_client()
+        return self._client
+
+    @property
+    def generator(self):
+        if self._generator is None:
+            self._generator = load_generator()
+        return self._generator
+
+    def close(self):
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+
+def bench_cim_pim(context, models):
+    return lambda: transform(context.processor, context.stylesheet_cache, models["cim"], ["CIM-PIM.xsl"])
+
+
+def bench_pim_psm(context, models):
+    parameters = {"platform": "arduino", "comm_tech": "mqtt"}
+    return lambda: transform(context.processor, context.stylesheet_cache, models["pim"], ["PIM-PSM.xsl"], parameters)
+
+
+def bench_transform_endpoint(context, models):
+    with open(os.path.join(XSL_DIR, "CIM-PIM.xsl"), encoding='utf-8') as file:
+        payload = {"inputXML": models["cim"], "xslTransformation": file.read()}
+
+    def run():
+        response = context.client.post('/transform', json=payload)
+        if response.status_code != 200:
+            raise RuntimeError(f"/transform returned {response.status_code}: {response.get_data(as_text=True)[:200]}")
+    return run
+
+
+def bench_psm_to_code(context, models):
+    generator = context.generator
+    psm_path = os.path.join(context.work_dir, f"psm-{len(os.listdir(context.work_dir))}.xml")
+    with open(psm_path, 'w', encoding='utf-8') as file:
+        file.write(models["psm"])
+    rounds = iter(range(sys.maxsize))
+
+    def run():
+        # A fresh output directory every round, so every file is really written
+        output_root = os.path.join(context.work_dir, f"code-{next(rounds)}")
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            root_attributes, cpcs = generator.stream_psm(psm_path)
+            generator.process_cpcs(cpcs, generator.get_cps_id(root_attributes), output_root=output_root)
+    return run
+
+
+BENCHMARKS = {
+    "cim_pim": bench_cim_pim,
+    "pim_psm": bench_pim_psm,
+    "transform_endpoint": bench_transform_endpoint,
+    "psm_to_code": bench_psm_to_code,
+}
+
+
+def measure(run, rounds, warmup=1):
+    """Time a callable like pytest-benchmark: warm-up rounds first, then statistics over `rounds` runs."""
+    for _ in range(warmup):
+        run()
+    times = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+    return {
+        "min": min(times),
+        "max": max(times),
+        "mean": statistics.mean(times),
+        "median": statistics.median(times),
+        "stddev": statistics.stdev(times) if len(times) > 1 else 0.0,
+        "rounds": rounds,
+    }
+
+
+def calibrate(rounds=5):
+    """Time a fixed CPU-bound workload, to relate timings to the speed of the machine."""
+    data = list(range(200000, 0, -1))
+    return measure(lambda: sorted(value * 7 % 1000 for value in data), rounds)["min"]
+
+
+def scaling_exponent(points):
+    """Least-squares slope of log(time) over log(model size): ~1 is linear, ~2 quadratic."""
+    points = [(size, seconds) for size, seconds in points if size > 0 and seconds > 0]
+    if len(points) < 2:
+        return None
+    xs = [math.log(size) for size, _ in points]
+    ys = [math.log(seconds) for _, seconds in points]
+    mean_x, mean_y = statistics.mean(xs), statistics.mean(ys)
+    variance = sum((x - mean_x) ** 2 for x in xs)
+    if variance == 0:
+        return None
+    return sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / variance
+
+
+def count_elements(cim):
+    return cim.count("<object ")
+
+
+def run_benchmarks(names, scales, rounds, density):
+    context = BenchmarkContext()
+    results = {name: {} for name in names}
+    calibration = calibrate()
+    try:
+        for scale in scales:
+            parameters = model_parameters(scale, density)
+            models = generate_chain(context.processor, context.stylesheet_cache, seed=scale, **parameters)
+            elements = count_elements(models["cim"])
+            print(f"scale {scale}: {parameters['actors']} actors, {elements} CIM elements")
+            for name in names:
+                stats = measure(BENCHMARKS[name](context, models), rounds)
+                stats["elements"] = elements
+                results[name][str(scale)] = stats
+    finally:
+        context.close()
+    # The machine may have slowed down during the run (other load, throttling); keep the fastest
+    calibration = min(calibration, calibrate())
+    return results, calibration
+
+
+def print_report(results, calibration, baselines, tolerance, max_exponent):
+    """Print the timings and scaling exponents; return the list of regressions found."""
+    regressions = []
+    baseline_results = baselines.get("results", {}) if baselines else {}
+    # How much slower this machine (or its current load) is than when the baselines were stored.
+    # Only slowdowns are compensated: a faster calibration run says little about the other benchmarks.
+    speed = max(1.0, calibration / baselines["calibration"]) if baselines else 1.0
+    if baselines:
+        print(f"Calibration: {calibration:.4f}s (baselines: {baselines['calibration']:.4f}s)")
+
+    print()
+    print(f"{'benchmark':<20} {'scale':>5} {'elements':>8} {'min':>10} {'median':>10} {'mean':>10} {'stddev':>10}"
+          f" {'baseline':>10} {'change':>8}")
+    for name, scales in results.items():
+        for scale, stats in scales.items():
+            baseline = baseline_results.get(name, {}).get(scale)
+            if baseline:
+                expected = baseline["min"] * speed
+                change = stats["min"] / expected - 1
+                # Ignore sub-millisecond noise
+                regressed = change > tolerance and stats["min"] - expected > 0.001
+                if regressed:
+                    regressions.append(f"{name} at scale {scale} is {change:+.0%} slower than the baseline")
+                baseline_text = f"{expected:>9.4f}s {change:>+7.0%}{' !' if regressed else ''}"
+            else:
+                baseline_text = f"{'-':>10} {'-':>8}"
+            print(f"{name:<20} {scale:>5} {stats['elements']:>8} {stats['min']:>9.4f}s {stats['median']:>9.4f}s"
+                  f" {stats['mean']:>9.4f}s {stats['stddev']:>9.4f}s {baseline_text}")
+
+    print()
+    print("Scaling (median time ~ elements^k):")
+    for name, scales in results.items():
+        exponent = scaling_exponent([(stats["elements"], stats["median"]) for stats in scales.values()])
+        if exponent is None:
+            continue
+        baseline_exponent = baselines.get("exponents", {}).get(name) if baselines else None
+        line = f"  {name:<20} k = {exponent:.2f}"
+        if baseline_exponent is not None:
+            line += f" (baseline {baseline_exponent:.2f})"
+        if exponent > max_exponent:
+            regressions.append(f"{name} scales as elements^{exponent:.2f} (limit {max_exponent})")
+            line += " !"
+        print(line)
+    return regressions
+
+
+def save_baselines(path, results, calibration, scales, density):
+    baselines = {
+        "machine": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        "calibration": round(calibration, 6),
+        "model": {scale: model_parameters(int(scale), density) for scale in map(str, scales)},
+        "results": {name: {scale: {"elements": stats["elements"], "min": round(stats["min"], 6),
+                                   "median": round(stats["median"], 6)}
+                           for scale, stats in scale_results.items()}
+                    for name, scale_results in results.items()},
+        "exponents": {},
+    }
+    for name, scale_results in results.items():
+        exponent = scaling_exponent([(stats["elements"], stats["median"]) for stats in scale_results.values()])
+        if exponent is not None:
+            baselines["exponents"][name] = round(exponent, 3)
+    with open(path, 'w') as file:
+        json.dump(baselines, file, indent=2)
+        file.write("\n")
+    print(f"Saved baselines to {path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the transformation chain on synthetic models.")
+    parser.add_argument("--scales", default="1,2,4,8,16", help="Comma-separated model scales (default: 1,2,4,8,16)")
+    parser.add_argument("--rounds", type=int, default=3, help="Timed rounds per benchmark and scale (default: 3)")
+    parser.add_argument("--only", help="Comma-separated benchmarks to run (default: all)")
+    parser.add_argument("--density", type=float, help=f"Dependency density (default: {BASE_MODEL['dependency_density']})")
+    parser.add_argument("--baselines", default=BASELINES_PATH, help="Baselines file (default: benchmarks/baselines.json)")
+    parser.add_argument("--save-baseline", action="store_true", help="Store the results as the new baselines")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="Allowed slowdown of the fastest round against the baseline (default: 0.5)")
+    parser.add_argument("--max-exponent", type=float, default=1.5, help="Highest acceptable scaling exponent (default: 1.5)")
+    parser.add_argument("--json", metavar="PATH", help="Also write the full results to PATH")
+    args = parser.parse_args()
+
+    names = args.only.split(",") if args.only else list(BENCHMARKS)
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(unknown)}")
+    scales = [int(scale) for scale in args.scales.split(",")]
+
+    results, calibration = run_benchmarks(names, scales, args.rounds, args.density)
+
+    baselines = None
+    if not args.save_baseline and os.path.isfile(args.baselines):
+        with open(args.baselines) as file:
+            baselines = json.load(file)
+    regressions = print_report(results, calibration, baselines, args.tolerance, args.max_exponent)
+
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump({"calibration": calibration, "results": results}, file, indent=2)
+    if args.save_baseline:
+        save_baselines(args.baselines, results, calibration, scales, args.density)
+        return 0
+
+    if regressions:
+        print()
+        for regression in regressions:
+            print(f"REGRESSION: {regression}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,242 @@
+"""
+Synthetic iStar (CIM), PIM and PSM models for benchmarking the transformation chain.
+
+The CIM is a draw.io model with the same layout the stylesheets expect from a real one:
+every actor has its own boundary holding goals, tasks and resources, and actors are linked
+through dependums drawn on the top level of the diagram. The questionnaire answers are
+filled in directly, so the CIM can go straight through CIM-PIM.xsl, and answer_pim() does
+the same for the PIM-PSM questionnaire.
+
+Usage:
+    python synthetic_models.py --actors 20 --goals 2 --tasks 4 --resources 2 --density 0.2 -o synthetic
+"""
+import argparse
+import json
+import os
+import random
+import sys
+from xml.etree import ElementTree as ET
+
+REPO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+BACKEND_DIR = os.path.join(REPO_DIR, 'src', 'backend')
+XSL_DIR = os.path.join(REPO_DIR, 'src', 'frontend', 'static', 'input', 'xsl')
+sys.path.insert(0, BACKEND_DIR)
+
+PARAMETER_TYPES = ["int", "double", "double", "bool", "char[50]"]
+
+OPERATION_MODES = [
+    {"code": "0", "name": "Low Power", "description": "Samples once per cycle to save energy."},
+    {"code": "1", "name": "High Power", "description": "Averages ten consecutive samples per cycle."},
+]
+OPERATION_MODES_DESCRIPTION = ("Recommended operation modes.\n- Low Power: samples once per cycle.\n"
+                               "- High Power: averages ten consecutive samples per cycle.")
+
+
+class CimBuilder:
+    """Append draw.io cells to the root of an mxGraphModel, with sequential ids."""
+
+    def __init__(self, root, prefix):
+        self.root = root
+        self.prefix = prefix
+        self.count = 0
+
+    def new_id(self):
+        self.count += 1
+        return f"{self.prefix}-{self.count}"
+
+    def vertex(self, parent, style, **attributes):
+        element_id = self.new_id()
+        element = ET.SubElement(self.root, "object", attributes, id=element_id)
+        cell = ET.SubElement(element, "mxCell", style=style, parent=parent, vertex="1")
+        ET.SubElement(cell, "mxGeometry", {"width": "120", "height": "50", "as": "geometry"})
+        return element_id
+
+    def edge(self, parent, source, target, style="endArrow=classic;html=1;", **attributes):
+        element_id = self.new_id()
+        element = ET.SubElement(self.root, "object", attributes, id=element_id)
+        cell = ET.SubElement(element, "mxCell", style=style, parent=parent, source=source, target=target, edge="1")
+        ET.SubElement(cell, "mxGeometry", {"relative": "1", "as": "geometry"})
+        return element_id
+
+
+def parameters(prefix, count):
+    return [{"name": f"{prefix} {index}", "description": f"Synthetic {prefix.lower()} {index}."}
+            for index in range(count)]
+
+
+def label(index, text):
+    # Some draw.io labels carry HTML markup; keep a few of them in the synthetic models
+    return f"<div>{text}</div>" if index % 5 == 4 else text
+
+
+def generate_cim(actors=4, goals=2, tasks=3, resources=2, dependency_density=0.5, seed=0, name="Synthetic System"):
+    """
+    Generate a CIM (draw.io iStar model) with its CIM-PIM questionnaire already answered.
+
+    Parameters:
+    - actors: Number of actors, each one a CPC.
+    - goals: Goals inside each actor.
+    - tasks: Tasks inside each actor, each one refining one of its goals.
+    - resources: Resources inside each actor (alternately hardware and software), each one
+      needed by one of its tasks.
+    - dependency_density: Probability that an actor depends on each of the other actors,
+      through a dependum linking one of its tasks to a task of the other actor.
+    - seed: Seed of the random choices, so the same parameters give the same model.
+
+    Returns:
+    - The model as an XML string.
+    """
+    rng = random.Random(seed)
+    mxfile = ET.Element("mxfile", host="synthetic")
+    diagram = ET.SubElement(mxfile, "diagram", name=name, id=f"synthetic{seed}")
+    model = ET.SubElement(diagram, "mxGraphModel")
+    root = ET.SubElement(model, "root")
+    ET.SubElement(root, "mxCell", id="0")
+    ET.SubElement(root, "mxCell", id="1", parent="0")
+    cim = CimBuilder(root, f"syn{seed}")
+
+    actor_tasks = []
+    for actor_index in range(actors):
+        group = cim.vertex("1", "group", label="", type="boundary")
+        boundary = cim.vertex(group, "ellipse;container=1;", label="", type="boundary")
+
+        goal_ids = []
+        for goal_index in range(goals):
+            modes = goal_index % 3 == 2
+            goal_ids.append(cim.vertex(boundary, "rounded=1;", label=label(goal_index, f"Goal {actor_index} {goal_index}"),
+                                       type="goal", interval_in_milliseconds=str(1000 * (goal_index + 1)),
+                                       operation_modes_enabled="true" if modes else "false",
+                                       **({"operation_modes_description": OPERATION_MODES_DESCRIPTION} if modes else {})))
+
+        task_ids = []
+        for task_index in range(tasks):
+            modes = task_index % 3 == 2
+            task_id = cim.vertex(boundary, "shape=hexagon;", label=label(task_index, f"Task {actor_index} {task_index}"),
+                                 type="task",
+                                 input_parameters=json.dumps(parameters("Input", rng.randint(0, 2)), separators=(',', ':')),
+                                 output_parameters=json.dumps(parameters("Output", rng.randint(0, 2)), separators=(',', ':')),
+                                 operation_modes_enabled="true" if modes else "false",
+                                 **({"operation_modes_description": OPERATION_MODES_DESCRIPTION} if modes else {}))
+            task_ids.append(task_id)
+            if goal_ids:
+                cim.edge(boundary, task_id, goal_ids[task_index % len(goal_ids)], label="", type="refinement", value="and")
+
+        for resource_index in range(resources):
+            if resource_index % 2:
+                resource = {"resource_type": "software",
+                            "data_structure": json.dumps(parameters("Field", 2), separators=(',', ':'))}
+            else:
+                resource = {"resource_type": "hardware"}
+            resource_id = cim.vertex(boundary, "rounded=0;", label=label(resource_index, f"Resource {actor_index} {resource_index}"),
+                                     type="resource", **resource)
+            if task_ids:
+                cim.edge(boundary, resource_id, task_ids[resource_index % len(task_ids)], label="", type="needed-by")
+
+        placeholder = cim.vertex(group, "group;", label="", type="")
+        actor = cim.vertex(placeholder, "ellipse;", label=f"Component {actor_index}", type="role", is_a_cpc="true",
+                           description=f"Synthetic cyber-physical component {actor_index}.")
+        cim.edge(group, actor, boundary, label="", type="owns")
+        actor_tasks.append(task_ids)
+
+    # Dependencies: depender task -> dependum -> dependee task
+    for depender in range(actors):
+        for dependee in range(actors):
+            if depender == dependee or not actor_tasks[depender] or not actor_tasks[dependee]:
+                continue
+            if rng.random() >= dependency_density:
+                continue
+            dependum = cim.vertex("1", "rounded=0;", label=f"Data {dependee} to {depender}", type="resource",
+                                  dependum_data_structure=json.dumps(parameters("Value", 2), separators=(',', ':')),
+                                  interval_in_milliseconds="1000", operation_modes_enabled="false")
+            cim.edge("1", rng.choice(actor_tasks[depender]), dependum, label="D", type="dependency-link")
+            cim.edge("1", dependum, rng.choice(actor_tasks[dependee]), label="D", type="dependency-link")
+
+    return ET.tostring(mxfile, encoding="unicode")
+
+
+def typed(parameters_json, rng):
+    return json.dumps([dict(parameter, type=rng.choice(PARAMETER_TYPES)) for parameter in json.loads(parameters_json or "[]")],
+                      separators=(',', ':'))
+
+
+def answer_pim(pim_xml, seed=0):
+    """
+    Fill in the PIM-PSM questionnaire of a PIM: parameter and data structure types,
+    operation modes and hardware integration descriptions.
+
+    Returns:
+    - The answered PIM as an XML string.
+    """
+    rng = random.Random(seed)
+    root = ET.fromstring(pim_xml)
+    modes = json.dumps(OPERATION_MODES, separators=(',', ':'))
+    for element in root.iter("object"):
+        element_type = element.get("type")
+        with_modes = element.get("operation_modes_enabled") == "true"
+        if element_type == "comm_thread":
+            element.set("data_structure_psm", typed(element.get("dependum_data_structure"), rng))
+        elif element_type == "action":
+            element.set("input_parameters_psm", typed(element.get("input_parameters"), rng))
+            element.set("output_parameters_psm", typed(element.get("output_parameters"), rng))
+        elif element_type == "hw_resource":
+            element.set("integration_operation_description", "Connected to a digital pin of the board.")
+        elif element_type == "sw_resource":
+            element.set("data_structure_psm", typed(element.get("data_structure"), rng))
+        if with_modes and element_type in ("comm_thread", "action", "operational_goal"):
+            element.set("operation_modes", modes)
+    return ET.tostring(root, encoding="unicode")
+
+
+def transform(processor, stylesheet_cache, input_xml, stylesheet_names, parameters=None):
+    """Run stylesheets from the frontend's xsl folder through the backend pipeline."""
+    from pipeline import run_pipeline
+
+    stylesheets = []
+    for stylesheet_name in stylesheet_names:
+        with open(os.path.join(XSL_DIR, stylesheet_name), encoding='utf-8') as file:
+            stylesheets.append(file.read())
+    return run_pipeline(processor, stylesheet_cache, input_xml, stylesheets, parameters)
+
+
+def generate_chain(processor, stylesheet_cache, seed=0, **model_parameters):
+    """
+    Generate a synthetic CIM and derive its PIM and PSM with the real stylesheets.
+
+    Returns:
+    - A dict with the 'cim', 'pim' (answered) and 'psm' XML strings.
+    """
+    cim = generate_cim(seed=seed, **model_parameters)
+    pim = transform(processor, stylesheet_cache, cim, ["CIM-PIM.xsl", "CIM-PIM-Aux.xsl"])
+    pim = answer_pim(pim, seed)
+    psm = transform(processor, stylesheet_cache, pim, ["PIM-PSM.xsl"], {"platform": "arduino", "comm_tech": "mqtt"})
+    return {"cim": cim, "pim": pim, "psm": psm}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic CIM, and its PIM and PSM.")
+    parser.add_argument("--actors", type=int, default=4, help="Number of actors (CPCs)")
+    parser.add_argument("--goals", type=int, default=2, help="Goals per actor")
+    parser.add_argument("--tasks", type=int, default=3, help="Tasks per actor")
+    parser.add_argument("--resources", type=int, default=2, help="Resources per actor")
+    parser.add_argument("--density", type=float, default=0.5, help="Probability of a dependency between two actors")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    parser.add_argument("--output", "-o", default="synthetic", help="Output directory")
+    args = parser.parse_args()
+
+    from pipeline import new_processor
+    from stylesheet_cache import StylesheetCache
+
+    processor = new_processor()
+    models = generate_chain(processor, StylesheetCache(processor), seed=args.seed, actors=args.actors, goals=args.goals,
+                            tasks=args.tasks, resources=args.resources, dependency_density=args.density)
+    os.makedirs(args.output, exist_ok=True)
+    for level, content in models.items():
+        extension = ".drawio" if level == "cim" else ".xml"
+        path = os.path.join(args.output, f"synthetic-{level}{extension}")
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(content)
+        print(f"Generated {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,46 +1,429 @@
-from flask import Flask, request, jsonify
-import saxonche
-import xml.dom.minidom as minidom
+from flask import Flask, request, jsonify, url_for
+import json
+import logging
+import os
+import time
+
+from lxml import etree
+
+from stylesheet_cache import StylesheetCache
+from pipeline import document_element_name, new_processor, run_pipeline, serialize
+from job_queue import JobQueue, QueueFullError, JobCancelledError
+from request_logging import StageTimings, PayloadSampler, configure_logging, describe_document
+from shacl_validation import ValidationSessions, get_validator
+from pim_rdf import pim_string_to_rdf
+from structural_check import FORMATS, check_string
+import metrics
+
+configure_logging()
+logger = logging.getLogger('backend')
+
+# Full payloads are only logged for a sampled share of requests, in DEBUG mode
+payload_sampler = PayloadSampler(logger)
 
 app = Flask(__name__)
 
+# One long-lived Saxon processor per worker, shared by every request
+saxon_processor = new_processor()
+
+# Compiled stylesheets, reused across requests that send the same XSLT
+stylesheet_cache = StylesheetCache(saxon_processor, max_size=int(os.environ.get('XSLT_CACHE_SIZE', '16')))
+
+# Long-running transformations are queued and run by a local pool of worker threads
+job_queue = JobQueue(
+    workers=int(os.environ.get('JOB_WORKERS', '2')),
+    max_pending=int(os.environ.get('JOB_QUEUE_SIZE', '16')),
+    history_size=int(os.environ.get('JOB_HISTORY_SIZE', '100'))
+)
+
+# Validated models kept for incremental revalidation of their edits
+validation_sessions = ValidationSessions(max_sessions=int(os.environ.get('VALIDATION_SESSIONS', '32')))
+
+# Prometheus metrics on /metrics: request counts and latency, phase timings, cache and queue state
+metrics.instrument_app(app)
+metrics.register_stylesheet_cache(stylesheet_cache)
+metrics.register_job_queue(job_queue)
+
+# Preset XSLT stylesheets, referenced by file name in the query string of raw XML requests
+XSL_DIR = os.environ.get('XSL_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                 '..', 'frontend', 'static', 'input', 'xsl'))
+# Query arguments of raw XML requests that are not stylesheet parameters
+REQUEST_OPTIONS = ('stylesheet', 'pretty', 'validate')
+
+def read_preset_stylesheet(name):
+    path = os.path.join(XSL_DIR, os.path.basename(name))
+    if name != os.path.basename(name) or not os.path.isfile(path):
+        raise ValueError(f"Unknown stylesheet: {name}")
+    with open(path, encoding='utf-8') as file:
+        return file.read()
+
+def read_transformation_request(single=False):
+    """
+    Read the body of /transform, /pipeline and /jobs.
+
+    The body is either a JSON document {inputXML, xslTransformations, parameters, pretty, validate}
+    ({inputXML, xslTransformation, pretty} with single, as /transform takes it), or the raw
+    XML document, with the preset stylesheets given as repeated `stylesheet` query arguments
+    (file names in XSL_DIR), `pretty=true`, `validate=true` and any other query argument
+    used as a stylesheet parameter.
+
+    Returns:
+        tuple: The input XML, the list of stylesheet sources, the stylesheet parameters and the
+        options (the JSON document, or {} for raw XML, see wants_pretty_output()).
+        Raises ValueError for unknown stylesheets.
+    """
+    if request.is_json:
+        input_data = request.get_json()
+        if single:
+            stylesheets = [input_data['xslTransformation']] if input_data.get('xslTransformation') else []
+        else:
+            stylesheets = input_data.get('xslTransformations')
+        return input_data.get('inputXML'), stylesheets, input_data.get('parameters') or {}, input_data
+
+    stylesheets = [read_preset_stylesheet(name) for name in request.args.getlist('stylesheet')]
+    parameters = {name: value for name, value in request.args.items() if name not in REQUEST_OPTIONS}
+    return request.get_data(as_text=True), stylesheets, parameters, {}
+
+def wants_pretty_output(input_data):
+    # Indentation is opt-in: {"pretty": true} in the body or ?pretty=true
+    return input_data.get('pretty') is True or request.args.get('pretty') == 'true'
+
+def check_structure(output):
+    # PIM and PSM outputs are checked against the structural rules of the PIM DSL; anything else is skipped
+    try:
+        return check_string(output)
+    except (ValueError, etree.XMLSyntaxError):
+        return None
+
+def structure_header(structure):
+    # A summary of the structural check in a response header, so the body stays the transformed XML
+    if structure is None:
+        return {}
+    rules = {}
+    for violation in structure['violations']:
+        rules[violation['rule']] = rules.get(violation['rule'], 0) + 1
+    return {'X-Structural-Check': json.dumps({
+        'format': structure['format'],
+        'conforms': structure['conforms'],
+        'violations': len(structure['violations']),
+        'rules': rules,
+    })}
+
+def validate_pim_xml(validator, pim_xml, shapes=None):
+    # SHACL report of a PIM model, with the time spent converting it to RDF
+    start = time.perf_counter()
+    data = pim_string_to_rdf(pim_xml)
+    convert_ms = round((time.perf_counter() - start) * 1000, 3)
+    report = validator.validate(data, shapes=shapes)
+    report['timings']['convert_ms'] = convert_ms
+    report['timings']['total_ms'] = round(report['timings']['total_ms'] + convert_ms, 3)
+    return report
+
+def validate_pipeline_pim(pim_xml):
+    # The validation stage of /pipeline and /jobs: failures are reported in place of the report,
+    # the transformation itself has succeeded
+    if pim_xml is None:
+        return {'error': 'The pipeline produced no PIM to validate.'}
+    try:
+        return validate_pim_xml(get_validator(), pim_xml)
+    except Exception as e:
+        logger.warning("validation failed", extra={'fields': {'error': str(e)}})
+        return {'error': f'SHACL validation failed: {e}'}
+
+def validation_header(validation):
+    # A summary of the SHACL report in a response header, like X-Structural-Check
+    if validation is None:
+        return {}
+    if 'error' in validation:
+        return {'X-Validation': json.dumps({'error': validation['error']})}
+    return {'X-Validation': json.dumps({
+        'conforms': validation['conforms'],
+        'violations': sum(len(result['violations']) for result in validation['shapes'].values()),
+        'shapes': {name: len(result['violations']) for name, result in validation['shapes'].items()},
+    })}
+
+def wants_validation(input_data):
+    # SHACL validation of the CIM→PIM result is opt-in: {"validate": true} in the body or ?validate=true
+    return input_data.get('validate') is True or request.args.get('validate') == 'true'
+
+def run_logged_pipeline(event, input_xml, xsl_transformations, parameters, pretty, on_stage=None, validate=False,
+                        **context):
+    """
+    Run the pipeline and log one structured record for it: document sizes and hashes,
+    per-phase timings and cache hits, never the documents themselves (unless sampled
+    for payload capture in DEBUG mode). Errors are logged and re-raised.
+
+    With validate, the PIM the chain produces (the result of its CIM→PIM stages: the last
+    stage result that is a PIM, before a stage turns it into something else) is converted
+    to RDF and validated against the SHACL shapes.
+
+    Returns:
+        tuple: The output, its structural check (see structural_check.check_model()),
+        or None if the output is not a PIM or a PSM, and the SHACL report of the PIM
+        (see shacl_validation.ShaclValidator.validate()), or None without validate.
+    """
+    produced = {}
+
+    def keep_pim(index, node):
+        if 'left_pim' in produced:
+            return
+        if FORMATS.get(document_element_name(stylesheet_cache, node, timings)) == 'pim':
+            produced['pim'] = node
+        elif 'pim' in produced:
+            produced['left_pim'] = True
+
+    timings = StageTimings()
+    fields = dict(context)
+    fields.update(describe_document('input', input_xml))
+    fields['stylesheets'] = [StylesheetCache.content_hash(text)[:16] for text in xsl_transformations]
+    fields['pretty'] = pretty
+    capture = payload_sampler.should_capture()
+
+    start = time.perf_counter()
+    try:
+        output = run_pipeline(saxon_processor, stylesheet_cache, input_xml, xsl_transformations, parameters,
+                              on_stage=on_stage, pretty=pretty, timings=timings,
+                              on_result=keep_pim if validate else None)
+    except Exception as e:
+        fields.update(timings.as_fields())
+        fields['total_ms'] = round((time.perf_counter() - start) * 1000, 3)
+        metrics.observe_pipeline(timings, fields['input_bytes'])
+        if isinstance(e, JobCancelledError):
+            logger.info("%s cancelled", event, extra={'fields': fields})
+            raise
+        fields['error'] = str(e)
+        logger.warning("%s failed", event, extra={'fields': fields})
+        if capture:
+            logger.debug("%s payload", event, extra={'fields': {'input': input_xml, 'stylesheets': xsl_transformations}})
+        raise
+
+    structure = check_structure(output)
+    validation = None
+    if validate:
+        if structure is not None and structure['format'] == 'pim' and 'left_pim' not in produced:
+            pim_xml = output
+        elif 'pim' in produced:
+            pim_xml = serialize(stylesheet_cache, produced['pim'], timings=timings)
+        else:
+            pim_xml = None
+        validation = validate_pipeline_pim(pim_xml)
+    fields.update(describe_document('output', output))
+    fields.update(timings.as_fields())
+    if structure is not None:
+        fields['structural_violations'] = len(structure['violations'])
+        fields['structural_ms'] = structure['milliseconds']
+    if validation is not None and 'error' not in validation:
+        fields['validation_conforms'] = validation['conforms']
+        fields['validation_ms'] = validation['timings']['total_ms']
+    fields['total_ms'] = round((time.perf_counter() - start) * 1000, 3)
+    metrics.observe_pipeline(timings, fields['input_bytes'], fields['output_bytes'])
+    logger.info("%s", event, extra={'fields': fields})
+    if capture:
+        logger.debug("%s payload", event, extra={'fields': {
+            'input': input_xml, 'stylesheets': xsl_transformations, 'output': output}})
+    return output, structure, validation
+
 @app.route('/transform', methods=['POST'])
 def transform():
     try:
         # Parse the request data (XML and XSL)
-        input_data = request.get_json()
-        input_xml = input_data.get('inputXML')
-        xsl_transformation = input_data.get('xslTransformation')
-        print(input_data)
+        try:
+            input_xml, xsl_transformations, parameters, input_data = read_transformation_request(single=True)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
 
-        if not input_xml or not xsl_transformation:
+        if not input_xml or not xsl_transformations or len(xsl_transformations) != 1:
             return jsonify({'error': 'Both inputXML and xslTransformation are required.'}), 400
 
-        print("XML Input: ", input_xml)
-        print("XSL File: ", xsl_transformation)
+        # A single-stage pipeline: parse, compile (on a cache miss), transform and serialize
+        output, structure, _ = run_logged_pipeline('transform', input_xml, xsl_transformations, parameters,
+                                                   wants_pretty_output(input_data))
+        return output, 200, structure_header(structure)
 
-        # Set up the Saxon processor
-        with saxonche.PySaxonProcessor(license=False) as proc:
-            # Parse the XML document
-            document = proc.parse_xml(xml_text=input_xml)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
-            # Compile the XSLT stylesheet from the provided string
-            xslt_proc = proc.new_xslt30_processor()
-            executable = xslt_proc.compile_stylesheet(stylesheet_text=xsl_transformation)
+@app.route('/pipeline', methods=['POST'])
+def pipeline():
+    try:
+        # Parse the request data (XML, ordered list of XSL stylesheets and parameters)
+        try:
+            input_xml, xsl_transformations, parameters, input_data = read_transformation_request()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
 
-            # Perform the transformation
-            output = executable.transform_to_string(xdm_node=document)
+        if not input_xml or not xsl_transformations:
+            return jsonify({'error': 'Both inputXML and xslTransformations are required.'}), 400
 
-        # Pretty-print the result
-        pretty_result = minidom.parseString(output).toprettyxml()
+        # Run every stage in one Saxon session, passing the XDM tree between stages
+        output, structure, validation = run_logged_pipeline('pipeline', input_xml, xsl_transformations, parameters,
+                                                            wants_pretty_output(input_data),
+                                                            validate=wants_validation(input_data))
 
-        print("Transformation Result: ", pretty_result)
-        return pretty_result, 200
+        return output, 200, dict(structure_header(structure), **validation_header(validation))
 
     except Exception as e:
-        print("Transformation error:", str(e))
         return jsonify({'error': str(e)}), 500
 
+def run_pipeline_job(job, input_xml, xsl_transformations, parameters, pretty, validate=False):
+    def on_stage(index, count):
+        # Stop between stages once the job has been cancelled
+        job.check_cancelled()
+        job.progress = f"stage {index + 1}/{count}"
+
+    output, structure, validation = run_logged_pipeline('job', input_xml, xsl_transformations, parameters, pretty,
+                                                        on_stage=on_stage, validate=validate, job_id=job.id)
+    job.check_cancelled()
+    job.structure = structure
+    job.validation = validation
+    return output
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    # Same request body as /pipeline, but the pipeline runs in the background
+    try:
+        input_xml, xsl_transformations, parameters, input_data = read_transformation_request()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    if not input_xml or not xsl_transformations:
+        return jsonify({'error': 'Both inputXML and xslTransformations are required.'}), 400
+
+    try:
+        job = job_queue.submit(run_pipeline_job, input_xml, xsl_transformations, parameters,
+                               wants_pretty_output(input_data), wants_validation(input_data))
+    except QueueFullError as e:
+        return jsonify({'error': str(e)}), 503
+
+    return jsonify(job.to_dict()), 202, {'Location': url_for('job_status', job_id=job.id)}
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': f'Unknown job: {job_id}'}), 404
+    return jsonify(job.to_dict()), 200
+
+@app.route('/jobs/<job_id>/result', methods=['GET'])
+def job_result(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': f'Unknown job: {job_id}'}), 404
+    if job.status == 'failed':
+        return jsonify({'error': job.error}), 500
+    if job.status != 'done':
+        return jsonify({'error': f'Job is {job.status}.'}), 409
+    return job.result, 200
+
+@app.route('/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    job = job_queue.cancel(job_id)
+    if job is None:
+        return jsonify({'error': f'Unknown job: {job_id}'}), 404
+    return jsonify(job.to_dict()), 200
+
+@app.route('/jobs/stats', methods=['GET'])
+def job_stats():
+    return jsonify(job_queue.stats()), 200
+
+@app.route('/validate', methods=['POST'])
+def validate():
+    # RDF data graph (Turtle by default) or PIM model, optionally restricted to some of the shapes files
+    input_data = request.get_json()
+    data = input_data.get('data')
+    pim_xml = input_data.get('pimXML')
+    data_format = input_data.get('format') or 'turtle'
+    shapes = input_data.get('shapes')
+
+    if not data and not pim_xml:
+        return jsonify({'error': 'Either data or pimXML is required.'}), 400
+
+    try:
+        # The ontology closure and the shapes are loaded on the first validation only
+        validator = get_validator()
+    except Exception as e:
+        logger.warning("validation unavailable", extra={'fields': {'error': str(e)}})
+        return jsonify({'error': f'SHACL validation is not available: {e}'}), 503
+
+    try:
+        if pim_xml:
+            report = validate_pim_xml(validator, pim_xml, shapes=shapes)
+        else:
+            report = validator.validate(data, shapes=shapes, data_format=data_format)
+    except KeyError as e:
+        return jsonify({'error': str(e.args[0])}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+    logger.info("validate", extra={'fields': dict(report['timings'], conforms=report['conforms'],
+                                                  shapes=list(report['shapes']))})
+    return jsonify(report), 200
+
+@app.route('/validate/sessions', methods=['POST'])
+def open_validation_session():
+    # Same request body as /validate; the validated model is kept so its edits can be revalidated incrementally
+    input_data = request.get_json()
+    data = input_data.get('data')
+    pim_xml = input_data.get('pimXML')
+
+    if not data and not pim_xml:
+        return jsonify({'error': 'Either data or pimXML is required.'}), 400
+
+    try:
+        validator = get_validator()
+    except Exception as e:
+        logger.warning("validation unavailable", extra={'fields': {'error': str(e)}})
+        return jsonify({'error': f'SHACL validation is not available: {e}'}), 503
+
+    try:
+        if pim_xml:
+            data = pim_string_to_rdf(pim_xml)
+        session = validation_sessions.open(validator, data, input_data.get('shapes'),
+                                           input_data.get('format') or 'turtle')
+    except KeyError as e:
+        return jsonify({'error': str(e.args[0])}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+    report = dict(session.report, session=session.id)
+    return jsonify(report), 201, {'Location': url_for('update_validation_session', session_id=session.id)}
+
+@app.route('/validate/sessions/<session_id>', methods=['POST'])
+def update_validation_session(session_id):
+    # Either the edit as triples ("added"/"removed", Turtle or "format") or the whole edited model ("pimXML"/"data")
+    input_data = request.get_json()
+    session = validation_sessions.get(session_id)
+    if session is None:
+        return jsonify({'error': f'Unknown validation session: {session_id}'}), 404
+
+    data_format = input_data.get('format') or 'turtle'
+    try:
+        with session.lock:
+            if input_data.get('pimXML'):
+                report = session.replace(pim_string_to_rdf(input_data['pimXML']))
+            elif input_data.get('data'):
+                report = session.replace(input_data['data'], data_format)
+            else:
+                report = session.update(added=session.diff(input_data.get('added'), data_format),
+                                        removed=session.diff(input_data.get('removed'), data_format))
+            report = dict(report, session=session.id)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+    logger.info("revalidate", extra={'fields': dict(report['timings'], conforms=report['conforms'],
+                                                    rerun=report['rerun'], session=session.id)})
+    return jsonify(report), 200
+
+@app.route('/validate/sessions/<session_id>', methods=['DELETE'])
+def close_validation_session(session_id):
+    if validation_sessions.close(session_id) is None:
+        return jsonify({'error': f'Unknown validation session: {session_id}'}), 404
+    return jsonify({'session': session_id}), 200
+
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    return jsonify(stylesheet_cache.stats()), 200
+
 if __name__ == '__main__':
     # Set the port and host for Flask
     app.run(port=3000, host='0.0.0.0')
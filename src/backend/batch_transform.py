@@ -0,0 +1,276 @@
+"""
+Headless batch runner for the whole CIM -> PIM -> PSM -> Code chain.
+
+For every .drawio CIM model in a directory it applies the saved questionnaire answers,
+runs CIM-PIM.xsl, CIM-PIM-Aux.xsl and PIM-PSM.xsl in-process and then runs the Arduino
+code generator. With --validate, each PIM is also converted to RDF and checked against
+the SHACL shapes of semantics/semantic_validations right after CIM-PIM. Models are
+processed in parallel, one Saxon processor and stylesheet cache per worker process, so
+each stylesheet is compiled once per worker.
+
+Answers are read from <model>.answers.json next to the model (or from --answers-dir):
+
+    {
+        "cim-pim": {"modification_0_element_0_is_a_cpc": "true", ...},
+        "pim-psm": {...},
+        "parameters": {"platform": "arduino", "comm_tech": "mqtt"}
+    }
+
+"cim-pim" and "pim-psm" hold the questionnaire answers keyed like the fields of the
+browser questionnaire (modification_<rule>_element_<element>_<attribute>), with
+parameter tables given as lists of row objects.
+"""
+import argparse
+import contextlib
+import importlib.util
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from lxml import etree
+
+from pim_rdf import pim_string_to_rdf
+from pipeline import new_processor, run_pipeline
+from shacl_validation import DEFAULT_SEMANTICS_DIR, ShaclValidator
+from stylesheet_cache import StylesheetCache
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+INPUT_DIR = os.path.join(BACKEND_DIR, '..', 'frontend', 'static', 'input')
+GENERATOR_PATH = os.path.join(BACKEND_DIR, 'psm_to_code-arduinomkr1010.py')
+
+CIM_PIM_STYLESHEETS = ['CIM-PIM.xsl', 'CIM-PIM-Aux.xsl']
+PIM_PSM_STYLESHEETS = ['PIM-PSM.xsl']
+
+# Per-worker state, created by init_worker()
+worker = {}
+
+def init_worker(xsl_dir, rules_dir, semantics_dir=None):
+    """
+    Process pool initializer: one Saxon processor, stylesheet cache and copy of the
+    stylesheets and questionnaire rules per worker, reused for every model it handles.
+    With a semantics_dir, also one SHACL validator (ontology closure and shapes).
+    """
+    processor = new_processor()
+
+    def read(directory, name):
+        with open(os.path.join(directory, name), encoding='utf-8') as file:
+            return file.read()
+
+    worker['processor'] = processor
+    worker['stylesheet_cache'] = StylesheetCache(processor)
+    worker['stylesheets'] = {name: read(xsl_dir, name) for name in CIM_PIM_STYLESHEETS + PIM_PSM_STYLESHEETS}
+    worker['rules'] = {
+        'cim-pim': json.loads(read(rules_dir, 'CIM-PIM-Rules.json'))['modifications'],
+        'pim-psm': json.loads(read(rules_dir, 'PIM-PSM-Rules.json'))['modifications'],
+    }
+    worker['generator'] = load_generator()
+    worker['validator'] = ShaclValidator.from_directory(semantics_dir) if semantics_dir else None
+
+def load_generator():
+    # The generator is a standalone script with a dash in its name, so load it by path
+    spec = importlib.util.spec_from_file_location('psm_to_code', GENERATOR_PATH)
+    generator = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(generator)
+    return generator
+
+def is_answered(value):
+    # JavaScript truthiness, as in the browser: an empty parameters table still counts
+    return isinstance(value, (list, dict)) or bool(value)
+
+def answer_to_attribute(value):
+    # Mirror how the browser writes form values into the model
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return str(value)
+
+def apply_answers(input_xml, modification_rules, answers):
+    """
+    Apply saved questionnaire answers to a model, the same way the browser's
+    applyModifications() does with the answers of the questionnaire form.
+
+    Args:
+        input_xml (str): The model to modify.
+        modification_rules (list): The "modifications" of a *-Rules.json file.
+        answers (dict): Form field name -> answer.
+
+    Returns:
+        str: The modified model.
+    """
+    if not modification_rules or not answers:
+        return input_xml
+
+    document = etree.fromstring(input_xml.encode('utf-8'))
+
+    def apply_nested_attributes(node, attribute, parent_value, base_name):
+        additional = attribute.get('additionalAttribute')
+        if not (is_answered(parent_value) and additional and additional.get('conditional')):
+            return
+        if parent_value != additional['conditional']:
+            return
+        nested = additional['attribute']
+        nested_name = f"{base_name}_{nested['name']}"
+        nested_value = answers.get(nested_name)
+        if is_answered(nested_value):
+            node.set(nested['name'], answer_to_attribute(nested_value))
+        # Handle deeper nested attributes, if any
+        apply_nested_attributes(node, nested, nested_value, nested_name)
+
+    for mod_index, rule in enumerate(modification_rules):
+        for elem_index, node in enumerate(document.xpath(rule['xpath'])):
+            for attribute in rule['attributes']:
+                base_name = f"modification_{mod_index}_element_{elem_index}_{attribute['name']}"
+                value = answers.get(base_name)
+
+                if attribute.get('parametersTable'):
+                    if is_answered(value):
+                        node.set(attribute['name'], answer_to_attribute(value))
+                elif attribute.get('additionalAttribute', {}).get('conditional'):
+                    if is_answered(value):
+                        node.set(attribute['name'], answer_to_attribute(value))
+                        apply_nested_attributes(node, attribute, value, base_name)
+                elif attribute.get('options') or attribute.get('freeTextArea') or attribute.get('number'):
+                    if is_answered(value):
+                        node.set(attribute['name'], answer_to_attribute(value))
+
+    return etree.tostring(document, encoding='unicode')
+
+def process_model(model_path, answers_path, output_dir):
+    """
+    Run the whole chain for one model inside a worker process.
+
+    Returns:
+        dict: The model name, its output directory and the seconds spent per step.
+    """
+    model_name = os.path.splitext(os.path.basename(model_path))[0]
+    model_output = os.path.join(output_dir, model_name)
+    os.makedirs(model_output, exist_ok=True)
+    processor = worker['processor']
+    cache = worker['stylesheet_cache']
+    stylesheets = worker['stylesheets']
+    timings = {}
+
+    @contextlib.contextmanager
+    def step(name):
+        start = time.perf_counter()
+        yield
+        timings[name] = round(time.perf_counter() - start, 6)
+
+    answers = {}
+    if answers_path and os.path.isfile(answers_path):
+        with open(answers_path, encoding='utf-8') as file:
+            answers = json.load(file)
+    parameters = answers.get('parameters', {})
+
+    with open(model_path, encoding='utf-8') as file:
+        cim = file.read()
+
+    with step('cim_answers'):
+        cim = apply_answers(cim, worker['rules']['cim-pim'], answers.get('cim-pim'))
+    with step('cim_pim'):
+        pim = run_pipeline(processor, cache, cim, [stylesheets[name] for name in CIM_PIM_STYLESHEETS], parameters)
+
+    validation = None
+    if worker['validator'] is not None:
+        with step('pim_rdf'):
+            pim_graph = pim_string_to_rdf(pim)
+        with step('validate'):
+            validation = worker['validator'].validate(pim_graph)
+        with open(os.path.join(model_output, 'validation.json'), 'w', encoding='utf-8') as file:
+            json.dump(validation, file, indent=2)
+    with step('pim_answers'):
+        pim = apply_answers(pim, worker['rules']['pim-psm'], answers.get('pim-psm'))
+    with step('pim_psm'):
+        psm = run_pipeline(processor, cache, pim, [stylesheets[name] for name in PIM_PSM_STYLESHEETS], parameters)
+
+    psm_path = os.path.join(model_output, 'psm.xml')
+    with open(os.path.join(model_output, 'pim.xml'), 'w', encoding='utf-8') as file:
+        file.write(pim)
+    with open(psm_path, 'w', encoding='utf-8') as file:
+        file.write(psm)
+
+    with step('code'):
+        generator = worker['generator']
+        # Keep the generator's progress output in a log file instead of the batch summary
+        with open(os.path.join(model_output, 'psm_to_code.log'), 'w') as log, contextlib.redirect_stdout(log):
+            root_attributes, cpcs = generator.stream_psm(psm_path)
+            generator.process_cpcs(cpcs, generator.get_cps_id(root_attributes),
+                                   output_root=os.path.join(model_output, 'code'))
+
+    timings['total'] = round(sum(timings.values()), 6)
+    result = {'model': model_name, 'output': model_output, 'timings': timings}
+    if validation is not None:
+        result['conforms'] = validation['conforms']
+        result['violations'] = sum(len(shapes['violations']) for shapes in validation['shapes'].values())
+    return result
+
+def find_models(models_dir, answers_dir):
+    """Return (model path, answers path) pairs for every .drawio file of a directory."""
+    models = []
+    for name in sorted(os.listdir(models_dir)):
+        if name.endswith('.drawio'):
+            answers_name = os.path.splitext(name)[0] + '.answers.json'
+            models.append((os.path.join(models_dir, name), os.path.join(answers_dir or models_dir, answers_name)))
+    return models
+
+def print_summary(results, failures, wall_seconds):
+    steps = ['cim_answers', 'cim_pim', 'pim_rdf', 'validate', 'pim_answers', 'pim_psm', 'code', 'total']
+    steps = [step for step in steps if any(step in result['timings'] for result in results)]
+    width = max([len('model')] + [len(result['model']) for result in results])
+    print(f"{'model':<{width}}  " + "  ".join(f"{step:>11}" for step in steps))
+    for result in sorted(results, key=lambda result: result['model']):
+        print(f"{result['model']:<{width}}  " + "  ".join(f"{result['timings'][step]:>10.3f}s" for step in steps))
+    for result in sorted(results, key=lambda result: result['model']):
+        if result.get('conforms') is False:
+            print(f"{result['model']}: {result['violations']} SHACL violation(s), see {os.path.join(result['output'], 'validation.json')}")
+    for model, error in failures:
+        print(f"{model}: FAILED - {error}")
+    print(f"{len(results)} model(s) transformed, {len(failures)} failed in {wall_seconds:.3f}s")
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the CIM -> PIM -> PSM -> Code chain for a directory of .drawio CIM models.")
+    parser.add_argument("models_dir", help="Directory containing the .drawio CIM models")
+    parser.add_argument("--answers-dir", help="Directory containing the <model>.answers.json files (default: models_dir)")
+    parser.add_argument("--output", "-o", default="batch_output", help="Output directory (default: batch_output)")
+    parser.add_argument("--jobs", "-j", type=int, default=os.cpu_count() or 1, help="Number of models transformed in parallel (default: number of CPUs)")
+    parser.add_argument("--xsl-dir", default=os.path.join(INPUT_DIR, 'xsl'), help="Directory containing the XSLT stylesheets")
+    parser.add_argument("--rules-dir", default=os.path.join(INPUT_DIR, 'json'), help="Directory containing the questionnaire rules")
+    parser.add_argument("--validate", action="store_true", help="Check each PIM against the SHACL shapes right after CIM-PIM")
+    parser.add_argument("--semantics-dir", default=DEFAULT_SEMANTICS_DIR, help="Directory containing the ontology and the shapes_case*.ttl files")
+    parser.add_argument("--summary-json", metavar="PATH", help="Also write the per-model timings to PATH as JSON")
+    args = parser.parse_args()
+
+    models = find_models(args.models_dir, args.answers_dir)
+    if not models:
+        print(f"No .drawio models found in {args.models_dir}")
+        return 1
+
+    start = time.perf_counter()
+    results, failures = [], []
+    # Saxon runs in its own runtime; start workers fresh instead of forking this process
+    with ProcessPoolExecutor(max_workers=max(1, args.jobs), mp_context=multiprocessing.get_context('spawn'),
+                             initializer=init_worker, initargs=(args.xsl_dir, args.rules_dir, args.semantics_dir if args.validate else None)) as executor:
+        futures = {executor.submit(process_model, model, answers, args.output): model for model, answers in models}
+        for future in as_completed(futures):
+            model = os.path.basename(futures[future])
+            try:
+                results.append(future.result())
+                print(f"Transformed {model}")
+            except Exception as e:
+                failures.append((model, str(e)))
+                print(f"Failed {model}: {e}")
+    wall_seconds = time.perf_counter() - start
+
+    print_summary(results, failures, wall_seconds)
+    if args.summary_json:
+        with open(args.summary_json, 'w') as file:
+            json.dump({'models': results, 'failures': dict(failures), 'wall_seconds': round(wall_seconds, 6)}, file, indent=2)
+
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,196 @@
+"""
+Batch SHACL validation of many data graphs against many shapes files.
+
+The ontology is parsed and its OWL-RL closure computed once, in this process, together
+with the shapes; the loaded validator is then handed to a pool of worker processes, which
+check the data graphs in parallel. Each data graph is parsed and completed with what the
+ontology entails about it once, and then checked against every shapes file.
+
+Data graphs are RDF files (.ttl, .nt, .rdf, .jsonld, ...) or PIM models (.xml),
+which are converted with pim_rdf. Directories are searched for the files whose names
+match --pattern (by default data_* and *.xml), so the shapes, ontology metadata and
+pyshacl reports kept next to the data cases are left out. Files named explicitly are
+always validated.
+
+    python batch_validate.py ../../semantics/semantic_validations/data_case*.ttl --report report.json
+"""
+import argparse
+import fnmatch
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from rdflib import Graph
+from rdflib.util import guess_format
+
+from pim_rdf import pim_to_rdf
+from shacl_validation import DEFAULT_SEMANTICS_DIR, ONTOLOGY_FILE, SHAPES_PATTERN, ShaclValidator
+
+PIM_EXTENSIONS = ('.xml',)
+# File names validated when a directory is expanded
+DATA_PATTERNS = ('data_*', '*.xml')
+
+# Per-worker state, set by init_worker()
+worker = {}
+
+def init_worker(validator):
+    # The validator arrives already loaded (pickled), so workers never re-run OWL-RL
+    worker['validator'] = validator
+
+def is_data_file(path):
+    return path.endswith(PIM_EXTENSIONS) or guess_format(path) is not None
+
+def find_data(paths, shapes_paths=(), ontology_path=None, patterns=DATA_PATTERNS):
+    """
+    Data graph files among paths, expanding directories to the files whose names match one of
+    patterns (and skipping the shapes and the ontology).
+    """
+    excluded = {os.path.abspath(path) for path in list(shapes_paths) + [ontology_path] if path}
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            candidates = sorted(os.path.join(path, name) for name in os.listdir(path)
+                                if any(fnmatch.fnmatch(name, pattern) for pattern in patterns))
+        else:
+            candidates = [path]
+        for candidate in candidates:
+            if os.path.isfile(candidate) and is_data_file(candidate) and os.path.abspath(candidate) not in excluded:
+                found.append(candidate)
+    return found
+
+def load_data(path):
+    if path.endswith(PIM_EXTENSIONS):
+        return pim_to_rdf(path)
+    return Graph().parse(path, format=guess_format(path))
+
+def validate_file(path):
+    """
+    Validate one data graph against every shapes file inside a worker process.
+
+    Returns:
+        dict: The model, its report (see ShaclValidator.validate()) and the time spent
+        loading it, in milliseconds.
+    """
+    start = time.perf_counter()
+    data = load_data(path)
+    load_ms = round((time.perf_counter() - start) * 1000, 3)
+
+    report = worker['validator'].validate(data)
+    report['timings']['load_ms'] = load_ms
+    report['timings']['total_ms'] = round(report['timings']['total_ms'] + load_ms, 3)
+    report['model'] = path
+    report['triples'] = len(data)
+    return report
+
+def aggregate(reports, failures, shapes_names, load_seconds, wall_seconds):
+    """
+    One report for the whole batch: per model, its timings and the violations of each
+    shapes file; per shapes file, the models it was run on, how many did not conform,
+    the violations found and the time spent.
+    """
+    shapes = {name: {'models': 0, 'non_conforming': 0, 'violations': 0, 'total_ms': 0.0} for name in shapes_names}
+    models = []
+    for report in sorted(reports, key=lambda report: report['model']):
+        for name, result in report['shapes'].items():
+            summary = shapes[name]
+            summary['models'] += 1
+            summary['non_conforming'] += not result['conforms']
+            summary['violations'] += len(result['violations'])
+            summary['total_ms'] += result['milliseconds']
+        models.append({
+            'model': report['model'],
+            'triples': report['triples'],
+            'conforms': report['conforms'],
+            'violations': sum(len(result['violations']) for result in report['shapes'].values()),
+            'timings': report['timings'],
+            'shapes': report['shapes'],
+        })
+    for summary in shapes.values():
+        summary['total_ms'] = round(summary['total_ms'], 3)
+        summary['mean_ms'] = round(summary['total_ms'] / summary['models'], 3) if summary['models'] else None
+
+    return {
+        'conforms': not failures and all(model['conforms'] for model in models),
+        'models': models,
+        'shapes': shapes,
+        'failures': dict(failures),
+        'load_seconds': round(load_seconds, 6),
+        'wall_seconds': round(wall_seconds, 6),
+    }
+
+def print_summary(summary):
+    names = list(summary['shapes'])
+    # Shapes files are numbered in the table (violations and time per model) and named below it
+    columns = [f"#{index + 1}" for index in range(len(names))]
+    width = max([len('model')] + [len(os.path.basename(model['model'])) for model in summary['models']])
+    print(f"{'model':<{width}}  {'triples':>8}  " + "  ".join(f"{column:>13}" for column in columns) + f"  {'total':>10}")
+    for model in summary['models']:
+        cells = []
+        for name in names:
+            result = model['shapes'][name]
+            cells.append(f"{len(result['violations']):>3} {result['milliseconds']:>7.1f}ms")
+        print(f"{os.path.basename(model['model']):<{width}}  {model['triples']:>8}  " + "  ".join(cells)
+              + f"  {model['timings']['total_ms']:>8.1f}ms")
+    print()
+    for column, name in zip(columns, names):
+        shapes = summary['shapes'][name]
+        mean = f"{shapes['mean_ms']:.1f}ms" if shapes['mean_ms'] is not None else "-"
+        print(f"{column} {name}: {shapes['violations']} violation(s) in {shapes['non_conforming']}/{shapes['models']} "
+              f"model(s), {shapes['total_ms']:.1f}ms in total, {mean} per model")
+    for model, error in summary['failures'].items():
+        print(f"{model}: FAILED - {error}")
+    conforming = sum(model['conforms'] for model in summary['models'])
+    print(f"{conforming}/{len(summary['models'])} model(s) conform; ontology and shapes loaded in "
+          f"{summary['load_seconds']:.3f}s, batch validated in {summary['wall_seconds']:.3f}s")
+
+def main():
+    parser = argparse.ArgumentParser(description="Validate data graphs or PIM models against SHACL shapes files.")
+    parser.add_argument("data", nargs='+', help="Data graph files, PIM models or directories containing them")
+    parser.add_argument("--shapes", nargs='+', help=f"Shapes files (default: {SHAPES_PATTERN} of --semantics-dir)")
+    parser.add_argument("--ontology", help=f"Ontology (default: {ONTOLOGY_FILE} of --semantics-dir)")
+    parser.add_argument("--semantics-dir", default=DEFAULT_SEMANTICS_DIR, help="Directory containing the ontology and the shapes")
+    parser.add_argument("--pattern", action="append", dest="patterns", metavar="GLOB",
+                        help=f"File names to validate in the data directories, repeatable (default: {' '.join(DATA_PATTERNS)})")
+    parser.add_argument("--jobs", "-j", type=int, default=os.cpu_count() or 1, help="Number of data graphs validated in parallel (default: number of CPUs)")
+    parser.add_argument("--report", metavar="PATH", help="Write the aggregated report, with every violation, to PATH as JSON")
+    args = parser.parse_args()
+
+    shapes_paths = args.shapes or sorted(glob.glob(os.path.join(args.semantics_dir, SHAPES_PATTERN)))
+    ontology_path = args.ontology or os.path.join(args.semantics_dir, ONTOLOGY_FILE)
+    paths = find_data(args.data, shapes_paths, ontology_path, args.patterns or DATA_PATTERNS)
+    if not paths:
+        print("No data graphs found")
+        return 1
+    if not shapes_paths:
+        print("No shapes files found")
+        return 1
+
+    start = time.perf_counter()
+    validator = ShaclValidator(ontology_path, shapes_paths)
+    load_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    reports, failures = [], []
+    with ProcessPoolExecutor(max_workers=max(1, min(args.jobs, len(paths))), initializer=init_worker,
+                             initargs=(validator,)) as executor:
+        futures = {executor.submit(validate_file, path): path for path in paths}
+        for future in as_completed(futures):
+            try:
+                reports.append(future.result())
+            except Exception as e:
+                failures.append((futures[future], str(e)))
+    wall_seconds = time.perf_counter() - start
+
+    summary = aggregate(reports, failures, list(validator.shapes), load_seconds, wall_seconds)
+    print_summary(summary)
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as file:
+            json.dump(summary, file, indent=2)
+
+    return 0 if summary['conforms'] else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,156 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while the queue already holds `max_pending` jobs."""
+
+
+class JobCancelledError(Exception):
+    """Raised inside a running job when it notices that it has been cancelled."""
+
+
+class Job:
+    """
+    A transformation submitted to the JobQueue, with its status, timings and outcome.
+
+    Status goes from 'queued' to 'running' and then to 'done', 'failed' or 'cancelled'.
+    A job can be cancelled while queued; a running job is stopped at its next
+    check_cancelled() call (e.g. between two pipeline stages).
+    """
+
+    FINISHED = ('done', 'failed', 'cancelled')
+
+    def __init__(self):
+        self.id = uuid.uuid4().hex
+        self.status = 'queued'
+        self.progress = None
+        self.result = None
+        self.error = None
+        self.structure = None
+        self.validation = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._cancel_requested = threading.Event()
+
+    @property
+    def finished(self):
+        return self.status in self.FINISHED
+
+    def check_cancelled(self):
+        if self._cancel_requested.is_set():
+            raise JobCancelledError()
+
+    def to_dict(self):
+        now = time.time()
+        started_at = self.started_at or self.finished_at or now
+        return {
+            'id': self.id,
+            'status': self.status,
+            'progress': self.progress,
+            'error': self.error,
+            'structure': self.structure,
+            'validation': self.validation,
+            'queued_seconds': round(started_at - self.created_at, 3),
+            'run_seconds': round((self.finished_at or now) - self.started_at, 3) if self.started_at else None,
+        }
+
+
+class JobQueue:
+    """
+    In-process job queue backed by a pool of worker threads.
+
+    At most `max_pending` jobs can be queued or running at the same time; further
+    submissions raise QueueFullError. The last `history_size` finished jobs are kept
+    so their status and result can still be fetched.
+    """
+
+    def __init__(self, workers=2, max_pending=16, history_size=100):
+        self.max_pending = max_pending
+        self.history_size = history_size
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='job-worker')
+        self._jobs = OrderedDict()
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def submit(self, function, *args, **kwargs):
+        """
+        Queue `function(job, *args, **kwargs)`; its return value becomes the job result.
+
+        Returns:
+            Job: The queued job.
+        """
+        job = Job()
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise QueueFullError(f"Job queue is full ({self.max_pending} pending jobs).")
+            self._pending += 1
+            self._jobs[job.id] = job
+            self._trim_history()
+
+        self._executor.submit(self._run, job, function, args, kwargs)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """
+        Request cancellation of a job. Returns the job, or None if it is unknown.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.finished:
+                return job
+            job._cancel_requested.set()
+            if job.status == 'queued':
+                # The worker will skip it when it is dequeued
+                self._finish(job, 'cancelled')
+        return job
+
+    def stats(self):
+        with self._lock:
+            statuses = {}
+            for job in self._jobs.values():
+                statuses[job.status] = statuses.get(job.status, 0) + 1
+            return {'pending': self._pending, 'max_pending': self.max_pending, 'jobs': statuses}
+
+    def _run(self, job, function, args, kwargs):
+        with self._lock:
+            if job.finished:
+                return
+            job.status = 'running'
+            job.started_at = time.time()
+
+        try:
+            result = function(job, *args, **kwargs)
+        except JobCancelledError:
+            outcome, result, error = 'cancelled', None, None
+        except Exception as e:
+            outcome, result, error = 'failed', None, str(e)
+        else:
+            outcome, error = 'done', None
+
+        with self._lock:
+            if job._cancel_requested.is_set():
+                outcome, result, error = 'cancelled', None, None
+            job.result = result
+            job.error = error
+            self._finish(job, outcome)
+
+    def _finish(self, job, status):
+        # Called with the lock held
+        job.status = status
+        job.finished_at = time.time()
+        self._pending -= 1
+
+    def _trim_history(self):
+        # Called with the lock held; forget the oldest finished jobs beyond history_size
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(finished) - self.history_size)]:
+            del self._jobs[job_id]
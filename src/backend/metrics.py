@@ -0,0 +1,82 @@
+import time
+
+from flask import g, request
+from prometheus_client import Counter, Gauge, Histogram, REGISTRY, CONTENT_TYPE_LATEST, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+# Latency buckets (seconds) from a cached single-stage run up to a multi-minute CIM->PIM run
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+REQUESTS = Counter('backend_requests_total', 'HTTP requests handled', ['endpoint', 'method', 'status'])
+REQUEST_SECONDS = Histogram('backend_request_seconds', 'HTTP request latency', ['endpoint'], buckets=LATENCY_BUCKETS)
+IN_FLIGHT = Gauge('backend_requests_in_flight', 'HTTP requests currently being handled')
+
+PHASE_SECONDS = Histogram('xslt_phase_seconds', 'Time spent per transformation phase (parse, compile, transform, serialize)',
+                          ['phase'], buckets=LATENCY_BUCKETS)
+DOCUMENT_BYTES = Counter('xslt_document_bytes_total', 'Size of the transformed documents', ['direction'])
+DOCUMENTS = Counter('xslt_documents_total', 'Number of transformed documents', ['direction'])
+
+
+class StylesheetCacheCollector:
+    """Expose the StylesheetCache statistics at scrape time."""
+
+    def __init__(self, stylesheet_cache):
+        self.stylesheet_cache = stylesheet_cache
+
+    def collect(self):
+        stats = self.stylesheet_cache.stats()
+        yield GaugeMetricFamily('xslt_stylesheet_cache_entries', 'Compiled stylesheets in the cache', value=stats['size'])
+        yield GaugeMetricFamily('xslt_stylesheet_cache_capacity', 'Maximum number of cached stylesheets', value=stats['max_size'])
+        yield CounterMetricFamily('xslt_stylesheet_cache_hits', 'Stylesheet cache hits', value=stats['hits'])
+        yield CounterMetricFamily('xslt_stylesheet_cache_misses', 'Stylesheet cache misses (compilations)', value=stats['misses'])
+        yield CounterMetricFamily('xslt_stylesheet_cache_evictions', 'Stylesheets evicted from the cache', value=stats['evictions'])
+
+
+def register_stylesheet_cache(stylesheet_cache):
+    REGISTRY.register(StylesheetCacheCollector(stylesheet_cache))
+
+
+def register_job_queue(job_queue):
+    pending = Gauge('backend_jobs_pending', 'Jobs queued or running')
+    pending.set_function(lambda: job_queue.stats()['pending'])
+
+
+def observe_pipeline(timings, input_bytes, output_bytes=None):
+    """Record the phase timings and document sizes of one pipeline run."""
+    for phase, seconds in timings.phases.items():
+        PHASE_SECONDS.labels(phase).observe(seconds)
+    DOCUMENTS.labels('input').inc()
+    DOCUMENT_BYTES.labels('input').inc(input_bytes)
+    if output_bytes is not None:
+        DOCUMENTS.labels('output').inc()
+        DOCUMENT_BYTES.labels('output').inc(output_bytes)
+
+
+def instrument_app(app):
+    """Count, time and track in-flight requests of a Flask app, and serve them on /metrics."""
+
+    def endpoint_label():
+        # The route pattern, so job ids don't create one series per job
+        return request.url_rule.rule if request.url_rule else 'unmatched'
+
+    @app.before_request
+    def start_request_timer():
+        g.request_start = time.perf_counter()
+        IN_FLIGHT.inc()
+
+    @app.after_request
+    def count_request(response):
+        REQUESTS.labels(endpoint_label(), request.method, str(response.status_code)).inc()
+        return response
+
+    @app.teardown_request
+    def stop_request_timer(exception=None):
+        # Streamed responses tear the request down again once the stream ends; only count it once
+        start = g.pop('request_start', None)
+        if start is not None:
+            REQUEST_SECONDS.labels(endpoint_label()).observe(time.perf_counter() - start)
+            IN_FLIGHT.dec()
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        return generate_latest(), 200, {'Content-Type': CONTENT_TYPE_LATEST}
@@ -0,0 +1,175 @@
+"""
+Streaming conversion of a PIM (draw.io mxfile) into an RDF graph in the vocabulary of the
+PIM ontology (semantics/semantic_validations/dsl_pim_mdd4cps.ttl), for SHACL validation.
+
+The model is read in a single pass with iterparse, one <object> at a time, and each
+element is dropped once its triples are emitted. The only state kept is the type of every
+element and the edges and containers that point to elements further down the file.
+
+    cps_component                   :CPComponent
+    operational_goal / action       :OnIntervalAction / :OnDemandAction
+    and_ref_operator / or_...       :RefinementOperator with :hasRefinementType :AND / :OR
+    hw_resource / sw_resource       :HWResource / :SWResource
+    comm_thread / listener_thread   :MessageSender / :MessageReceiver
+
+Elements drawn inside a component are linked to it with :containsElement / :isContainedIn,
+every component is linked to the model with :hasComponent, and the relations become
+:hasChildAction, :hasRefinementOperator, :isNeededBy, :deliversTo, :extractsFrom and
+:forwardsTo.
+"""
+import io
+import re
+from urllib.parse import quote
+
+from lxml import etree
+from rdflib import Graph, Literal, Namespace
+from rdflib.namespace import RDF, XSD
+
+PIM = Namespace("https://example.org/mdd4cps/pim#")
+MODEL_NAMESPACE = "https://example.org/mdd4cps/model/"
+
+CLASSES = {
+    'cps_component': PIM.CPComponent,
+    'operational_goal': PIM.OnIntervalAction,
+    'action': PIM.OnDemandAction,
+    'and_ref_operator': PIM.RefinementOperator,
+    'or_ref_operator': PIM.RefinementOperator,
+    'hw_resource': PIM.HWResource,
+    'sw_resource': PIM.SWResource,
+    'comm_thread': PIM.MessageSender,
+    'listener_thread': PIM.MessageReceiver,
+}
+REFINEMENT_TYPES = {'and_ref_operator': PIM.AND, 'or_ref_operator': PIM.OR}
+ACTIONS = ('operational_goal', 'action')
+OPERATORS = ('and_ref_operator', 'or_ref_operator')
+RESOURCES = ('hw_resource', 'sw_resource')
+
+# Model attribute -> ontology property, by datatype. Empty attributes are left out.
+STRING_PROPERTIES = (
+    'name', 'description', 'id_cim_name', 'id_cim_parent', 'id_cim_type',
+    'input_parameters', 'output_parameters', 'data_structure', 'dependum_data_structure',
+    'operation_modes_description', 'ifsg_softgoal_id', 'ifsg_softgoal_name',
+    'qualification_array', 'contribution_array',
+)
+BOOLEAN_PROPERTIES = ('operation_modes_enabled', 'cim_dependeeElmnt_is_softgoal', 'cim_dependerElmnt_is_softgoal')
+INTEGER_PROPERTIES = ('interval_in_milliseconds',)
+
+INTEGER = re.compile(r'^\s*[+-]?\d+\s*$')
+
+
+def literal(attribute, value):
+    if attribute in BOOLEAN_PROPERTIES:
+        return Literal(value.strip().lower(), datatype=XSD.boolean)
+    if attribute in INTEGER_PROPERTIES:
+        # Keep non-numeric intervals as they are written, so the shapes report them
+        if INTEGER.match(value):
+            return Literal(int(value))
+        return Literal(value, datatype=XSD.integer)
+    return Literal(value)
+
+
+def individual(namespace, element_id):
+    """The IRI of a model element, by its draw.io id."""
+    return Namespace(namespace)[quote(element_id, safe='')]
+
+
+def pim_to_rdf(source, namespace=MODEL_NAMESPACE):
+    """
+    Convert a PIM into an RDF graph.
+
+    Args:
+        source: Path or binary file object of the PIM (use pim_string_to_rdf() for XML text).
+        namespace (str): Namespace of the model's individuals, followed by the element ids.
+
+    Returns:
+        Graph: The model's individuals, with "" bound to the PIM ontology and "model" to namespace.
+    """
+    model = Namespace(namespace)
+    graph = Graph(bind_namespaces='core')
+    graph.bind('', PIM)
+    graph.bind('model', model)
+    add = graph.add
+
+    def node(element_id):
+        return individual(model, element_id)
+
+    types = {}         # element id -> PIM type of every converted element
+    containers = []    # (element id, id of the cell it is drawn in)
+    edges = []         # (type, source id, target id)
+    model_node = None
+
+    for event, element in etree.iterparse(source, events=('start', 'end'), tag=('diagram', 'object', 'UserObject'),
+                                          huge_tree=True):
+        if element.tag == 'diagram':
+            if event == 'start' and model_node is None:
+                model_node = node(element.get('id') or 'model')
+                add((model_node, RDF.type, PIM.CPModel))
+            continue
+        if event == 'start':
+            continue
+
+        element_type = element.get('type')
+        element_id = element.get('id')
+        cell = element.find('mxCell')
+        if cell is not None and element_type in ('relation_from_to', 'comm_relation'):
+            edges.append((element_type, cell.get('source'), cell.get('target')))
+        elif element_type in CLASSES and element_id:
+            subject = node(element_id)
+            types[element_id] = element_type
+            add((subject, RDF.type, CLASSES[element_type]))
+            if element_type != 'cps_component':
+                add((subject, PIM.id, Literal(element_id)))
+            if element_type in REFINEMENT_TYPES:
+                add((subject, PIM.hasRefinementType, REFINEMENT_TYPES[element_type]))
+            for attribute, value in element.attrib.items():
+                if value and (attribute in STRING_PROPERTIES or attribute in BOOLEAN_PROPERTIES
+                              or attribute in INTEGER_PROPERTIES):
+                    add((subject, PIM[attribute], literal(attribute, value)))
+            if cell is not None and cell.get('parent'):
+                containers.append((element_id, cell.get('parent')))
+
+        # Done with this element: free it and the siblings before it
+        element.clear()
+        while element.getprevious() is not None:
+            del element.getparent()[0]
+
+    if model_node is None:
+        model_node = node('model')
+        add((model_node, RDF.type, PIM.CPModel))
+    for element_id, element_type in types.items():
+        if element_type == 'cps_component':
+            add((model_node, PIM.hasComponent, node(element_id)))
+
+    for element_id, parent in containers:
+        if types.get(parent) == 'cps_component':
+            add((node(parent), PIM.containsElement, node(element_id)))
+            add((node(element_id), PIM.isContainedIn, node(parent)))
+
+    for edge_type, source_id, target_id in edges:
+        source_type, target_type = types.get(source_id), types.get(target_id)
+        if source_type is None or target_type is None:
+            continue
+        source, target = node(source_id), node(target_id)
+        if edge_type == 'relation_from_to':
+            if source_type in OPERATORS and target_type in ACTIONS:
+                # The operator refines the action it points to
+                add((target, PIM.hasRefinementOperator, source))
+            elif source_type in ACTIONS and target_type in OPERATORS:
+                add((target, PIM.hasChildAction, source))
+            elif source_type in RESOURCES and target_type in ACTIONS:
+                add((source, PIM.isNeededBy, target))
+        elif source_type == 'comm_thread' and target_type == 'listener_thread':
+            add((source, PIM.deliversTo, target))
+        elif target_type == 'comm_thread':
+            # The element the sender takes its data from (the dependee)
+            add((target, PIM.extractsFrom, source))
+        elif source_type == 'listener_thread':
+            # The element the receiver hands the data to (the depender)
+            add((source, PIM.forwardsTo, target))
+
+    return graph
+
+
+def pim_string_to_rdf(pim_xml, namespace=MODEL_NAMESPACE):
+    """Like pim_to_rdf(), for a PIM held in a string."""
+    return pim_to_rdf(io.BytesIO(pim_xml.encode('utf-8')), namespace)
@@ -0,0 +1,114 @@
+import saxonche
+
+from request_logging import StageTimings
+
+# The JDK parser caps the accumulated size of entity references (&quot;, &amp;, ...) in a document
+# at 100,000 characters. Serialized PIMs carry their JSON attributes as &quot;, so models of a few
+# dozen CPCs went over it. Entity expansion limits, which guard against entity bombs, stay in place.
+PARSER_PROPERTY = "http://saxon.sf.net/feature/parserProperty?uri=http%3A%2F%2Fwww.oracle.com%2Fxml%2Fjaxp%2Fproperties%2F"
+LIFTED_PARSER_LIMITS = ("maxGeneralEntitySizeLimit", "totalEntitySizeLimit")
+
+# Identity stylesheet used to serialize an intermediate result (see serialize())
+SERIALIZER_STYLESHEET = """<xsl:stylesheet version="3.0" xmlns:xsl="http://www.w3.org/1999/XSL/Transform">
+    <xsl:mode on-no-match="shallow-copy"/>
+</xsl:stylesheet>"""
+
+# Name of the root element of a document, as text
+ROOT_NAME_STYLESHEET = """<xsl:stylesheet version="3.0" xmlns:xsl="http://www.w3.org/1999/XSL/Transform">
+    <xsl:output method="text"/>
+    <xsl:template match="/"><xsl:value-of select="name(*)"/></xsl:template>
+</xsl:stylesheet>"""
+
+def new_processor():
+    """Create a Saxon processor whose XML parser accepts models of any size."""
+    processor = saxonche.PySaxonProcessor(license=False)
+    for limit in LIFTED_PARSER_LIMITS:
+        processor.set_configuration_property(PARSER_PROPERTY + limit, "0")
+    return processor
+
+def run_pipeline(processor, stylesheet_cache, input_xml, stylesheets, parameters=None, on_stage=None, pretty=False,
+                 timings=None, on_result=None):
+    """
+    Run a chain of XSLT stylesheets over one input document in a single Saxon session.
+
+    The input is parsed once; every intermediate result is handed to the next
+    stage as an in-memory XDM tree, and only the last stage is serialized, by
+    Saxon as it transforms, with the output settings of its stylesheet.
+
+    Args:
+        processor (PySaxonProcessor): The Saxon processor used to parse the input.
+        stylesheet_cache (StylesheetCache): Cache providing compiled executables.
+        input_xml (str): The XML document to transform.
+        stylesheets (list): Ordered list of XSLT stylesheet sources.
+        parameters (dict): Stylesheet parameters (name -> string value) supplied
+            to every stage. Stages that don't declare a parameter ignore it.
+        on_stage (callable): Optional callback called as on_stage(index, count)
+            before each stage runs. Exceptions it raises abort the pipeline.
+        pretty (bool): Have Saxon indent the serialized result. Intermediate
+            stages are never serialized, so they are never indented.
+        timings (StageTimings): Optional collector for the parse, compile and
+            transform times and the stylesheet cache hits. The transform time of
+            the last stage includes serializing its result.
+        on_result (callable): Optional callback called as on_result(index, node)
+            with the XDM tree each intermediate stage produces. The last stage
+            is serialized directly and never produces a tree.
+
+    Returns:
+        str: The serialized result of the last stage.
+    """
+    parameters = parameters or {}
+    timings = timings if timings is not None else StageTimings()
+
+    with timings.measure("parse"):
+        node = processor.parse_xml(xml_text=input_xml)
+
+    last_stage = len(stylesheets) - 1
+    for index, stylesheet_text in enumerate(stylesheets):
+        if on_stage is not None:
+            on_stage(index, len(stylesheets))
+
+        executable = get_executable(stylesheet_cache, stylesheet_text, timings)
+        for name, value in parameters.items():
+            executable.set_parameter(name, processor.make_string_value(str(value)))
+
+        if index == last_stage:
+            if pretty:
+                executable.set_property("!indent", "yes")
+            with timings.measure("transform"):
+                return executable.transform_to_string(xdm_node=node)
+
+        # Keep the result as a tree for the next stage
+        with timings.measure("transform"):
+            node = executable.transform_to_value(xdm_node=node).head
+        if on_result is not None:
+            on_result(index, node)
+
+def serialize(stylesheet_cache, node, pretty=False, timings=None):
+    """
+    Serialize an XDM tree, e.g. an intermediate result handed to on_result by run_pipeline().
+    The final result of run_pipeline() never goes through this extra identity transform.
+    """
+    timings = timings if timings is not None else StageTimings()
+    serializer = get_executable(stylesheet_cache, SERIALIZER_STYLESHEET, timings)
+    if pretty:
+        serializer.set_property("!indent", "yes")
+    with timings.measure("serialize"):
+        return serializer.transform_to_string(xdm_node=node)
+
+def document_element_name(stylesheet_cache, node, timings=None):
+    """Name of the root element of an XDM document, or None if it has none."""
+    # Read through a stylesheet rather than the node's accessors, which crash Saxon when called
+    # from a thread other than the main one (the job workers)
+    timings = timings if timings is not None else StageTimings()
+    executable = get_executable(stylesheet_cache, ROOT_NAME_STYLESHEET, timings)
+    with timings.measure("transform"):
+        return executable.transform_to_string(xdm_node=node) or None
+
+def get_executable(stylesheet_cache, stylesheet_text, timings):
+    with timings.measure("compile"):
+        executable, hit = stylesheet_cache.lookup(stylesheet_text)
+    if hit:
+        timings.cache_hits += 1
+    else:
+        timings.cache_misses += 1
+    return executable
@@ -1,11 +1,23 @@
-import sys
 import os
 import json
+import argparse
+import hashlib
+import time
+from concurrent.futures import ProcessPoolExecutor
 from xml.etree import ElementTree as ET
 import re
+import html
+from collections import defaultdict
+from contextlib import contextmanager
+from functools import cached_property, lru_cache
+
+from request_logging import StageTimings
 
 debug = True
 
+# Name of the incremental-generation manifest stored in the output directory
+MANIFEST_FILE = ".psm_to_code_manifest.json"
+
 # Define the type mapping for Arduino-supported types
 type_mapping = {
     "int": {"arduino_type": "int", "default_value": "0"},
@@ -15,47 +27,222 @@ type_mapping = {
     "bool": {"arduino_type": "bool", "default_value": "false"}
 }
 
-def strip_html_tags(text):
-    if text:
-        return re.sub(r"<.*?>", "", text)
-    return text
+class SketchWriter:
+    """
+    Buffer for generated sketch code.
+
+    Fragments are collected in a list and joined (or streamed to the output file)
+    only once, so assembling a sketch stays linear in its size. The writer tracks the
+    current indentation itself: blocks and lines written inside nested indented()
+    sections get all enclosing indentation applied in a single pass.
+    """
+
+    def __init__(self):
+        self._parts = []
+        self._indentation = ""
+
+    def __bool__(self):
+        return any(self._parts)
+
+    @contextmanager
+    def indented(self, indent_str="    "):
+        previous = self._indentation
+        self._indentation = previous + indent_str
+        try:
+            yield self
+        finally:
+            self._indentation = previous
+
+    def write(self, text):
+        """Append text as is, without indentation."""
+        self._parts.append(text)
+
+    def write_line(self, line=""):
+        """Append one line, indented unless it is blank."""
+        self._parts.append((self._indentation + line if line.strip() else line) + "\n")
+
+    def write_block(self, text):
+        """
+        Append a multi-line block with the current indentation applied to each non-blank
+        line. As with apply_indentation_to_text, the trailing newline of the block is dropped.
+        """
+        self._parts.append(apply_indentation_to_text(text, self._indentation))
+
+    def extend(self, other):
+        """Append everything written to another SketchWriter."""
+        self._parts.extend(other._parts)
+
+    def getvalue(self):
+        return "".join(self._parts)
+
+    def matches_file(self, file_path):
+        """Compare the buffer with an existing file, fragment by fragment."""
+        with open(file_path, 'r') as file:
+            for part in self._parts:
+                if file.read(len(part)) != part:
+                    return False
+            return file.read(1) == ""
+
+    def write_to(self, file):
+        file.writelines(self._parts)
+
+class ElementRecord:
+    """
+    Lightweight view of a PSM element that normalizes its name and decodes its JSON
+    attributes at most once, however many generator functions read them.
+
+    Plain attribute access is still available through get(), as on the element.
+    Decoding errors are not cached, so they surface at every use like json.loads did.
+    """
+
+    def __init__(self, element):
+        self.element = element
+        self.tag = element.tag
+        self.id = element.get("id")
+        self.name = sanitize_label(element.get("name"))
+
+    def get(self, attribute, default=None):
+        return self.element.get(attribute, default)
+
+    @cached_property
+    def processed_name(self):
+        return process_name(self.name)
+
+    @cached_property
+    def data_structure(self):
+        return json.loads(self.element.get("data_structure"))
+
+    @cached_property
+    def struct_fields(self):
+        # Struct members come from data_structure, or dependum_data_structure when it is empty
+        data_structure = self.element.get("data_structure")
+        if not data_structure:
+            data_structure = self.element.get("dependum_data_structure", "[]")
+        return json.loads(data_structure)
+
+    @cached_property
+    def operation_modes(self):
+        return json.loads(self.element.get("operation_modes", "[]"))
+
+    @cached_property
+    def input_parameters(self):
+        return json.loads(self.element.get("input_parameters", "[]"))
+
+    @cached_property
+    def output_parameters(self):
+        return json.loads(self.element.get("output_parameters", "[]"))
+
+class CPCIndex:
+    """
+    Lookup tables for a single <cpc> element, built in one pass when the CPC is parsed.
+
+    Every generator function reads the CPC through this index instead of running
+    ElementTree path searches, so generation stays linear in the size of the CPC.
+    Elements are stored as ElementRecord objects, so their names and JSON attributes
+    are decoded once per CPC.
+
+    Attributes:
+        cpc: The indexed <cpc> element.
+        by_id (dict): id -> record of the first descendant element with that id.
+        by_tag (dict): tag -> records of the direct children with that tag, in document order.
+        relations_by_source / relations_by_target (dict): id -> <relation> records.
+        comm_relations_by_source / comm_relations_by_target (dict): id -> <commRelation> records.
+    """
+
+    def __init__(self, cpc):
+        self.cpc = cpc
+        self.by_id = {}
+        self.by_tag = defaultdict(list)
+        self.relations_by_source = defaultdict(list)
+        self.relations_by_target = defaultdict(list)
+        self.comm_relations_by_source = defaultdict(list)
+        self.comm_relations_by_target = defaultdict(list)
+
+        records = {}
+        for element in cpc.iter():
+            if element is cpc:
+                continue
+            record = records[element] = ElementRecord(element)
+            if record.id is not None:
+                self.by_id.setdefault(record.id, record)
+            if record.tag == "relation":
+                self.relations_by_source[record.get("source")].append(record)
+                self.relations_by_target[record.get("target")].append(record)
+            elif record.tag == "commRelation":
+                self.comm_relations_by_source[record.get("source")].append(record)
+                self.comm_relations_by_target[record.get("target")].append(record)
+
+        for child in cpc:
+            self.by_tag[child.tag].append(records[child])
+
+    def elements(self, tag):
+        """Return the records of the direct children of the CPC with the given tag."""
+        return self.by_tag.get(tag, [])
+
+    def find_by_id(self, element_id, tag=None):
+        """Return the record with the given id (optionally only if it has the given tag), or None."""
+        element = self.by_id.get(element_id)
+        if element is not None and tag is not None and element.tag != tag:
+            return None
+        return element
+
+# draw.io stores HTML labels: line breaks and block elements separate words, any other
+# markup (including attribute values containing '>') is dropped, and entities are decoded last
+LABEL_BREAK = re.compile(r'<(?:br|/?(?:div|p|li|tr|h[1-6]))\b[^"\'>]*(?:(?:"[^"]*"|\'[^\']*\')[^"\'>]*)*>', re.IGNORECASE)
+LABEL_MARKUP = re.compile(r'<!--.*?-->|</?[A-Za-z][^"\'>]*(?:(?:"[^"]*"|\'[^\']*\')[^"\'>]*)*>', re.DOTALL)
+LABEL_SPECIAL_CHARACTERS = frozenset('<&\r\n\t')
+
+@lru_cache(maxsize=65536)
+def sanitize_label(text):
+    """
+    Turn a draw.io label (possibly an HTML fragment) into plain single-line text,
+    for use in identifiers, comments and file names. Empty values are returned as is.
+    """
+    if not text or LABEL_SPECIAL_CHARACTERS.isdisjoint(text):
+        return text
+    if "<" in text:
+        text = LABEL_BREAK.sub(" ", text)
+        text = LABEL_MARKUP.sub("", text)
+    if "&" in text:
+        text = html.unescape(text)
+    # Markup whitespace, &nbsp; and line breaks all become single spaces (comments stay on one line)
+    return " ".join(text.split())
 
 def generate_data_extraction(listener_thread):
-    data_structure_str = listener_thread.get("data_structure")
-    fields = json.loads(data_structure_str)
+    fields = listener_thread.data_structure
     result = []
     for field in fields:
-        result.append(f'{process_name(listener_thread.get("name"))}_data_structure.{process_name(field.get("name"))} = doc["{process_name(field.get("name"))}"];')
+        result.append(f'{listener_thread.processed_name}_data_structure.{process_name(field.get("name"))} = doc["{process_name(field.get("name"))}"];')
     result_str = "\n".join(result)
     return result_str
 
 def generate_debug_listener_print(listener_thread):
-    data_structure_str = listener_thread.get("data_structure")
-    fields = json.loads(data_structure_str)
+    fields = listener_thread.data_structure
     result = []
     for field in fields:
         result.append(f'Serial.print("{process_name(field.get("name"))}: ");')
-        result.append(f'Serial.println({process_name(listener_thread.get("name"))}_data_structure.{process_name(field.get("name"))});')
+        result.append(f'Serial.println({listener_thread.processed_name}_data_structure.{process_name(field.get("name"))});')
     result_str = "\n".join(result)
     return result_str
 
-def generate_listener_thread_code(cpc):
-    listener_threads = cpc.findall("listenerThread")
-    result_str = ""
+def generate_listener_thread_code(cpc_index, out):
+    listener_threads = cpc_index.elements("listenerThread")
     
     # Create a listener thread for each listener_thread object
     for listener_thread in listener_threads:
-        listener_name = process_name(listener_thread.get("name"))
+        listener_name = listener_thread.processed_name
         topic = f"{listener_name}_topic"
         timing = listener_thread.get("interval_in_milliseconds")
-        listener_comments = apply_indentation_to_text(generate_listener_thread_comments(listener_thread, cpc), "    ")
         client = f"{listener_name}MqttClient"
         client_id = f"{listener_name}ClientId"
         
         # Listener thread function declaration
-        result_str += f"""
+        out.write(f"""
 void receiveDependum_{listener_name}Task(void *pvParameters) {{
-{listener_comments}
+""")
+        with out.indented("    "):
+            generate_listener_thread_comments(listener_thread, cpc_index, out)
+        out.write(f"""
     // This variable handles the period in milliseconds for thread execution
     const TickType_t xDelay = pdMS_TO_TICKS({timing});
     
@@ -76,49 +263,48 @@ void receiveDependum_{listener_name}Task(void *pvParameters) {{
         vTaskDelay(xDelay);
     }}
 }}
-"""
-    return result_str
+""")
 
 
-def generate_connection_to_topics(cpc):
-    comm_threads = cpc.findall("commThread")
-    listener_threads = cpc.findall("listenerThread")
+def generate_connection_to_topics(cpc_index):
+    comm_threads = cpc_index.elements("commThread")
+    listener_threads = cpc_index.elements("listenerThread")
     
     variables_array = []
     if(comm_threads):
         variables_array.append("// Connection and subscription to topics(Sender)")
 
         for comm_thread in comm_threads:
-            comm_thread_client = f'{process_name(comm_thread.get("name"))}MqttClient'
-            comm_thread_client_id = f'{process_name(comm_thread.get("name"))}ClientId'
+            comm_thread_client = f'{comm_thread.processed_name}MqttClient'
+            comm_thread_client_id = f'{comm_thread.processed_name}ClientId'
             variables_array.append(f'mqttSetup({comm_thread_client});')
-            variables_array.append(f'connectToMQTT({comm_thread_client}, {comm_thread_client_id}, {process_name(comm_thread.get("name"))}_topic);')
+            variables_array.append(f'connectToMQTT({comm_thread_client}, {comm_thread_client_id}, {comm_thread.processed_name}_topic);')
     
     if(listener_threads):
         variables_array.append("// Listener Topics(Receiver)")
 
         for listener_thread in listener_threads:
-            listener_thread_client = f'{process_name(listener_thread.get("name"))}MqttClient'
-            listener_thread_client_id = f'{process_name(listener_thread.get("name"))}ClientId'
-            variables_array.append(f'mqttSetup({listener_thread_client}, callback_{process_name(listener_thread.get("name"))});')
-            variables_array.append(f'connectToMQTT({listener_thread_client}, {listener_thread_client_id}, {process_name(listener_thread.get("name"))}_topic);')
+            listener_thread_client = f'{listener_thread.processed_name}MqttClient'
+            listener_thread_client_id = f'{listener_thread.processed_name}ClientId'
+            variables_array.append(f'mqttSetup({listener_thread_client}, callback_{listener_thread.processed_name});')
+            variables_array.append(f'connectToMQTT({listener_thread_client}, {listener_thread_client_id}, {listener_thread.processed_name}_topic);')
 
     result_str = "\n".join(variables_array)
     return result_str
 
-def generate_listener_thread_comments(listener_thread, cpc):
+def generate_listener_thread_comments(listener_thread, cpc_index, out):
     # Extract basic attributes
-    listener_thread_name = listener_thread.get("name")
+    listener_thread_name = listener_thread.name
     listener_thread_id = listener_thread.get("id")
-    original_element = listener_thread.get("name")  # Assuming the original element matches the name
+    original_element = listener_thread.name  # Assuming the original element matches the name
     transformed_function = f'{process_name(listener_thread_name)}()'  # Transform to function name format
     qualification_array = listener_thread.get("qualification_array")
     contribution_array = listener_thread.get("contribution_array")
-    dependum = f'{process_name(listener_thread.get("name"))}_data_structure'
+    dependum = f'{listener_thread.processed_name}_data_structure'
 
-    dependerRelation = cpc.find(".//commRelation[@source='" + listener_thread_id + "']")
-    dependerObject = cpc.find((".//*[@id='" + dependerRelation.get("target") + "']"))
-    dependerName = dependerObject.get("name")
+    dependerRelation = cpc_index.comm_relations_by_source[listener_thread_id][0]
+    dependerObject = cpc_index.find_by_id(dependerRelation.get("target"))
+    dependerName = dependerObject.name
     dependerType = dependerObject.tag
     dependerStatement=""
     if(dependerType == "function"):
@@ -175,22 +361,22 @@ def generate_listener_thread_comments(listener_thread, cpc):
 // 
 //
 """
-    comments = apply_indentation_to_text(comments, indent_str="    ")
-    return comments
+    with out.indented("    "):
+        out.write_block(comments)
 
-def generate_comm_thread_comments(comm_thread, cpc):
+def generate_comm_thread_comments(comm_thread, cpc_index, out):
     # Extract basic attributes
-    comm_thread_name = comm_thread.get("name")
+    comm_thread_name = comm_thread.name
     comm_thread_id = comm_thread.get("id")
-    original_element = comm_thread.get("name")  # Assuming the original element matches the name
+    original_element = comm_thread.name  # Assuming the original element matches the name
     transformed_function = f"{process_name(comm_thread_name)}()"  # Transform to function name format
     qualification_array = comm_thread.get("qualification_array")
     contribution_array = comm_thread.get("contribution_array")
-    dependum = f'{process_name(comm_thread.get("name"))}_data_structure'
+    dependum = f'{comm_thread.processed_name}_data_structure'
 
-    dependeeRelation = cpc.find(".//commRelation[@target='" + comm_thread_id + "']")
-    dependeeObject = cpc.find((".//*[@id='" + dependeeRelation.get("source") + "']"))
-    dependeeName = dependeeObject.get("name")
+    dependeeRelation = cpc_index.comm_relations_by_target[comm_thread_id][0]
+    dependeeObject = cpc_index.find_by_id(dependeeRelation.get("source"))
+    dependeeName = dependeeObject.name
     dependeeType = dependeeObject.tag
     dependeeStatement=""
     if(dependeeType == "function"):
@@ -247,50 +433,45 @@ def generate_comm_thread_comments(comm_thread, cpc):
 // 
 //
 """
-    comments = apply_indentation_to_text(comments, indent_str="    ")
-    return comments
+    with out.indented("    "):
+        out.write_block(comments)
 
 
 def generate_json_comm_data_structure(comm_thread):
-    data_structure_str = comm_thread.get("data_structure")
-    fields = json.loads(data_structure_str)
+    fields = comm_thread.data_structure
     result = []
     for field in fields:
-        result.append(f'dependumJson["{process_name(field.get("name"))}"] = {process_name(comm_thread.get("name"))}_data_structure.{process_name(field.get("name"))};')
+        result.append(f'dependumJson["{process_name(field.get("name"))}"] = {comm_thread.processed_name}_data_structure.{process_name(field.get("name"))};')
     result_str = "\n".join(result)
     return result_str
 
-def generate_comm_thread_handles(cpc):
-    comm_threads = cpc.findall("commThread")
+def generate_comm_thread_handles(cpc_index):
+    comm_threads = cpc_index.elements("commThread")
     result = []
     for comm_thread in comm_threads:
-        result.append(f'TaskHandle_t TaskpublishDependum_{process_name(comm_thread.get("name"))};')
+        result.append(f'TaskHandle_t TaskpublishDependum_{comm_thread.processed_name};')
 
     result_str = "\n".join(result)
     return result_str
 
-def generate_listener_thread_handles(cpc):
-    listener_threads = cpc.findall("listenerThread")
+def generate_listener_thread_handles(cpc_index):
+    listener_threads = cpc_index.elements("listenerThread")
     result = []
     for listener_thread in listener_threads:
-        result.append(f'TaskHandle_t TaskreceiveDependum_{process_name(listener_thread.get("name"))};')
+        result.append(f'TaskHandle_t TaskreceiveDependum_{listener_thread.processed_name};')
 
     result_str = "\n".join(result)
     return result_str
 
-def generate_comm_threads(cpc, debug=False):
-    comm_threads_content = ""
-
+def generate_comm_threads(cpc_index, out, debug=False):
     # Get all comm_thread objects from the cpc
-    comm_threads = cpc.findall("commThread")
+    comm_threads = cpc_index.elements("commThread")
     
     for comm_thread in comm_threads:
         # Extract information from each commThread
         comm_thread_id = comm_thread.get("id")
-        comm_thread_name = comm_thread.get("name")
+        comm_thread_name = comm_thread.name
         comm_thread_timing = comm_thread.get("interval_in_milliseconds")
-        comm_thread_comments = generate_comm_thread_comments(comm_thread, cpc)
-        data_structure = apply_indentation_to_text(generate_json_comm_data_structure(comm_thread), indent_str="        ")
         operation_modes = generate_operation_mode_switch(comm_thread, indentation="    ")
         client = f"{process_name(comm_thread_name)}MqttClient"
         
@@ -303,16 +484,21 @@ def generate_comm_threads(cpc, debug=False):
         topic = f"{process_name(comm_thread_name)}_topic"
 
         # Generate the code for the Dependum struct and publish function
-        comm_thread_code = f"""
+        out.write(f"""
 
 void publishDependum_{process_name(comm_thread_name)}Task(void *pvParameters) {{
-{comm_thread_comments}
+""")
+        generate_comm_thread_comments(comm_thread, cpc_index, out)
+        out.write(f"""
     // This variable handles the period in milliseconds for thread execution
     const TickType_t xDelay = pdMS_TO_TICKS({comm_thread_timing});
     for (;;) {{
         // Create a JSON object for the dependum
         JSONVar dependumJson;
-{data_structure}
+""")
+        with out.indented("        "):
+            out.write_block(generate_json_comm_data_structure(comm_thread))
+        out.write(f"""
 
         // Convert the JSON object to a string
         String dependumMessage = JSON.stringify(dependumJson);
@@ -335,33 +521,30 @@ void publishDependum_{process_name(comm_thread_name)}Task(void *pvParameters) {{
         vTaskDelay(xDelay);
     }}
 }}
-"""
-        # Add the generated code to the comm_threads_content
-        comm_threads_content += comm_thread_code + "\n"
 
-    return comm_threads_content
+""")
 
 
-def generate_listener_threads(cpc):
+def generate_listener_threads(cpc_index):
     listener_threads_content = ""
     return listener_threads_content
 
-def generate_all_comm_mqtt_ids(cpc):
-    comm_threads = cpc.findall("commThread")
-    listener_threads = cpc.findall("listenerThread")
+def generate_all_comm_mqtt_ids(cpc_index, cps_id):
+    comm_threads = cpc_index.elements("commThread")
+    listener_threads = cpc_index.elements("listenerThread")
     
     variables_array = []
     if(comm_threads):
         variables_array.append("// Comm Topics(Sender)")
 
         for comm_thread in comm_threads:
-            variables_array.append(f'const char* {process_name(comm_thread.get("name"))}_topic = "{CPS_id}/{process_name(cpc.get("id"))}/{process_name(comm_thread.get("id"))}/dependum";')
+            variables_array.append(f'const char* {comm_thread.processed_name}_topic = "{cps_id}/{process_name(cpc_index.cpc.get("id"))}/{process_name(comm_thread.get("id"))}/dependum";')
     
     if(listener_threads):
         variables_array.append("// Listener Topics(Receiver)")
 
         for listener_thread in listener_threads:
-            variables_array.append(f'const char* {process_name(listener_thread.get("name"))}_topic = "{CPS_id}/{process_name(listener_thread.get("comm_threadCPCId"))}/{process_name(listener_thread.get("comm_threadId"))}/dependum";')
+            variables_array.append(f'const char* {listener_thread.processed_name}_topic = "{cps_id}/{process_name(listener_thread.get("comm_threadCPCId"))}/{process_name(listener_thread.get("comm_threadId"))}/dependum";')
 
     comm_str = "\n".join(variables_array)
 
@@ -396,18 +579,15 @@ def generate_data_structure(obj, variableMode):
     Returns:
     - A string containing the generated struct declaration.
     """
-    # Determine the source of the data structure
-    data_structure = obj.get("data_structure")
-    if not data_structure:
-        data_structure = obj.get("dependum_data_structure", "[]")
-
-    # Parse the JSON content
+    # Parse the JSON content (data_structure, or dependum_data_structure as a fallback)
     try:
-        fields = json.loads(data_structure)
+        fields = obj.struct_fields
     except json.JSONDecodeError:
         return "// Error: Invalid data structure format\n"
 
     # Ensure fields contain keys required by generateVariables
+    # (on copies, so the decoded attribute shared with other generators is left untouched)
+    fields = [dict(field) for field in fields]
     for field in fields:
         # Normalize keys to match expected format in type_mapping
         field["name"] = field.get("name", field.get("name", "UnknownName"))
@@ -415,7 +595,7 @@ def generate_data_structure(obj, variableMode):
         field["type"] = field.get("type", "double")  # Default to "double" if type is not provided
 
     # Determine the struct name
-    struct_name = f"{process_name(obj.get('name'))}_data_structure"
+    struct_name = f"{obj.processed_name}_data_structure"
 
     # Start building the struct definition
     struct_declaration = [f"struct {struct_name} {{\n"]
@@ -444,12 +624,12 @@ def generate_object_data_structures(obj, mode):
     return struct_code
 
 
-def generate_all_data_structures(cpc, mode):
+def generate_all_data_structures(cpc_index, mode):
     """
     Generate Arduino struct declarations for applicable objects in cpc.
 
     Parameters:
-    - cpc: The root XML element containing objects like "commThread", "listenerThread", and "sw_resource".
+    - cpc_index: The CPCIndex of the element containing objects like "commThread", "listenerThread", and "sw_resource".
 
     Returns:
     - A string containing all generated struct declarations.
@@ -463,7 +643,7 @@ def generate_all_data_structures(cpc, mode):
     # Iterate through each object type
     for obj_type in object_types:
         # Find all objects of the given type
-        objects = cpc.findall(obj_type)
+        objects = cpc_index.elements(obj_type)
         for obj in objects:
             # Generate the data structure for the current object
             struct_declarations.append(generate_object_data_structures(obj, mode))
@@ -471,13 +651,13 @@ def generate_all_data_structures(cpc, mode):
     # Join all struct declarations into a single string
     return "\n".join(struct_declarations)
 
-def declare_operation_mode_variables(cpc):
+def declare_operation_mode_variables(cpc_index):
     # Supported element types
     element_types = ["thread", "commThread", "listenerThread"]
     declarations = []
 
     for element_type in element_types:
-        elements = cpc.findall(element_type)
+        elements = cpc_index.elements(element_type)
 
         for element in elements:
             # Check if operation modes are enabled
@@ -486,12 +666,12 @@ def declare_operation_mode_variables(cpc):
                 continue
 
             # Parse operation modes
-            operation_modes = json.loads(element.get("operation_modes", "[]"))
+            operation_modes = element.operation_modes
             if not operation_modes:
                 continue
 
             # Get the name of the element and process it
-            element_name = process_name(element.get("name"))
+            element_name = element.processed_name
             operation_mode_var = f"{element_name}_operation_mode"
 
             # Initialize the variable to the first mode's code
@@ -520,31 +700,37 @@ def generate_operation_mode_switch(obj, indentation="    "):
         return ""
 
     # Parse operation modes
-    operation_modes = json.loads(obj.get("operation_modes", "[]"))
-    operation_mode_var = f"{process_name(obj.get('name'))}_operation_mode"
-
-    # Start the switch structure with the specified indentation
-    operation_mode_switch = f"\n{indentation}switch ({operation_mode_var}) {{\n"
-    
-    # Generate cases for each operation mode
-    for mode in operation_modes:
-        mode_code = mode["code"]
-        mode_name = mode["name"]
-        mode_description = mode["description"]
-
-        operation_mode_switch += f"{indentation}    case {mode_code}: // {mode_name} - {mode_description}\n"
-        operation_mode_switch += f"{indentation}        // Your logic for {mode_name} goes here\n"
-        operation_mode_switch += f"{indentation}        break;\n"
-    
-    # Default case
-    operation_mode_switch += f"{indentation}    default:\n"
-    operation_mode_switch += f"{indentation}        // Handle undefined operation modes\n"
-    operation_mode_switch += f"{indentation}        break;\n"
-    
-    # Close the switch statement
-    operation_mode_switch += f"{indentation}}}\n"
-
-    return operation_mode_switch
+    operation_modes = obj.operation_modes
+    operation_mode_var = f"{obj.processed_name}_operation_mode"
+
+    out = SketchWriter()
+    out.write_line()
+    with out.indented(indentation):
+        # Start the switch structure with the specified indentation
+        out.write_line(f"switch ({operation_mode_var}) {{")
+
+        with out.indented("    "):
+            # Generate cases for each operation mode
+            for mode in operation_modes:
+                mode_code = mode["code"]
+                mode_name = sanitize_label(mode["name"])
+                mode_description = sanitize_label(mode["description"])
+
+                out.write_line(f"case {mode_code}: // {mode_name} - {mode_description}")
+                with out.indented("    "):
+                    out.write_line(f"// Your logic for {mode_name} goes here")
+                    out.write_line("break;")
+
+            # Default case
+            out.write_line("default:")
+            with out.indented("    "):
+                out.write_line("// Handle undefined operation modes")
+                out.write_line("break;")
+
+        # Close the switch statement
+        out.write_line("}")
+
+    return out.getvalue()
 
 def generateVariables(params, object_name, output_str, indentation_space, mode):
     for param in params:
@@ -560,7 +746,7 @@ def generateVariables(params, object_name, output_str, indentation_space, mode):
 
         # Generate the variable name with function name prefix
         variable_name = f"{object_name}_{process_name(param['name'])}" if object_name.strip() else f"{process_name(param['name'])}"
-        variable_description = param['description']
+        variable_description = sanitize_label(param['description'])
 
         # Handle array types (e.g., char[50]) and non-array types
         if is_array and array_size:  # Handle array types like char[50]
@@ -588,19 +774,32 @@ def generateVariables(params, object_name, output_str, indentation_space, mode):
                 output_str.append(f"{indentation_space}{arduino_type} {variable_name}; // {variable_description}\n")
 
 
+# The same element names are normalized many times per CPC; bounded so batch runs don't grow it forever
+@lru_cache(maxsize=65536)
 def process_name(raw_name):
-    words = raw_name.split()
+    words = sanitize_label(raw_name).split()
     processed_name = words[0].lower() + ''.join(word.capitalize() for word in words[1:])
     processed_name = processed_name.replace("-","_")
     return processed_name
 
 def write_to_file(directory, file_name, content, file_type):
     """
-    Write content to a file, with support for different file types ('.ino', '.h').
+    Write content (a string or a SketchWriter) to a file, with support for different
+    file types ('.ino', '.h'). A SketchWriter is streamed to the file fragment by fragment.
+    The file is left untouched when it already holds the same content, so its
+    modification time only changes when the generated code actually changes.
     """
+    if isinstance(content, str):
+        writer = SketchWriter()
+        writer.write(content)
+        content = writer
+
     file_path = os.path.join(directory, file_name + file_type)
+    if os.path.isfile(file_path) and content.matches_file(file_path):
+        print(f"Unchanged {file_name}{file_type} in {directory}")
+        return
     with open(file_path, 'w') as file:
-        file.write(content)
+        content.write_to(file)
     print(f"Generated {file_name}{file_type} in {directory}")
 
 def generate_secrets_file(directory):
@@ -665,7 +864,7 @@ void connectToMQTT(PubSubClient &client, const char* clientId, const char* topic
 '''
     write_to_file(directory, "comm_utils", comm_utils_content, ".h")
 
-def generate_hw_resource_comments(function, cpc):
+def generate_hw_resource_comments(function, cpc_index):
     """
     Generate comments for hardware resources assigned to the given function.
     This will check for <relation> elements where the function's id is the target,
@@ -673,7 +872,7 @@ def generate_hw_resource_comments(function, cpc):
 
     Parameters:
     - function: The <function> element for which to generate the hardware resource comments.
-    - cpc: The <cpc> element that contains the hardware resources and relations.
+    - cpc_index: The CPCIndex of the <cpc> element that contains the hardware resources and relations.
 
     Returns:
     - A string containing the hardware resource comments.
@@ -685,7 +884,7 @@ def generate_hw_resource_comments(function, cpc):
     function_id = function.get("id")
 
     # Find all <relation> elements in the cpc where the function's id is the target
-    relations = cpc.findall(".//relation[@target='" + function_id + "']")
+    relations = cpc_index.relations_by_target[function_id]
 
     # Iterate over the relations to get the source (hw_resource) ids
     hw_resource_ids = [relation.get("source") for relation in relations]
@@ -694,11 +893,11 @@ def generate_hw_resource_comments(function, cpc):
 
     # For each hw_resource_id, find the corresponding <hw_resource> and generate comments
     for hw_resource_id in hw_resource_ids:
-        hw_resource = cpc.find(".//hw_resource[@id='" + hw_resource_id + "']")
+        hw_resource = cpc_index.find_by_id(hw_resource_id, "hw_resource")
         if hw_resource is not None:
-            hw_resource_name = strip_html_tags(hw_resource.get("name"))
+            hw_resource_name = hw_resource.name
             hw_resource_parent_id = hw_resource.get("id_cim_parent")
-            hw_resource_description = hw_resource.get("integration_operation_description")
+            hw_resource_description = sanitize_label(hw_resource.get("integration_operation_description"))
             hw_resource_comments += f"""\
     // {hw_resource_name}:
     //     ID: {hw_resource_id}
@@ -708,19 +907,19 @@ def generate_hw_resource_comments(function, cpc):
     
     return hw_resource_comments
 
-def generate_function_code(function, cpc):
+def generate_function_code(function, cpc_index):
     """
     Generate the function code for a given <function> object, including comments for
     hardware resources assigned to it, and adding support for operation modes.
     """
     # Extract function attributes
-    function_name = process_name(function.get("name"))
+    function_name = function.processed_name
     function_id = function.get("id")
     function_parent = function.get("id_cim_parent")
 
-    # Parse input and output parameters from JSON strings
-    input_params = json.loads(function.get("input_parameters"))
-    output_params = json.loads(function.get("output_parameters"))
+    # Input and output parameters, decoded once per function
+    input_params = function.input_parameters
+    output_params = function.output_parameters
 
     # Build function signature
     func_signature = f"bool {function_name}("
@@ -736,9 +935,9 @@ def generate_function_code(function, cpc):
         input_param_str.append(f"{arduino_type} {param_name}")
     
     if(function.get("operation_modes_enabled")=="true"):
-        json_operation_modes = json.loads(function.get('operation_modes'))
+        json_operation_modes = function.operation_modes
         default_mode = json_operation_modes[0]["code"]
-        input_param_str.append(f"int {process_name(function.get('name'))}_operation_mode = {default_mode}")
+        input_param_str.append(f"int {function.processed_name}_operation_mode = {default_mode}")
 
     func_signature += ", ".join(input_param_str) + ") {"
 
@@ -749,11 +948,11 @@ def generate_function_code(function, cpc):
     """
     func_comments += "// Input Parameters:\n"
     for param in input_params:
-        func_comments += f"        // {param['name']}({param['type']}) - {param['description']}\n"
+        func_comments += f"        // {sanitize_label(param['name'])}({param['type']}) - {sanitize_label(param['description'])}\n"
     
     func_comments += "    // Output Parameters:\n"
     for param in output_params:
-        func_comments += f"        // {param['name']}({param['type']}) - {param['description']}\n"
+        func_comments += f"        // {sanitize_label(param['name'])}({param['type']}) - {sanitize_label(param['description'])}\n"
 
     # Add qualification and contribution arrays as comments
     qualification_array = function.get("qualification_array")
@@ -785,7 +984,7 @@ def generate_function_code(function, cpc):
 '''
 
     # Generate comments for hardware resources assigned to this function
-    hw_resource_comments = apply_indentation_to_text(generate_hw_resource_comments(function, cpc), "    ")
+    hw_resource_comments = apply_indentation_to_text(generate_hw_resource_comments(function, cpc_index), "    ")
     func_comments += hw_resource_comments
 
     # Generate output parameter declarations
@@ -796,11 +995,13 @@ def generate_function_code(function, cpc):
     operation_mode_switch = generate_operation_mode_switch(function)
 
     # Get all sw_resource objects and check for relations to the current function
-    sw_resources = cpc.findall("sw_resource")
+    sw_resources = cpc_index.elements("sw_resource")
     if debug:
         print("SW Resources: ", sw_resources)
 
     related_sw_resources = []
+    # Ids of every element that has a relation towards the current function
+    function_source_ids = {relation.get("source") for relation in cpc_index.relations_by_target[function_id]}
 
     for sw_resource in sw_resources:
         # Find relations where the 'source' is the sw_resource id and the 'target' is the function id
@@ -808,10 +1009,7 @@ def generate_function_code(function, cpc):
             print("SW Resource ID: ", sw_resource.get('id'))
             print("Function ID: ", function_id)
 
-        # Assuming cpc is an ElementTree object representing your XML document
-        relations = cpc.findall(f".//relation[@source='{sw_resource.get('id')}'][@target='{function_id}']")
-
-        if relations:
+        if sw_resource.get('id') in function_source_ids:
             # If there's a relation, add the sw_resource to the list of related resources
             related_sw_resources.append(sw_resource)
 
@@ -823,17 +1021,17 @@ def generate_function_code(function, cpc):
     for sw_resource in related_sw_resources:
         # Extract struct name and members
         if(debug):
-            print("SW Name: ",process_name(sw_resource.get("name")));
+            print("SW Name: ",sw_resource.processed_name);
 
-        struct_name = process_name(sw_resource.get("name"))  # e.g., resourceB_data_structure
+        struct_name = sw_resource.processed_name  # e.g., resourceB_data_structure
         data_structure_json = sw_resource.get("data_structure")
         
-        # Parse JSON string into Python dictionary
-        data_structure = json.loads(data_structure_json) if data_structure_json else []
+        # Decoded JSON data structure (empty when the attribute is missing)
+        data_structure = sw_resource.data_structure if data_structure_json else []
 
         # Generate struct initialization code
         struct_init = ""
-        sw_name = sw_resource.get("name")
+        sw_name = sw_resource.name
         # Generate comments regarding the SW Resource used
         sw_comments = f'''
 // This function uses the software resource: {sw_name}
@@ -884,69 +1082,43 @@ def generate_thread_definitions(threads):
     definitions = ""
     for thread in threads:
         thread_id = thread.get("id")
-        thread_name = process_name(thread.get("name"))
+        thread_name = thread.processed_name
         definitions += f"bool {thread_name}_GoalAchieved = false; // Global variable for thread {thread_name}(ID: {thread_id})\n"
         definitions += f"TaskHandle_t Task{thread_name};\n"
     return definitions + "\n"
 
 
-def generate_setup_task_creation(threads, comm_threads, listener_threads):
+def generate_setup_task_creation(threads, comm_threads, listener_threads, out):
     """
-    Generate task creation code for the setup() function.
+    Generate task creation code for the setup() function, at the writer's current indentation.
     """
-    setup_tasks = ""
-    for thread in threads:
-        thread_name = process_name(thread.get("name"))
-        setup_tasks += f'''\
-    xTaskCreate(
-        {thread_name}Task,        // Function to implement the task
-        "{thread_name}Task",      // Name of the task
-        512,                      // Stack size (in words, not bytes)
-        NULL,                     // Task input parameter
-        1,                        // Priority of the task
-        &Task{thread_name}        // Task handle
-    );
-'''
-    for comm_thread in comm_threads:
-        thread_name = f'publishDependum_{process_name(comm_thread.get("name"))}'
-        setup_tasks += f'''\
-    xTaskCreate(
-        {thread_name}Task,        // Function to implement the task
-        "{thread_name}Task",      // Name of the task
-        512,                      // Stack size (in words, not bytes)
-        NULL,                     // Task input parameter
-        1,                        // Priority of the task
-        &Task{thread_name}        // Task handle
-    );
-'''
-    for listener_thread in listener_threads:
-        thread_name = f'receiveDependum_{process_name(listener_thread.get("name"))}'
-        setup_tasks += f'''\
-    xTaskCreate(
-        {thread_name}Task,        // Function to implement the task
-        "{thread_name}Task",      // Name of the task
-        512,                      // Stack size (in words, not bytes)
-        NULL,                     // Task input parameter
-        1,                        // Priority of the task
-        &Task{thread_name}        // Task handle
-    );
-'''
-    return setup_tasks
-
-def generate_thread_dependencies(thread, cpc):
+    thread_names = [thread.processed_name for thread in threads]
+    thread_names += [f'publishDependum_{comm_thread.processed_name}' for comm_thread in comm_threads]
+    thread_names += [f'receiveDependum_{listener_thread.processed_name}' for listener_thread in listener_threads]
+
+    for thread_name in thread_names:
+        out.write_line("xTaskCreate(")
+        with out.indented("    "):
+            out.write_line(f"{thread_name}Task,        // Function to implement the task")
+            out.write_line(f'"{thread_name}Task",      // Name of the task')
+            out.write_line("512,                      // Stack size (in words, not bytes)")
+            out.write_line("NULL,                     // Task input parameter")
+            out.write_line("1,                        // Priority of the task")
+            out.write_line(f"&Task{thread_name}        // Task handle")
+        out.write_line(");")
+
+def generate_thread_dependencies(thread, cpc_index):
     """
     Generate the dependency logic for a thread's goal achievement based on its relations.
     """
     thread_id = thread.get("id")
-    thread_name = process_name(thread.get("name"))
+    thread_name = thread.processed_name
     if(debug):
         print("Thread ID: ",thread_id)
         print("Thread Name: ",thread_name)
 
     # Find relations with this thread as the target
-    relations = [
-        rel for rel in cpc.findall("relation") if rel.get("target") == thread_id
-    ]
+    relations = cpc_index.relations_by_target[thread_id]
 
     # If there are no dependencies, use a default toggle mechanism
     if not relations:
@@ -964,17 +1136,17 @@ def generate_thread_dependencies(thread, cpc):
     for rel in relations:
         source_id = rel.get("source")
         # Check if the source is a thread
-        source_thread = next((t for t in cpc.findall("thread") if t.get("id") == source_id), None)
+        source_thread = cpc_index.find_by_id(source_id, "thread")
         if source_thread is not None:
-            source_thread_name = process_name(source_thread.get("name"))
+            source_thread_name = source_thread.processed_name
             dependency_expressions.append(f"{source_thread_name}_GoalAchieved")
         else:
             # Check if the source is a function
-            source_function = next((f for f in cpc.findall("function") if f.get("id") == source_id), None)
-            function_name = process_name(source_function.get("name"))
+            source_function = cpc_index.find_by_id(source_id, "function")
+            function_name = source_function.processed_name
 
             # Extract and accumulate input parameter initializations
-            input_parameters = json.loads(source_function.get("input_parameters", "[]"))
+            input_parameters = source_function.input_parameters
             for param in input_parameters:
                 param_type = param['type']
                 param_name = process_name(param['name'])
@@ -1008,7 +1180,7 @@ def generate_thread_dependencies(thread, cpc):
     # Final goal achievement assignment
     return f"{param_initialization_str}\n        {thread_name}_GoalAchieved = ({dependency_logic});"
 
-def generate_thread_functions(threads, cpc):
+def generate_thread_functions(threads, cpc_index):
     """
     Generate FreeRTOS task functions for each thread, incorporating dependency logic.
     """
@@ -1016,7 +1188,7 @@ def generate_thread_functions(threads, cpc):
     for thread in threads:
         thread_id = thread.get("id")
         thread_id_cim_parent = thread.get("id_cim_parent")
-        thread_name = process_name(thread.get("name"))
+        thread_name = thread.processed_name
         thread_interval_in_milliseconds = thread.get("interval_in_milliseconds")
 
         qualification_array = thread.get("qualification_array")
@@ -1040,7 +1212,7 @@ def generate_thread_functions(threads, cpc):
             contribution_comment = " * None specified."
 
         # Generate dependency logic for the thread
-        dependency_logic = generate_thread_dependencies(thread, cpc)
+        dependency_logic = generate_thread_dependencies(thread, cpc_index)
 
         operation_modes_switch = generate_operation_mode_switch(thread, "        ")
 
@@ -1073,30 +1245,30 @@ void {thread_name}Task(void *pvParameters) {{
 '''
     return thread_code
 
-def generate_connectivity_variables(cpc):
+def generate_connectivity_variables(cpc_index):
     comm_variables_code = ""
-    listener_threads = cpc.findall("listenerThread")
-    cpc_id = cpc.get("id")
-    cpc_name = cpc.get("name")
+    listener_threads = cpc_index.elements("listenerThread")
+    cpc_id = cpc_index.cpc.get("id")
+    cpc_name = sanitize_label(cpc_index.cpc.get("name"))
 
     for listener_thread in listener_threads:
-        listener_thread_name = listener_thread.get("name")
+        listener_thread_name = listener_thread.name
         comm_variables_code += f'const char* {process_name(listener_thread_name)}ClientId = "{process_name(cpc_name)}Client_{process_name(cpc_id)}";\n'
         comm_variables_code += f"WiFiClient {process_name(listener_thread_name)}Client;\n"
         comm_variables_code += f"PubSubClient {process_name(listener_thread_name)}MqttClient({process_name(listener_thread_name)}Client);\n"
-    comm_threads = cpc.findall("commThread")
+    comm_threads = cpc_index.elements("commThread")
     for comm_thread in comm_threads:
-        comm_thread_name = comm_thread.get("name")
+        comm_thread_name = comm_thread.name
         comm_variables_code += f'const char* {process_name(comm_thread_name)}ClientId = "{process_name(cpc_name)}Client_{process_name(cpc_id)}";\n'
         comm_variables_code += f"WiFiClient {process_name(comm_thread_name)}Client;\n"
         comm_variables_code += f"PubSubClient {process_name(comm_thread_name)}MqttClient({process_name(comm_thread_name)}Client);\n"
     return comm_variables_code
 
-def generate_callback_functions(cpc):
+def generate_callback_functions(cpc_index):
     callback_functions_code = ""
-    listener_threads = cpc.findall("listenerThread")
+    listener_threads = cpc_index.elements("listenerThread")
     for listener_thread in listener_threads:
-        listener_name = process_name(listener_thread.get("name"))
+        listener_name = listener_thread.processed_name
         data_extraction = apply_indentation_to_text(generate_data_extraction(listener_thread), "        ")
         operation_modes = generate_operation_mode_switch(listener_thread, indentation="        ")
         debug_structure = apply_indentation_to_text(generate_debug_listener_print(listener_thread), "                    ")
@@ -1130,22 +1302,44 @@ void callback_{listener_name}(char* topic, byte* payload, unsigned int length) {
 '''
     return callback_functions_code
 
-def generate_cpc_ino(cpc, directory):
+def generate_cpc_ino(cpc, directory, cps_id, timer=None):
     """
     Generate the .ino file for the given CPC, including all associated <function> and <thread> objects.
+    The index, generate and write phases are timed into `timer` when given.
+    """
+    timer = timer if timer is not None else StageTimings()
+
+    # Index the CPC once; every generator below reads it through this index
+    with timer.measure("index"):
+        cpc_index = CPCIndex(cpc)
+
+    with timer.measure("generate"):
+        sketch = assemble_cpc_sketch(cpc_index, cps_id)
+
+    # Stream the assembled sketch to the .ino file
+    with timer.measure("write"):
+        write_to_file(directory, process_name(cpc.get("name")), sketch, ".ino")
+
+def assemble_cpc_sketch(cpc_index, cps_id):
     """
+    Assemble the .ino sketch of an indexed CPC into a SketchWriter.
+    """
+    cpc = cpc_index.cpc
     cpc_id = cpc.get("id")
-    cpc_name = cpc.get("name")
-    cpc_description = cpc.get("description")
+    cpc_name = sanitize_label(cpc.get("name"))
+    cpc_description = sanitize_label(cpc.get("description"))
     cpc_parent = cpc.get("id_cim_parent")
     
-    comm_mqtt_ids = generate_all_comm_mqtt_ids(cpc)
+    comm_mqtt_ids = generate_all_comm_mqtt_ids(cpc_index, cps_id)
+
+    connectivity_variables = generate_connectivity_variables(cpc_index)
 
-    connectivity_variables = generate_connectivity_variables(cpc)
 
+    # The sketch is assembled in a SketchWriter; generate_cpc_ino streams it to the .ino file
+    out = SketchWriter()
 
     # Include necessary libraries
-    ino_content = f'''\
+    out.write(f'''\
 // CPC ID: {cpc_id}
 // Parent ID: {cpc_parent}
 // Name: {cpc_name}
@@ -1169,152 +1363,364 @@ bool debug = true;
 {comm_mqtt_ids}
 
 // Thread Status variables
-'''
+''')
     
     # Generate global variables and task handles for each thread
-    threads = cpc.findall("thread")
-    listner_threads = cpc.findall("listenerThread")
-    comm_threads = cpc.findall("commThread")
+    threads = cpc_index.elements("thread")
+    listner_threads = cpc_index.elements("listenerThread")
+    comm_threads = cpc_index.elements("commThread")
     thread_definitions = generate_thread_definitions(threads)
-    ino_content += thread_definitions
+    out.write(thread_definitions)
 
     # Generate Global variables for functions
-    ino_content += '''// Function output variables
-'''
+    out.write('''// Function output variables
+''')
 
-    functions = cpc.findall("function")
+    functions = cpc_index.elements("function")
     function_definitions = []
     for function in functions:
         # Parse the output parameters
-        output_parameters = json.loads(function.get("output_parameters"))  # Default to an empty list if None
+        output_parameters = function.output_parameters  # Default to an empty list if None
         
         # Process function name
-        function_name = process_name(function.get("name"))
+        function_name = function.processed_name
         
         # Generate variables with processed function name
         generateVariables(output_parameters, function_name, function_definitions, "", "init")
 
-    ino_content += "".join(function_definitions)
+    out.write("".join(function_definitions))
 
     # Declare all operation mode variables
-    operation_mode_declarations = declare_operation_mode_variables(cpc)
+    operation_mode_declarations = declare_operation_mode_variables(cpc_index)
 
     # Include the declarations in the global variables section of the generated code
-    ino_content += f"""
+    out.write(f"""
 // Global Operation Mode Variables
 {operation_mode_declarations}
-"""
-    generated_structs = generate_all_data_structures(cpc, "declare")
+""")
+    generated_structs = generate_all_data_structures(cpc_index, "declare")
     
 
-    ino_content += f'''
+    out.write(f'''
 // Global Data Structures (software resources and/or any dependum)
 {generated_structs}
-'''
-    comm_handles = generate_comm_thread_handles(cpc)
+''')
+    comm_handles = generate_comm_thread_handles(cpc_index)
     if(comm_handles):
-        ino_content += f'''
+        out.write(f'''
 // Comm Thread Handles
 {comm_handles}
-'''
-    listener_handles = generate_listener_thread_handles(cpc)
+''')
+    listener_handles = generate_listener_thread_handles(cpc_index)
     if(listener_handles):
-        ino_content += f'''
+        out.write(f'''
 // Listener Thread Handles
 {listener_handles}
-'''
-    setup_task_creation = generate_setup_task_creation(threads, comm_threads, listner_threads)
+''')
+    setup_task_creation = SketchWriter()
+    with setup_task_creation.indented("    "):
+        generate_setup_task_creation(threads, comm_threads, listner_threads, setup_task_creation)
     if(debug):
         print("&&&&&&&&&&&&&&&&&&&&&&&&&&&&")
-        print("Setup Task Creation for ",cpc.get("name"),": \n",setup_task_creation)
+        print("Setup Task Creation for ",cpc.get("name"),": \n",setup_task_creation.getvalue())
         print("&&&&&&&&&&&&&&&&&&&&&&&&&&&&")
 
-    ino_content += '''
+    out.write('''
 void setup() {
     if (debug) {
         Serial.begin(9600);
         while (!Serial);
     }
     connectToWiFi();
-'''
-    setup_connection = apply_indentation_to_text(generate_connection_to_topics(cpc), "    ")
-    ino_content += f'''
-{setup_connection}
+
+''')
+    with out.indented("    "):
+        out.write_block(generate_connection_to_topics(cpc_index))
+    out.write('''
     
     // Create tasks for the operational goals
-'''
-    ino_content += setup_task_creation + '''
+''')
+    out.extend(setup_task_creation)
+    out.write('''
     // Start the threads
     vTaskStartScheduler();
-}\n'''
-    callback_functions = generate_callback_functions(cpc)
+}\n''')
+    callback_functions = generate_callback_functions(cpc_index)
     if(callback_functions):
-        ino_content += f'''
+        out.write(f'''
 {callback_functions}
-'''
+''')
     
-    setup_communication_threads = generate_comm_threads(cpc)
-    setup_communication_threads += generate_listener_threads(cpc)
+    setup_communication_threads = SketchWriter()
+    generate_comm_threads(cpc_index, setup_communication_threads)
+    setup_communication_threads.write(generate_listener_threads(cpc_index))
     if(debug):
-        print("Setup Communication threads: ", setup_communication_threads)
+        print("Setup Communication threads: ", setup_communication_threads.getvalue())
     if(setup_communication_threads):
-        ino_content += f'''
-{setup_communication_threads}
-'''
-    listener_thread_code = generate_listener_thread_code(cpc)
+        out.write("\n")
+        out.extend(setup_communication_threads)
+        out.write("\n")
+
+    out.write("\n")
+    generate_listener_thread_code(cpc_index, out)
     # Generate the main loop function
-    ino_content += f'''
-{listener_thread_code}
+    out.write(f'''
 void loop() {{
 
     // Let FreeRTOS manage tasks, nothing to do here
     delay(100);
 }}
-'''
+''')
 
     # Append generated functions for each <function> object after the loop function
-    functions = cpc.findall("function")
+    functions = cpc_index.elements("function")
     for function in functions:
-        function_code = generate_function_code(function, cpc)
-        ino_content += function_code
+        out.write(generate_function_code(function, cpc_index))
 
     # Generate thread (task) functions with dependencies
-    thread_functions = generate_thread_functions(threads, cpc)
-    ino_content += thread_functions
+    out.write(generate_thread_functions(threads, cpc_index))
+
+    return out
+
+
+def generate_cpc_files(cpc, cps_id, output_root="output"):
+    """
+    Generate the .ino, secrets.h and comm_utils.h files of a single CPC.
+    Returns the seconds spent per phase (index, generate, write).
+    """
+    timer = StageTimings()
+    cpc_name = sanitize_label(cpc.get("name"))
+    directory = os.path.join(output_root, cpc_name)
+    os.makedirs(directory, exist_ok=True)
 
-    # Write the updated content to the .ino file
-    write_to_file(directory, process_name(cpc_name), ino_content, ".ino")
+    generate_cpc_ino(cpc, directory, cps_id, timer)
+    with timer.measure("write"):
+        generate_secrets_file(directory)
+        generate_comm_utils_file(directory)
+    return timer.phases
 
+def cpc_file_names(cpc):
+    """
+    Names of the files generate_cpc_files writes into the directory of a CPC.
+    """
+    return [process_name(cpc.get("name")) + ".ino", "secrets.h", "comm_utils.h"]
 
+def generate_serialized_cpc_files(cpc_xml, cps_id, output_root="output"):
+    """
+    Process pool entry point: rebuild the CPC subtree from its serialized form and generate its files.
+    Workers only receive the subtree and the CPS id, never the whole model.
+    """
+    start = time.perf_counter()
+    cpc = ET.fromstring(cpc_xml)
+    parse_seconds = time.perf_counter() - start
 
+    phases = generate_cpc_files(cpc, cps_id, output_root)
+    phases["parse"] = phases.get("parse", 0.0) + parse_seconds
+    return phases
 
-def process_cpcs(xml_file):
+def get_cps_id(root):
     """
-    Parse the XML file and generate files for each CPC.
+    Build the CPS identifier used in the MQTT topics from the <root> id and name.
+    `root` can be the <root> element or a dict of its attributes.
     """
-    tree = ET.parse(xml_file)
-    root = tree.getroot()
+    root_ids = []
+    root_ids.append(process_name(root.get("id")))
+    root_ids.append(process_name(root.get("name")))
+    return "_".join(root_ids)
 
-    for cpc in root.findall("cpc"):
-        cpc_name = cpc.get("name")
-        directory = os.path.join("output", cpc_name)
-        os.makedirs(directory, exist_ok=True)
+def serialize_cpc(cpc):
+    """
+    Serialize a CPC subtree without the whitespace that follows it in the document,
+    so the result only depends on the CPC itself.
+    """
+    tail, cpc.tail = cpc.tail, None
+    try:
+        return ET.tostring(cpc, encoding="unicode")
+    finally:
+        cpc.tail = tail
 
-        generate_cpc_ino(cpc, directory)
-        generate_secrets_file(directory)
-        generate_comm_utils_file(directory)
+def get_generator_version():
+    """
+    Identify this generator by the hash of its own source, so any change to the
+    generator invalidates the incremental manifest.
+    """
+    with open(os.path.abspath(__file__), 'rb') as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
+def load_manifest(output_root):
+    manifest_path = os.path.join(output_root, MANIFEST_FILE)
+    try:
+        with open(manifest_path, 'r') as file:
+            return json.load(file)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+def save_manifest(output_root, manifest):
+    os.makedirs(output_root, exist_ok=True)
+    with open(os.path.join(output_root, MANIFEST_FILE), 'w') as file:
+        json.dump(manifest, file, indent=2, sort_keys=True)
+
+def delete_manifest(output_root):
+    try:
+        os.remove(os.path.join(output_root, MANIFEST_FILE))
+    except FileNotFoundError:
+        pass
+
+def stream_psm(xml_file):
+    """
+    Stream the intermediate model instead of loading it whole.
+
+    Returns the attributes of <root> and an iterator over its <cpc> subtrees.
+    Each subtree is released as soon as the consumer moves on to the next one,
+    so peak memory is bounded by the largest CPC rather than the whole model.
+    """
+    context = ET.iterparse(xml_file, events=("start", "end"))
+    _, root = next(context)
+    root_attributes = dict(root.attrib)
+
+    def iter_cpcs():
+        depth = 0
+        for event, element in context:
+            if event == "start":
+                depth += 1
+                continue
+            depth -= 1
+            if depth != 0:
+                continue
+            # A direct child of <root> is complete
+            if element.tag == "cpc":
+                yield element
+            # Drop everything parsed so far under <root>
+            root.clear()
+
+    return root_attributes, iter_cpcs()
+
+def timed(iterable, timer, phase):
+    """
+    Yield the items of an iterable, adding the time spent producing each one to `phase`.
+    Used to time the streaming parse, which is interleaved with generation.
+    """
+    iterator = iter(iterable)
+    while True:
+        start = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            timer.add(phase, time.perf_counter() - start)
+        yield item
+
+def process_cpcs(cpcs, cps_id, jobs=1, incremental=False, output_root="output"):
+    """
+    Generate files for each CPC of an iterable of <cpc> elements.
+    With jobs > 1 the CPCs are spread across a pool of worker processes.
+    With incremental=True, CPCs whose subtree, CPS id and generator version match
+    the manifest of the previous run, and whose files are all still present, are skipped.
+    Every run records what it leaves in output_root in a new manifest, so a later
+    incremental run never trusts files written by a run of a different model.
+
+    Returns a timing report: seconds per phase (parse, serialize, index, generate, write)
+    in total and per generated CPC, and the names of the skipped CPCs. With jobs > 1 the
+    phase totals add up the time spent in every worker.
+    """
+    timer = StageTimings()
+    cpc_timings = {}
+    skipped = []
+
+    def record(cpc_name, phases):
+        cpc_timings[cpc_name] = {phase: round(seconds, 6) for phase, seconds in phases.items()}
+        timer.merge(phases)
+
+    generator_version = get_generator_version()
+    previous_manifest = load_manifest(output_root) if incremental else {}
+    previous_cpcs = {}
+    if previous_manifest.get("generator_version") == generator_version and previous_manifest.get("cps_id") == cps_id:
+        previous_cpcs = previous_manifest.get("cpcs", {})
+    # The output is about to change: until the new manifest is saved there is none to trust
+    delete_manifest(output_root)
+
+    manifest_cpcs = {}
+    executor = ProcessPoolExecutor(max_workers=jobs) if jobs > 1 else None
+    futures = []
+    try:
+        for cpc in timed(cpcs, timer, "parse"):
+            cpc_name = sanitize_label(cpc.get("name"))
+            with timer.measure("serialize"):
+                cpc_xml = serialize_cpc(cpc)
+
+            entry = {
+                "hash": hashlib.sha256(cpc_xml.encode("utf-8")).hexdigest(),
+                "files": cpc_file_names(cpc),
+            }
+            manifest_cpcs[cpc_name] = entry
+            if incremental and previous_cpcs.get(cpc_name) == entry and all(
+                    os.path.isfile(os.path.join(output_root, cpc_name, file_name)) for file_name in entry["files"]):
+                print(f"Skipping unchanged CPC {cpc_name}")
+                skipped.append(cpc_name)
+                continue
+
+            if executor is None:
+                record(cpc_name, generate_cpc_files(cpc, cps_id, output_root))
+                continue
+
+            # Keep a bounded number of serialized CPCs in flight
+            if len(futures) >= 2 * jobs:
+                record(*finish(futures.pop(0)))
+            futures.append((cpc_name, executor.submit(generate_serialized_cpc_files, cpc_xml, cps_id, output_root)))
+
+        for pending in futures:
+            record(*finish(pending))
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    save_manifest(output_root, {
+        "generator_version": generator_version,
+        "cps_id": cps_id,
+        "cpcs": manifest_cpcs,
+    })
+
+    return {
+        "phases": {phase: round(seconds, 6) for phase, seconds in timer.phases.items()},
+        "cpcs": cpc_timings,
+        "skipped": skipped,
+    }
+
+def finish(pending):
+    """Wait for a worker; re-raises its error or returns (cpc_name, phases)."""
+    cpc_name, future = pending
+    return cpc_name, future.result()
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate Arduino MKR1010 code from an intermediate PSM model.")
+    parser.add_argument("xml_file", help="Path to the intermediate (PSM) XML model")
+    parser.add_argument("--jobs", "-j", type=int, default=1, help="Number of worker processes used to generate the CPCs (default: 1)")
+    parser.add_argument("--incremental", action="store_true", help=f"Skip CPCs that are unchanged since the last run (tracked in output/{MANIFEST_FILE})")
+    parser.add_argument("--timings-report", metavar="PATH", help="Write the per-phase and per-CPC timings of the run to PATH as JSON")
+    args = parser.parse_args()
+    start = time.perf_counter()
+
+    # Read the root attributes once, then generate one CPC at a time
+    root_attributes, cpcs = stream_psm(args.xml_file)
+    cps_id = get_cps_id(root_attributes)
+    if(debug):
+        print("CPS ID: ",cps_id)
+
+    report = process_cpcs(cpcs, cps_id, args.jobs, args.incremental)
+
+    if args.timings_report:
+        report.update({
+            "xml_file": args.xml_file,
+            "jobs": args.jobs,
+            "incremental": args.incremental,
+            "total_seconds": round(time.perf_counter() - start, 6),
+        })
+        with open(args.timings_report, 'w') as file:
+            json.dump(report, file, indent=2)
+        print(f"Timings report written to {args.timings_report}")
 
 # Example usage (Only for debug)
 # Test path: "../input/xml/PIMmidPSM.xml"
-xml_file_path = str(sys.argv[1])
-tree = ET.parse(xml_file_path)
-root = tree.getroot()
-root_ids = []
-root_ids.append(process_name(root.get("id")))
-root_ids.append(process_name(root.get("name")))
-CPS_id = "_".join(root_ids)
-if(debug):
-    print("CPS ID: ",CPS_id)
-
-process_cpcs(xml_file_path)
-
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+import hashlib
+import json
+import logging
+import os
+import random
+import time
+from contextlib import contextmanager
+
+
+class StageTimings:
+    """
+    Wall-clock time spent in each phase (parse, compile, transform, serialize) of one
+    request, plus the stylesheet cache hits and misses it caused. The code generator
+    uses it for its own phases (parse, index, generate, write).
+    """
+
+    def __init__(self):
+        self.phases = {}
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    @contextmanager
+    def measure(self, phase):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(phase, time.perf_counter() - start)
+
+    def add(self, phase, seconds):
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def merge(self, phases):
+        """Add the seconds of a {phase: seconds} mapping, e.g. the phases of another process."""
+        for phase, seconds in phases.items():
+            self.add(phase, seconds)
+
+    def as_fields(self):
+        fields = {f"{phase}_ms": round(seconds * 1000, 3) for phase, seconds in self.phases.items()}
+        fields["cache_hits"] = self.cache_hits
+        fields["cache_misses"] = self.cache_misses
+        return fields
+
+
+class StructuredFormatter(logging.Formatter):
+    """
+    Format records as `time level logger message key=value ...`, or as one JSON object
+    per line when `json_lines` is set. Structured fields are passed with
+    extra={'fields': {...}}.
+    """
+
+    def __init__(self, json_lines=False):
+        super().__init__()
+        self.json_lines = json_lines
+
+    def format(self, record):
+        fields = getattr(record, 'fields', {})
+        timestamp = time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(record.created))
+
+        if self.json_lines:
+            entry = {'time': timestamp, 'level': record.levelname, 'logger': record.name,
+                     'message': record.getMessage()}
+            entry.update(fields)
+            if record.exc_info:
+                entry['traceback'] = self.formatException(record.exc_info)
+            return json.dumps(entry, default=str)
+
+        line = f"{timestamp} {record.levelname} {record.name} {record.getMessage()}"
+        if fields:
+            line += " " + " ".join(f"{key}={json.dumps(value, default=str)}" for key, value in fields.items())
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+
+def configure_logging():
+    """
+    Configure the root logger from the environment:
+    LOG_LEVEL (default INFO) and LOG_FORMAT ('text' or 'json', default 'text').
+    """
+    handler = logging.StreamHandler()
+    handler.setFormatter(StructuredFormatter(json_lines=os.environ.get('LOG_FORMAT', 'text') == 'json'))
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(os.environ.get('LOG_LEVEL', 'INFO').upper())
+
+
+def describe_document(prefix, text):
+    """Return log fields with the size and a short content hash of a document, never its content."""
+    data = text.encode('utf-8')
+    return {f"{prefix}_bytes": len(data), f"{prefix}_sha256": hashlib.sha256(data).hexdigest()[:16]}
+
+
+class PayloadSampler:
+    """
+    Decide which requests get their full payloads logged.
+
+    Capture is opt-in: it needs DEBUG logging and a sample rate above 0
+    (DEBUG_PAYLOAD_SAMPLE_RATE, between 0 and 1).
+    """
+
+    def __init__(self, logger, rate=None):
+        self.logger = logger
+        self.rate = float(os.environ.get('DEBUG_PAYLOAD_SAMPLE_RATE', '0')) if rate is None else rate
+
+    def should_capture(self):
+        return self.rate > 0 and self.logger.isEnabledFor(logging.DEBUG) and random.random() < self.rate
@@ -0,0 +1,551 @@
+"""
+In-process SHACL validation of PIM graphs against the MDD4CPS ontology.
+
+The command line validation (semantics/semantic_validations/validation_command)
+
+    pyshacl -s shapes.ttl -d <(cat ontology.ttl data_case.ttl) -i owlrl
+
+re-parses the ontology and the shapes and recomputes the OWL-RL closure of the whole
+ontology for every model, which takes over a second even for a handful of triples.
+ShaclValidator parses the ontology and the shapes once and keeps the OWL-RL closure of
+the ontology. For each data graph it only derives what the closed ontology entails about
+the data's own individuals (see Entailments) and runs the shapes over the data and those
+facts, which takes milliseconds.
+
+A ValidationSession keeps a validated graph and its report, so an edit of the model only
+re-runs the shapes that the changed triples can affect and patches the previous report.
+"""
+import glob
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict, defaultdict
+
+import owlrl
+import pyshacl
+from rdflib import BNode, Graph, Literal
+from rdflib.collection import Collection
+from rdflib.namespace import OWL, RDF, RDFS, SH
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_SEMANTICS_DIR = os.path.join(BACKEND_DIR, '..', '..', 'semantics', 'semantic_validations')
+ONTOLOGY_FILE = 'dsl_pim_mdd4cps.ttl'
+SHAPES_PATTERN = 'shapes_case*.ttl'
+
+# Looked up for every triple during inference
+TYPE = RDF.type
+THING = OWL.Thing
+
+
+class Entailments:
+    """
+    The OWL-RL rules that derive facts about individuals, with their schema side
+    (subclasses, domains, ranges, inverse properties, ...) read once from the closed ontology.
+
+    OWL-RL applies them to the ontology and the data together on every run; since the
+    ontology part of the closure never changes, only these rules have to be run again, and
+    only over the data. Equality (owl:sameAs) and consistency checks are not applied: they
+    do not add types or property values for the shapes to see.
+    """
+
+    def __init__(self, closure):
+        def objects(predicate):
+            table = defaultdict(set)
+            for subject, value in closure.subject_objects(predicate):
+                if subject != value:
+                    table[subject].add(value)
+            return table
+
+        def members(node):
+            return list(Collection(closure, node))
+
+        # Transitive already (scm-sco, scm-spo, scm-eqc, scm-eqp ran over the ontology)
+        self.superclasses = objects(RDFS.subClassOf)
+        self.superproperties = objects(RDFS.subPropertyOf)
+        self.domains = objects(RDFS.domain)
+        self.ranges = objects(RDFS.range)
+
+        self.inverses = defaultdict(set)
+        for first, second in closure.subject_objects(OWL.inverseOf):
+            self.inverses[first].add(second)
+            self.inverses[second].add(first)
+        self.symmetric = set(closure.subjects(RDF.type, OWL.SymmetricProperty))
+        self.transitive = set(closure.subjects(RDF.type, OWL.TransitiveProperty))
+        self.chains = [(prop, members(chain)) for prop, chain in closure.subject_objects(OWL.propertyChainAxiom)]
+        self.intersections = [(cls, members(classes)) for cls, classes in closure.subject_objects(OWL.intersectionOf)]
+
+        # Restrictions: class -> (property, value or class)
+        self.has_value = {restriction: (closure.value(restriction, OWL.onProperty), value)
+                          for restriction, value in closure.subject_objects(OWL.hasValue)}
+        self.some_values = {restriction: (closure.value(restriction, OWL.onProperty), cls)
+                            for restriction, cls in closure.subject_objects(OWL.someValuesFrom)}
+        self.all_values = {restriction: (closure.value(restriction, OWL.onProperty), cls)
+                           for restriction, cls in closure.subject_objects(OWL.allValuesFrom)}
+        self.all_values_of = defaultdict(list)
+        for restriction, (prop, cls) in self.all_values.items():
+            self.all_values_of[prop].append((restriction, cls))
+
+    def infer(self, data, entailed=(), added=None):
+        """
+        Return the set of triples the ontology entails about the individuals of a data graph
+        (not including the triples already in it).
+
+        Args:
+            data: The data graph, or a set of triples.
+            entailed: What was entailed before some triples were added to data, to start from.
+            added: The triples added since then (default: all of data, i.e. start from scratch).
+        """
+        known = set(data)
+        known.update(entailed)
+        # (subject, property) -> values and property -> (subject, value) pairs, kept up to date as facts are added
+        values = defaultdict(set)
+        pairs = defaultdict(set)
+        pending = list(known) if added is None else list(added)
+        for subject, predicate, value in known:
+            values[subject, predicate].add(value)
+            pairs[predicate].add((subject, value))
+
+        def add(triple):
+            if triple not in known:
+                known.add(triple)
+                values[triple[0], triple[1]].add(triple[2])
+                pairs[triple[1]].add((triple[0], triple[2]))
+                pending.append(triple)
+
+        def instances(cls):
+            return {subject for subject, _ in pairs[TYPE] if cls in values[subject, TYPE]}
+
+        while pending:
+            # Rules that follow from one fact
+            while pending:
+                subject, predicate, value = pending.pop()
+                if predicate == TYPE:
+                    for cls in self.superclasses.get(value, ()):
+                        add((subject, TYPE, cls))
+                    if value in self.has_value:
+                        prop, item = self.has_value[value]
+                        add((subject, prop, item))
+                    if value in self.all_values:
+                        prop, cls = self.all_values[value]
+                        for item in list(values[subject, prop]):
+                            if not isinstance(item, Literal):
+                                add((item, TYPE, cls))
+                    continue
+                for prop in self.superproperties.get(predicate, ()):
+                    add((subject, prop, value))
+                for cls in self.domains.get(predicate, ()):
+                    add((subject, TYPE, cls))
+                if isinstance(value, Literal):
+                    continue
+                for cls in self.ranges.get(predicate, ()):
+                    add((value, TYPE, cls))
+                for restriction, cls in self.all_values_of.get(predicate, ()):
+                    if restriction in values[subject, TYPE]:
+                        add((value, TYPE, cls))
+                for prop in self.inverses.get(predicate, ()):
+                    add((value, prop, subject))
+                if predicate in self.symmetric:
+                    add((value, predicate, subject))
+                if predicate in self.transitive:
+                    for item in list(values[value, predicate]):
+                        add((subject, predicate, item))
+                    for start, middle in list(pairs[predicate]):
+                        if middle == subject:
+                            add((start, predicate, value))
+
+            # Rules that join several facts, run again until they add nothing new
+            for prop, chain in self.chains:
+                linked = set(pairs[chain[0]])
+                for link in chain[1:]:
+                    linked = {(start, end) for start, middle in linked for end in values[middle, link]}
+                for start, end in linked:
+                    add((start, prop, end))
+            for cls, classes in self.intersections:
+                for subject in set.intersection(*(instances(member) for member in classes)):
+                    add((subject, TYPE, cls))
+            for restriction, (prop, item) in self.has_value.items():
+                for subject, value in list(pairs[prop]):
+                    if value == item:
+                        add((subject, TYPE, restriction))
+            for restriction, (prop, cls) in self.some_values.items():
+                for subject, value in list(pairs[prop]):
+                    if cls == THING or (value, TYPE, cls) in known:
+                        add((subject, TYPE, restriction))
+
+        return known.difference(data)
+
+
+class ShaclValidator:
+    """
+    Validate data graphs against the MDD4CPS ontology and a set of SHACL shapes files,
+    all parsed once and shared by every validation.
+
+    Validations only read the shared graphs, so one validator can serve concurrent requests.
+    """
+
+    def __init__(self, ontology_path, shapes_paths):
+        start = time.perf_counter()
+        self.ontology = Graph().parse(ontology_path)
+        # The OWL-RL closure of the ontology on its own, computed once
+        self.closure = Graph()
+        self.closure += self.ontology
+        owlrl.DeductiveClosure(owlrl.OWLRL_Semantics).expand(self.closure)
+        self.entailments = Entailments(self.closure)
+
+        # Shapes files keyed by name, e.g. "shapes_case4_timing_interval"
+        self.shapes = {}
+        self.indexes = {}
+        for path in sorted(shapes_paths):
+            name = os.path.splitext(os.path.basename(path))[0]
+            self.shapes[name] = Graph().parse(path)
+            self.indexes[name] = ShapesIndex(self.shapes[name])
+        self.load_seconds = time.perf_counter() - start
+
+    @classmethod
+    def from_directory(cls, directory=DEFAULT_SEMANTICS_DIR):
+        """Load the ontology and every shapes_case*.ttl file of a semantic_validations directory."""
+        shapes_paths = glob.glob(os.path.join(directory, SHAPES_PATTERN))
+        if not shapes_paths:
+            raise FileNotFoundError(f"No {SHAPES_PATTERN} files in {directory}")
+        return cls(os.path.join(directory, ONTOLOGY_FILE), shapes_paths)
+
+    def parse(self, data, data_format='turtle'):
+        """Accept a data graph as an rdflib Graph or as serialized RDF text."""
+        if isinstance(data, Graph):
+            return data
+        return Graph().parse(data=data, format=data_format)
+
+    def prepare(self, data):
+        """
+        The graph the shapes run over: the data and what the ontology entails about it.
+
+        The types the ontology implies are all materialized, so unlike the command line
+        validation the ontology triples themselves need not be part of the data graph.
+        """
+        graph = Graph(bind_namespaces='core')
+        # The data's prefixes, so the report names its nodes the way the data does
+        for prefix, namespace in data.namespaces():
+            graph.bind(prefix, namespace, override=False)
+        graph += data
+        for triple in self.entailments.infer(data):
+            graph.add(triple)
+        return graph
+
+    def validate(self, data, shapes=None, data_format='turtle'):
+        """
+        Validate one data graph against the shapes.
+
+        Args:
+            data (Graph or str): The data graph, or its serialization in data_format.
+            shapes (list): Names of the shapes files to run (default: all of them).
+            data_format (str): rdflib format of a serialized data graph.
+
+        Returns:
+            dict: "conforms", the results of each shapes file ("conforms", "violations" and
+            "milliseconds") and the time spent on each step, in milliseconds.
+        """
+        timings = {}
+        start = time.perf_counter()
+        data = self.parse(data, data_format)
+        timings['parse_ms'] = elapsed_ms(start)
+
+        start = time.perf_counter()
+        graph = self.prepare(data)
+        timings['inference_ms'] = elapsed_ms(start)
+
+        start = time.perf_counter()
+        results = {name: self.run_shapes(graph, name) for name in self.shapes_names(shapes)}
+        timings['validation_ms'] = elapsed_ms(start)
+        timings['total_ms'] = round(sum(timings.values()), 3)
+
+        return {
+            'conforms': all(result['conforms'] for result in results.values()),
+            'shapes': results,
+            'timings': timings,
+        }
+
+    def shapes_names(self, shapes=None):
+        for name in shapes or self.shapes:
+            if name not in self.shapes:
+                raise KeyError(f"Unknown shapes file: {name}")
+        return list(shapes or self.shapes)
+
+    def run_shapes(self, graph, name, top_shapes=None):
+        """
+        Run one shapes file over a prepared graph (see prepare()), or only some of its
+        top-level shapes (IRIs, see ShapesIndex).
+        """
+        start = time.perf_counter()
+        # inplace: the prepared graph is already a private copy, so pySHACL needn't clone it again
+        conforms, report, _ = pyshacl.validate(graph, shacl_graph=self.shapes[name], inference='none', inplace=True,
+                                               use_shapes=[str(shape) for shape in top_shapes] if top_shapes else None)
+        return {
+            'conforms': conforms,
+            'violations': violations(report, graph, self.indexes[name]),
+            'milliseconds': elapsed_ms(start),
+        }
+
+
+class ShapesIndex:
+    """
+    The top-level shapes of a shapes file (the ones with targets) and every term each of
+    them mentions, directly or through its property shapes, lists and referenced shapes.
+
+    A shape can only be affected by a change of the data graph if the change uses one of
+    its terms: as the property of the changed triple, or as the class of a changed
+    rdf:type (see affected()). Shapes that are closed or use SPARQL look at any property,
+    so every change affects them.
+    """
+
+    TARGETS = (SH.targetClass, SH.targetNode, SH.targetSubjectsOf, SH.targetObjectsOf)
+
+    def __init__(self, graph):
+        tops = set()
+        for target in self.TARGETS:
+            tops.update(graph.subjects(target, None))
+        # Implicit class targets: a shape that is also a class
+        for shape in set(graph.subjects(RDF.type, SH.NodeShape)) | set(graph.subjects(RDF.type, SH.PropertyShape)):
+            if (shape, RDF.type, RDFS.Class) in graph or (shape, RDF.type, OWL.Class) in graph:
+                tops.add(shape)
+
+        self.terms = {}
+        self.owners = {}          # shapes graph node -> top-level shape it belongs to
+        self.any_change = set()   # closed or SPARQL-based shapes
+        self.node_targets = set()
+        for top in sorted(tops, key=str):
+            terms = {top}
+            pending = [top]
+            while pending:
+                node = pending.pop()
+                self.owners.setdefault(node, top)
+                for predicate, value in graph.predicate_objects(node):
+                    if predicate in (SH.sparql, SH.js) or (predicate == SH.closed and value.toPython() is True):
+                        self.any_change.add(top)
+                    if value not in terms:
+                        terms.add(value)
+                        if not isinstance(value, Literal):
+                            pending.append(value)
+            self.terms[top] = terms
+            if (top, SH.targetNode, None) in graph:
+                self.node_targets.add(top)
+
+    def owner(self, node):
+        return self.owners.get(node)
+
+    def affected(self, changes):
+        """The top-level shapes a set of added and removed triples can change the results of."""
+        properties, classes, nodes = set(), set(), set()
+        for subject, predicate, value in changes:
+            properties.add(predicate)
+            nodes.add(subject)
+            nodes.add(value)
+            if predicate == TYPE:
+                classes.add(value)
+        if RDFS.subClassOf in properties:
+            # Class hierarchies in the data change what sh:class and sh:targetClass match
+            return set(self.terms)
+
+        affected = set()
+        for top, terms in self.terms.items():
+            if (top in self.any_change or not terms.isdisjoint(properties) or not terms.isdisjoint(classes)
+                    or (top in self.node_targets and not terms.isdisjoint(nodes))):
+                affected.add(top)
+        return affected
+
+
+class ValidationSession:
+    """
+    A data graph validated once and kept, with its report, so later edits only re-run the
+    top-level shapes they can affect (see ShapesIndex) and patch the previous report.
+
+    Added triples extend the previous entailments; removals recompute them. Only the
+    triples that changed are added to or removed from the validated graph.
+    """
+
+    def __init__(self, validator, data, shapes=None, data_format='turtle'):
+        self.id = uuid.uuid4().hex
+        self.lock = threading.Lock()
+        self.validator = validator
+        self.shapes = validator.shapes_names(shapes)
+        data = validator.parse(data, data_format)
+        self.data = set(data)
+        self.inferred = validator.entailments.infer(self.data)
+        self.graph = Graph(bind_namespaces='core')
+        for prefix, namespace in data.namespaces():
+            self.graph.bind(prefix, namespace, override=False)
+        for triple in self.data | self.inferred:
+            self.graph.add(triple)
+
+        start = time.perf_counter()
+        results = {name: validator.run_shapes(self.graph, name) for name in self.shapes}
+        self.report = {
+            'conforms': all(result['conforms'] for result in results.values()),
+            'shapes': results,
+            'timings': {'validation_ms': elapsed_ms(start)},
+        }
+
+    def update(self, added=(), removed=()):
+        """
+        Apply an edit of the data graph and revalidate it.
+
+        Args:
+            added (iterable): Triples added to the data graph.
+            removed (iterable): Triples removed from it.
+
+        Returns:
+            dict: The patched report, as ShaclValidator.validate() returns it, with the
+            top-level shapes that were re-run and the shapes files whose results were reused.
+        """
+        timings = {}
+        start = time.perf_counter()
+        added = set(added) - self.data
+        removed = set(removed) & self.data
+        before = self.data | self.inferred
+        data = (self.data | added) - removed
+        if removed:
+            inferred = self.validator.entailments.infer(data)
+        else:
+            # Entailment only grows with the data: carry on from the previous entailments
+            inferred = self.validator.entailments.infer(data, self.inferred, added)
+        after = data | inferred
+        dropped, gained = before - after, after - before
+        changes = dropped | gained
+        for triple in dropped:
+            self.graph.remove(triple)
+        for triple in gained:
+            self.graph.add(triple)
+        timings['inference_ms'] = elapsed_ms(start)
+
+        start = time.perf_counter()
+        results = dict(self.report['shapes'])
+        rerun, reused = {}, []
+        try:
+            for name in self.shapes:
+                index = self.validator.indexes[name]
+                affected = index.affected(changes) if changes else set()
+                if not affected:
+                    reused.append(name)
+                    continue
+                if affected == set(index.terms) or any(isinstance(shape, BNode) for shape in affected):
+                    # Every shape, or shapes pySHACL can't select by IRI: run the whole file
+                    results[name] = self.validator.run_shapes(self.graph, name)
+                else:
+                    results[name] = self.patch(name, affected)
+                rerun[name] = sorted(term(shape, self.graph) or str(shape) for shape in affected)
+        except Exception:
+            # Leave the session as it was before the edit, so it can still be updated
+            for triple in gained:
+                self.graph.remove(triple)
+            for triple in dropped:
+                self.graph.add(triple)
+            raise
+        timings['validation_ms'] = elapsed_ms(start)
+        timings['total_ms'] = round(sum(timings.values()), 3)
+
+        self.data, self.inferred = data, inferred
+        self.report = {
+            'conforms': all(result['conforms'] for result in results.values()),
+            'shapes': results,
+            'timings': timings,
+            'changes': {'added': len(added), 'removed': len(removed), 'graph': len(changes)},
+            'rerun': rerun,
+            'reused': reused,
+        }
+        return self.report
+
+    def replace(self, data, data_format='turtle'):
+        """Revalidate a new version of the whole data graph (e.g. a PIM converted again after an edit)."""
+        data = set(self.validator.parse(data, data_format))
+        return self.update(added=data - self.data, removed=self.data - data)
+
+    def diff(self, text, data_format='turtle'):
+        """The triples of a Turtle (or data_format) snippet, e.g. the added or removed part of an edit."""
+        return set(self.validator.parse(text, data_format)) if text else set()
+
+    def patch(self, name, affected):
+        # Re-run the affected shapes only and swap their results for the previous ones
+        previous = self.report['shapes'][name]
+        names = {term(shape, self.graph) for shape in affected}
+        result = self.validator.run_shapes(self.graph, name, affected)
+        kept = [violation for violation in previous['violations'] if violation['shape'] not in names]
+        result['violations'] = sorted(kept + result['violations'],
+                                      key=lambda violation: tuple(str(item) for item in violation.values()))
+        result['conforms'] = not result['violations']
+        return result
+
+
+def elapsed_ms(start):
+    return round((time.perf_counter() - start) * 1000, 3)
+
+
+def term(node, graph):
+    # Prefixed names for IRIs (tc:Heater), plain values for literals; blank nodes have no stable name
+    if node is None or isinstance(node, BNode):
+        return None
+    if isinstance(node, Literal):
+        return str(node)
+    return node.n3(graph.namespace_manager)
+
+
+def violations(report, graph, index):
+    """
+    The results of a SHACL validation report graph, as a list of dicts sorted by focus node,
+    each with the top-level shape it comes from.
+    """
+    results = []
+    for result in report.subjects(RDF.type, SH.ValidationResult):
+        def value(predicate):
+            return term(report.value(result, predicate), graph)
+        results.append({
+            'focus_node': value(SH.focusNode),
+            'path': value(SH.resultPath),
+            'value': value(SH.value),
+            'source_shape': value(SH.sourceShape),
+            'constraint': value(SH.sourceConstraintComponent),
+            'severity': value(SH.resultSeverity),
+            'message': value(SH.resultMessage),
+            'shape': term(index.owner(report.value(result, SH.sourceShape)), graph),
+        })
+    return sorted(results, key=lambda result: tuple(str(item) for item in result.values()))
+
+
+class ValidationSessions:
+    """The open validation sessions of the backend; the least recently used are closed beyond max_sessions."""
+
+    def __init__(self, max_sessions=32):
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def open(self, validator, data, shapes=None, data_format='turtle'):
+        session = ValidationSession(validator, data, shapes, data_format)
+        with self._lock:
+            self._sessions[session.id] = session
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        return session
+
+    def get(self, session_id):
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None:
+                self._sessions.move_to_end(session_id)
+            return session
+
+    def close(self, session_id):
+        with self._lock:
+            return self._sessions.pop(session_id, None)
+
+
+# Loaded on first use, shared by every request of the backend
+_validator = None
+_validator_lock = threading.Lock()
+
+def get_validator():
+    """The process-wide ShaclValidator, loaded from $SEMANTICS_DIR on first use."""
+    global _validator
+    with _validator_lock:
+        if _validator is None:
+            _validator = ShaclValidator.from_directory(os.environ.get('SEMANTICS_DIR', DEFAULT_SEMANTICS_DIR))
+        return _validator
@@ -0,0 +1,337 @@
+"""
+Structural consistency checks of PIM and PSM models, without an OWL reasoner.
+
+semantics/structural_validations states the structural rules of the PIM DSL as OWL axioms
+(dsl_pim_mdd4cps.rdf) and shows, with Protégé and HermiT, how faulty models break them:
+
+    owl_01_two_ops_in_action          an action has at most one refinement operator
+    owl_02_element_in_two_components  an internal element is contained in exactly one component
+    owl_03_hw_and_sw_resource         a resource is not both hardware and software (the element
+                                      classes of the DSL are pairwise disjoint)
+
+check_model() enforces the same rules directly. The model is read once, with iterparse,
+into an index of the classes, components and refinement operators of every element id
+(an id drawn twice is one element, as it is for the reasoner), and the rules are then
+checked on the index. This takes milliseconds, so it runs on every transformation (see
+backend.py).
+
+With --cross-check, every model is also converted to RDF and closed with OWL-RL over the
+structural ontology, and the individuals the reasoner finds inconsistent are compared with
+the ones reported here:
+
+    python structural_check.py ../../semantics/draw.io_models/PIM_*.xml
+    python structural_check.py --cross-check ../../semantics/structural_validations/owl_0*.ttl
+"""
+import argparse
+import io
+import itertools
+import os
+import re
+import sys
+import time
+from collections import defaultdict
+
+from lxml import etree
+from rdflib import Graph
+from rdflib.namespace import OWL, RDF, RDFS
+from rdflib.util import guess_format
+
+from pim_rdf import CLASSES, MODEL_NAMESPACE, PIM, individual, pim_to_rdf
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_ONTOLOGY = os.path.join(BACKEND_DIR, '..', '..', 'semantics', 'structural_validations', 'dsl_pim_mdd4cps.rdf')
+
+# Root element -> model format
+FORMATS = {'mxfile': 'pim', 'mxGraphModel': 'pim', 'root': 'psm'}
+# PSM element -> PIM element type
+PSM_TYPES = {
+    'thread': 'operational_goal',
+    'function': 'action',
+    'hw_resource': 'hw_resource',
+    'sw_resource': 'sw_resource',
+    'commThread': 'comm_thread',
+    'listenerThread': 'listener_thread',
+}
+ACTION_CLASSES = (PIM.OnIntervalAction, PIM.OnDemandAction)
+# The only elements iterparse reports: geometry, styles and cells are skipped by the parser
+TAGS = tuple(FORMATS) + ('object', 'UserObject', 'cpc', 'relation') + tuple(PSM_TYPES)
+
+IRI = re.compile(r'https?://[^\s,()]+')
+
+
+class StructureIndex:
+    """What the rules need to know about each element of a model, by element id."""
+
+    def __init__(self, model_format):
+        self.format = model_format
+        self.classes = defaultdict(set)      # element -> PIM ontology classes
+        self.names = {}
+        self.components = defaultdict(set)   # element -> components it is contained in
+        self.operators = defaultdict(set)    # action -> refinement operators (ids, or AND/OR in a PSM)
+
+    def add(self, element_id, element_type, name):
+        self.classes[element_id].add(CLASSES[element_type])
+        if name:
+            self.names.setdefault(element_id, name)
+
+
+def index_model(source):
+    """
+    Index a PIM (draw.io mxfile) or a PSM in one pass.
+
+    Args:
+        source: Path or binary file object of the model.
+
+    Returns:
+        StructureIndex: The index, with format 'pim' or 'psm'.
+    """
+    index = None
+    parents = []     # PIM: (element id, id of the cell it is drawn in)
+    edges = []       # PIM: (source id, target id) of relation_from_to edges
+    open_components = []
+
+    for event, element in etree.iterparse(source, events=('start', 'end'), tag=TAGS, huge_tree=True):
+        tag = element.tag
+        if index is None:
+            if tag not in FORMATS:
+                raise ValueError(f"Not a PIM or PSM model: <{tag}>")
+            index = StructureIndex(FORMATS[tag])
+            continue
+
+        if index.format == 'psm':
+            # Attributes are complete on 'start'; nesting gives the component of each element
+            if event == 'start':
+                if tag == 'cpc':
+                    open_components.append(element.get('id'))
+                    index.add(element.get('id'), 'cps_component', element.get('name'))
+                elif tag in PSM_TYPES and open_components:
+                    index.add(element.get('id'), PSM_TYPES[tag], element.get('name'))
+                    index.components[element.get('id')].add(open_components[-1])
+                elif tag == 'relation' and element.get('operator'):
+                    index.operators[element.get('target')].add(element.get('operator'))
+                continue
+            if tag == 'cpc':
+                open_components.pop()
+        elif event == 'start' or tag not in ('object', 'UserObject'):
+            continue
+        else:
+            element_type = element.get('type')
+            element_id = element.get('id')
+            cell = element.find('mxCell')
+            if element_type == 'relation_from_to' and cell is not None:
+                edges.append((cell.get('source'), cell.get('target')))
+            elif element_type in CLASSES and element_id:
+                index.add(element_id, element_type, element.get('name'))
+                if cell is not None and cell.get('parent'):
+                    parents.append((element_id, cell.get('parent')))
+
+        # Done with this element: free it and the siblings before it
+        element.clear()
+        while element.getprevious() is not None:
+            del element.getparent()[0]
+
+    if index is None:
+        raise ValueError("Empty model")
+
+    # Containers and edges may point to elements further down the file
+    for element_id, parent in parents:
+        if PIM.CPComponent in index.classes.get(parent, ()):
+            index.components[element_id].add(parent)
+    for source_id, target_id in edges:
+        if (PIM.RefinementOperator in index.classes.get(source_id, ())
+                and not index.classes.get(target_id, set()).isdisjoint(ACTION_CLASSES)):
+            index.operators[target_id].add(source_id)
+    return index
+
+
+def index_graph(graph):
+    """Index a data graph in the vocabulary of the PIM ontology (e.g. the owl_0*.ttl datasets), by IRI."""
+    index = StructureIndex('rdf')
+    known = set(CLASSES.values())
+    for subject, cls in graph.subject_objects(RDF.type):
+        if cls in known:
+            index.classes[str(subject)].add(cls)
+            name = graph.value(subject, PIM.name)
+            if name is not None:
+                index.names.setdefault(str(subject), str(name))
+    for element, component in graph.subject_objects(PIM.isContainedIn):
+        index.components[str(element)].add(str(component))
+    for component, element in graph.subject_objects(PIM.containsElement):
+        index.components[str(element)].add(str(component))
+    for action, operator in graph.subject_objects(PIM.hasRefinementOperator):
+        index.operators[str(action)].add(str(operator))
+    return index
+
+
+def check_index(index):
+    """The violations of the structural rules in an indexed model, sorted by rule and element."""
+    found = []
+
+    def report(rule, element, values, message):
+        found.append({
+            'rule': rule,
+            'element': element,
+            'name': index.names.get(element),
+            'values': sorted(values),
+            'message': message,
+        })
+
+    for element, operators in index.operators.items():
+        # Action ⊑ hasRefinementOperator max 1 RefinementOperator
+        if len(operators) > 1 and not index.classes.get(element, set()).isdisjoint(ACTION_CLASSES):
+            report('two_refinement_operators', element, operators,
+                   f"Action {describe(index, element)} has {len(operators)} refinement operators")
+    for element, components in index.components.items():
+        # InternalElement ⊑ isContainedIn exactly 1 CPComponent
+        if len(components) > 1:
+            report('element_in_two_components', element, components,
+                   f"Element {describe(index, element)} is contained in {len(components)} components")
+    for element, classes in index.classes.items():
+        # HWResource/SWResource and OnDemandAction/OnIntervalAction are disjoint, and so are
+        # actions, senders, receivers, refinement operators and resources
+        classes = {cls.fragment for cls in classes if cls != PIM.CPComponent}
+        if len(classes) > 1:
+            report('disjoint_classes', element, classes,
+                   f"Element {describe(index, element)} is a {' and a '.join(sorted(classes))}")
+
+    return sorted(found, key=lambda violation: (violation['rule'], violation['element']))
+
+
+def describe(index, element):
+    name = index.names.get(element)
+    return f"'{name}' ({element})" if name else element
+
+
+def check_model(source):
+    """
+    Check a PIM or PSM against the structural rules.
+
+    Args:
+        source: Path or binary file object of the model (use check_string() for XML text).
+
+    Returns:
+        dict: The model format, whether it conforms, the violations (rule, element, name,
+        values and message each) and the time taken, in milliseconds.
+    """
+    start = time.perf_counter()
+    index = index_model(source)
+    found = check_index(index)
+    return {
+        'format': index.format,
+        'conforms': not found,
+        'violations': found,
+        'milliseconds': round((time.perf_counter() - start) * 1000, 3),
+    }
+
+
+def check_string(model_xml):
+    """Like check_model(), for a model held in a string."""
+    return check_model(io.BytesIO(model_xml.encode('utf-8')))
+
+
+def owl_inconsistencies(graph, ontology):
+    """
+    The individuals of a data graph that OWL-RL finds inconsistent with the structural ontology.
+
+    OWL-RL only bounds cardinalities from above, so the exact cardinalities of the ontology
+    are read as maximum ones. Element ids are unique in a model, so the components and the
+    refinement operators are declared different from each other, as the owl_0*.ttl datasets do.
+
+    The domains of the datatype properties are left out: they type elements by their
+    attributes, not by what they are drawn as (the PIMs give message senders and receivers
+    operation_modes_enabled, whose domain is Action), which is beyond the structural rules.
+    """
+    import owlrl
+    from owlrl.Namespaces import ERRNS
+
+    closure = Graph()
+    closure += ontology
+    for prop in ontology.subjects(RDF.type, OWL.DatatypeProperty):
+        closure.remove((prop, RDFS.domain, None))
+    for restriction, count in ontology.subject_objects(OWL.qualifiedCardinality):
+        closure.add((restriction, OWL.maxQualifiedCardinality, count))
+    closure += graph
+    for cls in (PIM.CPComponent, PIM.RefinementOperator):
+        for first, second in itertools.combinations(sorted(set(graph.subjects(RDF.type, cls))), 2):
+            closure.add((first, OWL.differentFrom, second))
+    owlrl.DeductiveClosure(owlrl.OWLRL_Semantics).expand(closure)
+
+    subjects = {str(subject) for subject in graph.subjects()}
+    found = set()
+    for message in closure.objects(None, ERRNS.error):
+        found.update(iri for iri in IRI.findall(str(message)) if iri in subjects)
+    return found
+
+
+def cross_check(path, ontology):
+    """
+    Check one model (PIM, PSM or RDF data graph) and compare it with OWL-RL.
+
+    Returns:
+        tuple: The report of check_model() and the individuals only the checker (first) or
+        only OWL-RL (second) found inconsistent. PSMs are not compared (there is no RDF
+        mapping for them) and get None.
+    """
+    if path.endswith('.xml'):
+        report = check_model(path)
+        if report['format'] != 'pim':
+            return report, None
+        graph = pim_to_rdf(path)
+        iri = lambda element: str(individual(MODEL_NAMESPACE, element))
+    else:
+        start = time.perf_counter()
+        graph = Graph().parse(path, format=guess_format(path) or 'turtle')
+        found = check_index(index_graph(graph))
+        report = {'format': 'rdf', 'conforms': not found, 'violations': found,
+                  'milliseconds': round((time.perf_counter() - start) * 1000, 3)}
+        iri = str
+
+    # The reasoner names the individuals it had to merge (the operators or the components)
+    # or the one with disjoint classes
+    native = set()
+    for violation in report['violations']:
+        if violation['rule'] == 'disjoint_classes':
+            native.add(iri(violation['element']))
+        else:
+            native.update(iri(value) for value in violation['values'])
+    reasoner = owl_inconsistencies(graph, ontology)
+    return report, (native - reasoner, reasoner - native)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check PIM and PSM models against the structural rules of the PIM DSL.")
+    parser.add_argument("models", nargs='+', help="PIM (.xml) or PSM models; with --cross-check, also RDF data graphs (.ttl)")
+    parser.add_argument("--cross-check", action="store_true", help="Compare every result with OWL-RL over the structural ontology")
+    parser.add_argument("--ontology", default=DEFAULT_ONTOLOGY, help="Structural ontology used by --cross-check")
+    args = parser.parse_args()
+
+    ontology = Graph().parse(args.ontology) if args.cross_check else None
+    failed = False
+    for path in args.models:
+        if args.cross_check:
+            start = time.perf_counter()
+            report, differences = cross_check(path, ontology)
+            reasoner_seconds = time.perf_counter() - start
+        else:
+            report, differences = check_model(path), None
+
+        print(f"{os.path.basename(path)} ({report['format']}): {len(report['violations'])} violation(s) "
+              f"in {report['milliseconds']:.1f}ms")
+        for violation in report['violations']:
+            print(f"  [{violation['rule']}] {violation['message']}: {', '.join(violation['values'])}")
+        if differences is not None:
+            only_native, only_reasoner = differences
+            if only_native or only_reasoner:
+                failed = True
+                print(f"  OWL-RL DISAGREES ({reasoner_seconds:.2f}s): only here {sorted(only_native)}, "
+                      f"only OWL-RL {sorted(only_reasoner)}")
+            else:
+                print(f"  OWL-RL agrees ({reasoner_seconds:.2f}s)")
+        elif not args.cross_check:
+            failed = failed or not report['conforms']
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
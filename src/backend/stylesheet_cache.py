@@ -0,0 +1,84 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+class StylesheetCache:
+    """
+    LRU cache of compiled XSLT stylesheets.
+
+    Entries are keyed by the SHA-256 hash of the stylesheet text, so the same
+    stylesheet sent by different requests is only compiled once per worker.
+    When the cache holds more than `max_size` executables, the least recently
+    used one is evicted.
+    """
+
+    def __init__(self, processor, max_size=16):
+        self.processor = processor
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def content_hash(stylesheet_text):
+        return hashlib.sha256(stylesheet_text.encode("utf-8")).hexdigest()
+
+    def get(self, stylesheet_text):
+        """
+        Return a compiled executable for the given stylesheet text.
+
+        Args:
+            stylesheet_text (str): The XSLT stylesheet source.
+
+        Returns:
+            PyXsltExecutable: A private clone of the cached executable, so the
+            caller can set parameters without affecting other requests.
+        """
+        return self.lookup(stylesheet_text)[0]
+
+    def lookup(self, stylesheet_text):
+        """
+        Like get(), but also report whether the stylesheet was already compiled.
+
+        Returns:
+            tuple: (PyXsltExecutable, bool) - the executable clone and True on a cache hit.
+        """
+        key = self.content_hash(stylesheet_text)
+
+        with self._lock:
+            executable = self._entries.get(key)
+            if executable is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return executable.clone(), True
+            self.misses += 1
+
+        # Compile outside the lock so slow compilations don't block cache hits
+        xslt_proc = self.processor.new_xslt30_processor()
+        executable = xslt_proc.compile_stylesheet(stylesheet_text=stylesheet_text)
+
+        with self._lock:
+            self._entries[key] = executable
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+        return executable.clone(), False
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
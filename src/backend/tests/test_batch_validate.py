@@ -0,0 +1,25 @@
+import os
+
+from batch_validate import find_data
+from shacl_validation import DEFAULT_SEMANTICS_DIR
+
+REPOSITORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..')
+DRAWIO_DIR = os.path.join(REPOSITORY, 'semantics', 'draw.io_models')
+
+
+def test_directories_only_yield_data_files():
+    names = [os.path.basename(path) for path in find_data([DEFAULT_SEMANTICS_DIR, DRAWIO_DIR])]
+    assert names == sorted(name for name in os.listdir(DEFAULT_SEMANTICS_DIR) if name.startswith('data_')) + \
+        sorted(name for name in os.listdir(DRAWIO_DIR) if name.endswith('.xml'))
+    assert 'report_case.ttl' not in names
+
+
+def test_named_files_are_always_kept():
+    report = os.path.join(DEFAULT_SEMANTICS_DIR, 'report_case.ttl')
+    assert find_data([report]) == [report]
+
+
+def test_patterns_replace_the_defaults():
+    paths = find_data([DEFAULT_SEMANTICS_DIR], patterns=['data_case4_*'])
+    assert [os.path.basename(path) for path in paths] == ['data_case4_missing_timing_interval.ttl',
+                                                          'data_case4_no_errors.ttl']
@@ -0,0 +1,78 @@
+"""
+Incremental code generation (psm_to_code-arduinomkr1010.py --incremental): the manifest
+must always describe what the last run left in the output directory.
+"""
+import importlib.util
+import os
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+EXAMPLE_PSM = os.path.join(BACKEND_DIR, '..', '..', 'example', 'models', '04-PSM-ReadyForCodeGeneration.xml')
+
+
+@pytest.fixture(scope='module')
+def generator():
+    spec = importlib.util.spec_from_file_location(
+        'psm_to_code_arduinomkr1010', os.path.join(BACKEND_DIR, 'psm_to_code-arduinomkr1010.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture
+def models(tmp_path):
+    """Model A (the example PSM) and a model B that changes one interval of A."""
+    with open(EXAMPLE_PSM, encoding='utf-8') as file:
+        model_a = file.read()
+    model_b = model_a.replace('interval_in_milliseconds="10000"', 'interval_in_milliseconds="20000"', 1)
+    assert model_b != model_a
+
+    paths = {}
+    for name, text in (('a', model_a), ('b', model_b)):
+        paths[name] = tmp_path / f'model_{name}.xml'
+        paths[name].write_text(text, encoding='utf-8')
+    return paths
+
+
+def generate(generator, model, output_root, incremental):
+    root_attributes, cpcs = generator.stream_psm(str(model))
+    return generator.process_cpcs(cpcs, generator.get_cps_id(root_attributes),
+                                  incremental=incremental, output_root=str(output_root))
+
+
+def read_output(output_root):
+    files = {}
+    for directory, _, names in os.walk(output_root):
+        for name in names:
+            if name != '.psm_to_code_manifest.json':
+                path = os.path.join(directory, name)
+                with open(path, encoding='utf-8') as file:
+                    files[os.path.relpath(path, output_root)] = file.read()
+    return files
+
+
+def test_plain_run_invalidates_the_manifest(generator, models, tmp_path):
+    output_root = tmp_path / 'output'
+    generate(generator, models['a'], output_root, incremental=True)
+    sketches_a = read_output(output_root)
+
+    generate(generator, models['b'], output_root, incremental=False)
+    assert read_output(output_root) != sketches_a
+
+    report = generate(generator, models['a'], output_root, incremental=True)
+    assert report['skipped'] == ['Soil Moisture Monitor Component', 'Soil Moisture Actuator Component',
+                                 'Temperature Actuator Component']
+    assert read_output(output_root) == sketches_a
+
+
+def test_missing_file_is_regenerated(generator, models, tmp_path):
+    output_root = tmp_path / 'output'
+    generate(generator, models['a'], output_root, incremental=True)
+    sketches_a = read_output(output_root)
+
+    os.remove(output_root / 'Temperature Monitor Component' / 'secrets.h')
+    report = generate(generator, models['a'], output_root, incremental=True)
+    assert 'Temperature Monitor Component' not in report['skipped']
+    assert len(report['skipped']) == 3
+    assert read_output(output_root) == sketches_a
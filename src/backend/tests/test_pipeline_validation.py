@@ -0,0 +1,120 @@
+import json
+import os
+import time
+
+import pytest
+
+import backend
+
+REPOSITORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..')
+XSL_DIR = os.path.join(REPOSITORY, 'src', 'frontend', 'static', 'input', 'xsl')
+CIM = os.path.join(REPOSITORY, 'semantics', 'draw.io_models', 'CIM_temp_control_eng.drawio')
+# A CIM whose questionnaire has been answered, so its PIM has message senders with data structures
+ANSWERED_CIM = os.path.join(REPOSITORY, 'example', 'models', '01-CIM-Greenhouse-PrePIM-UserInputApplied.xml')
+
+
+def read(path):
+    with open(path, encoding='utf-8') as file:
+        return file.read()
+
+
+def stylesheets(*names):
+    return [read(os.path.join(XSL_DIR, name)) for name in names]
+
+
+CIM_PIM = ('CIM-PIM.xsl', 'CIM-PIM-Aux.xsl')
+PSM_PARAMETERS = {'platform': 'arduino', 'comm_tech': 'mqtt'}
+
+
+@pytest.fixture(scope='module')
+def client():
+    return backend.app.test_client()
+
+
+def post_pipeline(client, names, parameters=None, cim=CIM, **options):
+    return client.post('/pipeline', json=dict({
+        'inputXML': read(cim),
+        'xslTransformations': stylesheets(*names),
+        'parameters': parameters or {},
+    }, **options))
+
+
+def test_pipeline_without_validate_has_no_report(client):
+    response = post_pipeline(client, CIM_PIM)
+    assert response.status_code == 200
+    assert 'X-Validation' not in response.headers
+
+
+def test_pipeline_validates_the_cim_pim_result(client):
+    response = post_pipeline(client, CIM_PIM, validate=True)
+    assert response.status_code == 200
+    summary = json.loads(response.headers['X-Validation'])
+    assert 'error' not in summary
+    assert summary['violations'] == sum(summary['shapes'].values())
+    assert set(summary['shapes']) == set(backend.get_validator().shapes)
+
+    # The same report as validating the resulting PIM on its own
+    report = client.post('/validate', json={'pimXML': response.get_data(as_text=True)}).get_json()
+    assert summary['conforms'] == report['conforms']
+    assert summary['shapes'] == {name: len(result['violations']) for name, result in report['shapes'].items()}
+
+
+def test_answered_pim_conforms(client):
+    response = post_pipeline(client, CIM_PIM, cim=ANSWERED_CIM, validate=True)
+    assert response.status_code == 200
+    assert 'type="comm_thread"' in response.get_data(as_text=True)
+    summary = json.loads(response.headers['X-Validation'])
+    assert summary['conforms'] is True
+    assert summary['violations'] == 0
+
+
+def test_pipeline_validates_the_intermediate_pim(client):
+    # CIM→PIM→PSM in one call: the PIM between the stages is validated, the PSM is returned
+    response = post_pipeline(client, CIM_PIM + ('PIM-PSM.xsl',), PSM_PARAMETERS, validate=True)
+    assert response.status_code == 200
+    assert json.loads(response.headers['X-Structural-Check'])['format'] == 'psm'
+    summary = json.loads(response.headers['X-Validation'])
+    assert 'error' not in summary
+
+    pim = post_pipeline(client, CIM_PIM, validate=True)
+    assert summary == json.loads(pim.headers['X-Validation'])
+
+
+def test_pipeline_without_pim_reports_it(client):
+    # The input is already a PIM, so no stage produces one
+    pim = post_pipeline(client, CIM_PIM).get_data(as_text=True)
+    response = client.post('/pipeline', json={
+        'inputXML': pim, 'xslTransformations': stylesheets('PIM-PSM.xsl'),
+        'parameters': PSM_PARAMETERS, 'validate': True})
+    assert response.status_code == 200
+    assert 'error' in json.loads(response.headers['X-Validation'])
+
+
+def test_raw_xml_request(client):
+    # The raw CIM as the body, the preset stylesheets and the options in the query string
+    query = '&'.join(f'stylesheet={name}' for name in CIM_PIM) + '&validate=true'
+    response = client.post(f'/pipeline?{query}', data=read(ANSWERED_CIM), content_type='application/xml')
+    assert response.status_code == 200
+    expected = post_pipeline(client, CIM_PIM, cim=ANSWERED_CIM, validate=True)
+    assert response.get_data() == expected.get_data()
+    assert response.headers['X-Validation'] == expected.headers['X-Validation']
+
+    response = client.post('/transform?stylesheet=../backend.py', data=read(CIM), content_type='application/xml')
+    assert response.status_code == 400
+
+
+def test_job_reports_the_validation(client):
+    response = client.post('/jobs', json={
+        'inputXML': read(ANSWERED_CIM), 'xslTransformations': stylesheets(*CIM_PIM), 'validate': True})
+    assert response.status_code == 202
+    job_id = response.get_json()['id']
+
+    deadline = time.time() + 120
+    status = response.get_json()
+    while status['status'] not in ('done', 'failed', 'cancelled') and time.time() < deadline:
+        time.sleep(0.1)
+        status = client.get(f'/jobs/{job_id}').get_json()
+    assert status['status'] == 'done'
+    assert status['structure']['format'] == 'pim'
+    assert status['validation']['conforms'] is True
+    assert set(status['validation']['shapes']) == set(backend.get_validator().shapes)
@@ -0,0 +1,142 @@
+import glob
+import os
+
+import pytest
+from lxml import etree
+from rdflib import Graph
+
+from structural_check import DEFAULT_ONTOLOGY, check_string, cross_check
+
+REPOSITORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..')
+STRUCTURAL_DIR = os.path.join(REPOSITORY, 'semantics', 'structural_validations')
+DRAWIO_DIR = os.path.join(REPOSITORY, 'semantics', 'draw.io_models')
+PIM = os.path.join(DRAWIO_DIR, 'PIM_temp_control_eng.xml')
+PSM = os.path.join(REPOSITORY, 'example', 'models', '04-PSM-ReadyForCodeGeneration.xml')
+
+# The rule each OWL dataset of semantics/structural_validations breaks
+OWL_CASES = {
+    'owl_01_two_ops_in_action.ttl': 'two_refinement_operators',
+    'owl_02_element_in_two_components.ttl': 'element_in_two_components',
+    'owl_03_hw_and_sw_resource.ttl': 'disjoint_classes',
+}
+
+# The same faults drawn in the canonical PIM: cells appended to its diagram
+PIM_FAULTS = {
+    # A second refinement operator for the action YvtLxscB_G1wt4JuAX6Y-7
+    'two_refinement_operators': [
+        ('object', {'label': 'OR', 'type': 'or_ref_operator', 'id': 'YvtLxscB_G1wt4JuAX6Y-7-operator-or_ref_operator'},
+         {'parent': 'YvtLxscB_G1wt4JuAX6Y-2', 'vertex': '1'}),
+        ('object', {'type': 'relation_from_to', 'id': 'x-e1'},
+         {'parent': 'YvtLxscB_G1wt4JuAX6Y-2', 'source': 'YvtLxscB_G1wt4JuAX6Y-7-operator-or_ref_operator',
+          'target': 'YvtLxscB_G1wt4JuAX6Y-7', 'edge': '1'}),
+    ],
+    # The heating element drawn again in a second component
+    'element_in_two_components': [
+        ('object', {'label': 'Heating element', 'type': 'hw_resource', 'name': 'Heating element', 'id': 'YvtLxscB_G1wt4JuAX6Y-9'},
+         {'parent': 'YvtLxscB_G1wt4JuAX6Y-16', 'vertex': '1'}),
+    ],
+    # The heating element drawn again as a software resource
+    'disjoint_classes': [
+        ('object', {'label': 'Heating element', 'type': 'sw_resource', 'name': 'Heating element', 'id': 'YvtLxscB_G1wt4JuAX6Y-9'},
+         {'parent': 'YvtLxscB_G1wt4JuAX6Y-2', 'vertex': '1'}),
+    ],
+}
+
+
+@pytest.fixture(scope='module')
+def ontology():
+    return Graph().parse(DEFAULT_ONTOLOGY)
+
+
+def rules(report):
+    return {violation['rule'] for violation in report['violations']}
+
+
+def assert_agrees(differences):
+    only_native, only_reasoner = differences
+    assert not only_native, f"only the native check: {sorted(only_native)}"
+    assert not only_reasoner, f"only OWL-RL: {sorted(only_reasoner)}"
+
+
+@pytest.mark.parametrize('name, rule', sorted(OWL_CASES.items()))
+def test_owl_datasets_agree_with_owl_rl(ontology, name, rule):
+    report, differences = cross_check(os.path.join(STRUCTURAL_DIR, name), ontology)
+    assert rules(report) == {rule}
+    assert_agrees(differences)
+
+
+def test_every_owl_dataset_is_covered():
+    found = {os.path.basename(path) for path in glob.glob(os.path.join(STRUCTURAL_DIR, 'owl_0*.ttl'))}
+    assert found == set(OWL_CASES)
+
+
+@pytest.mark.parametrize('path', sorted(glob.glob(os.path.join(DRAWIO_DIR, 'PIM_*.xml'))), ids=os.path.basename)
+def test_drawio_pims_agree_with_owl_rl(ontology, path):
+    report, differences = cross_check(path, ontology)
+    assert report['format'] == 'pim'
+    assert_agrees(differences)
+
+
+@pytest.mark.parametrize('rule', sorted(PIM_FAULTS))
+def test_faulty_pims_agree_with_owl_rl(ontology, tmp_path, rule):
+    tree = etree.parse(PIM)
+    root = tree.find('.//root')
+    for tag, attributes, cell in PIM_FAULTS[rule]:
+        element = etree.SubElement(root, tag, attributes)
+        etree.SubElement(element, 'mxCell', cell)
+    path = str(tmp_path / f'{rule}.xml')
+    tree.write(path)
+
+    report, differences = cross_check(path, ontology)
+    assert rules(report) == {rule}
+    assert_agrees(differences)
+
+
+def faulty_psm(*elements):
+    """The example PSM with elements (component index, tag, attributes) added to its components."""
+    tree = etree.parse(PSM)
+    components = tree.getroot().findall('cpc')
+    for component, tag, attributes in elements:
+        etree.SubElement(components[component], tag, attributes)
+    return etree.tostring(tree, encoding='unicode')
+
+
+def test_psm_conforms():
+    with open(PSM, encoding='utf-8') as file:
+        report = check_string(file.read())
+    assert report['format'] == 'psm'
+    assert report['conforms']
+    assert report['violations'] == []
+
+
+def test_psm_thread_with_two_refinement_operators():
+    report = check_string(faulty_psm(
+        (0, 'relation', {'id': 'x-r1', 'source': 'cVOCU7CYytCJJ8tOkeac-17',
+                         'target': 'cVOCU7CYytCJJ8tOkeac-16', 'operator': 'OR'})))
+    assert not report['conforms']
+    [violation] = report['violations']
+    assert violation['rule'] == 'two_refinement_operators'
+    assert violation['element'] == 'cVOCU7CYytCJJ8tOkeac-16'
+    assert violation['values'] == ['AND', 'OR']
+
+
+def test_psm_resource_in_two_components():
+    report = check_string(faulty_psm(
+        (1, 'hw_resource', {'id': 'cVOCU7CYytCJJ8tOkeac-18', 'name': 'Temperature Sensor'})))
+    [violation] = report['violations']
+    assert violation['rule'] == 'element_in_two_components'
+    assert violation['element'] == 'cVOCU7CYytCJJ8tOkeac-18'
+    assert violation['values'] == ['cVOCU7CYytCJJ8tOkeac-32', 'cVOCU7CYytCJJ8tOkeac-5']
+
+
+def test_psm_hardware_and_software_resource():
+    report = check_string(faulty_psm(
+        (0, 'sw_resource', {'id': 'cVOCU7CYytCJJ8tOkeac-18', 'name': 'Temperature Sensor'})))
+    [violation] = report['violations']
+    assert violation['rule'] == 'disjoint_classes'
+    assert violation['values'] == ['HWResource', 'SWResource']
+
+
+def test_not_a_model():
+    with pytest.raises(ValueError):
+        check_string('<html><body/></html>')
@@ -0,0 +1,88 @@
+import glob
+import os
+import random
+
+import pytest
+from rdflib import Graph
+
+from shacl_validation import DEFAULT_SEMANTICS_DIR, ValidationSession, get_validator
+
+DATA_CASES = sorted(glob.glob(os.path.join(DEFAULT_SEMANTICS_DIR, 'data_case*.ttl')))
+EDITS = 60
+
+
+@pytest.fixture(scope='module')
+def validator():
+    return get_validator()
+
+
+@pytest.fixture(scope='module')
+def graphs():
+    return {os.path.basename(path): Graph().parse(path) for path in DATA_CASES}
+
+
+def full_report(validator, session, base):
+    # The session's current data validated from scratch, with the prefixes the session binds
+    data = Graph(bind_namespaces='core')
+    for prefix, namespace in base.namespaces():
+        data.bind(prefix, namespace, override=False)
+    for triple in session.data:
+        data.add(triple)
+    return validator.validate(data)
+
+
+def assert_same_report(report, expected, context=''):
+    assert report['conforms'] == expected['conforms'], context
+    assert set(report['shapes']) == set(expected['shapes']), context
+    for name, result in expected['shapes'].items():
+        assert report['shapes'][name]['conforms'] == result['conforms'], f"{context} {name}"
+        assert report['shapes'][name]['violations'] == result['violations'], f"{context} {name}"
+
+
+def random_edit(rng, session, pool):
+    # A few triples removed from the data and a few taken from the other data cases, or only additions
+    data = sorted(session.data)
+    candidates = sorted(pool - session.data)
+    removed = rng.sample(data, rng.randint(1, 3)) if data and rng.random() < 0.6 else []
+    added = rng.sample(candidates, min(len(candidates), rng.randint(0, 3)))
+    return added, removed
+
+
+@pytest.mark.parametrize('seed', [1, 2, 3])
+def test_incremental_reports_match_full_validation(validator, graphs, seed):
+    rng = random.Random(seed)
+    name = rng.choice(sorted(graphs))
+    base = graphs[name]
+    pool = set().union(*graphs.values())
+
+    session = ValidationSession(validator, base)
+    assert_same_report(session.report, full_report(validator, session, base))
+    for step in range(EDITS):
+        added, removed = random_edit(rng, session, pool)
+        report = session.update(added=added, removed=removed)
+        assert_same_report(report, full_report(validator, session, base), f"{name}, edit {step}:")
+
+
+def test_failed_update_leaves_the_session_unchanged(validator, graphs, monkeypatch):
+    base = graphs['data_case4_missing_timing_interval.ttl']
+    session = ValidationSession(validator, base)
+    data, inferred, report = set(session.data), set(session.inferred), session.report
+    graph = set(session.graph)
+    removed = sorted(session.data)[:5]
+
+    def fail(*args, **kwargs):
+        raise RuntimeError('shapes failed')
+
+    monkeypatch.setattr(validator, 'run_shapes', fail)
+    with pytest.raises(RuntimeError):
+        session.update(removed=removed)
+    monkeypatch.undo()
+
+    assert session.data == data
+    assert session.inferred == inferred
+    assert session.report is report
+    assert set(session.graph) == graph
+
+    # The same edit applies once the shapes run again
+    report = session.update(removed=removed)
+    assert_same_report(report, full_report(validator, session, base))
@@ -1,28 +1,216 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, render_template, request, jsonify, Response, stream_with_context, g
 import requests
+from requests.adapters import HTTPAdapter
+from prometheus_client import Counter, Gauge, Histogram, CONTENT_TYPE_LATEST, generate_latest
+import os
+import time
 
 app = Flask(__name__)
 
+# Directory holding the preset XSLT stylesheets, addressable by file name
+XSL_DIR = os.path.join(app.static_folder, 'input', 'xsl')
+
+# Backend connection settings
+BACKEND_URL = os.environ.get('BACKEND_URL', 'http://backend:3000')
+BACKEND_POOL_SIZE = int(os.environ.get('BACKEND_POOL_SIZE', '10'))
+BACKEND_TIMEOUT = (
+    float(os.environ.get('BACKEND_CONNECT_TIMEOUT', '5')),  # seconds to establish a connection
+    float(os.environ.get('BACKEND_READ_TIMEOUT', '600')),   # seconds to wait between bytes of the response
+)
+STREAM_CHUNK_SIZE = int(os.environ.get('STREAM_CHUNK_SIZE', str(64 * 1024)))
+# Backend response headers relayed to the browser
+FORWARDED_HEADERS = ('X-Structural-Check', 'X-Validation')
+
+# Keep-alive connections to the backend are pooled and reused across requests.
+# pool_block makes requests wait for a free connection instead of opening more than BACKEND_POOL_SIZE.
+backend_session = requests.Session()
+backend_session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=BACKEND_POOL_SIZE, pool_block=True))
+
+# Prometheus metrics, served on /metrics
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+REQUESTS = Counter('frontend_requests_total', 'HTTP requests handled', ['endpoint', 'method', 'status'])
+REQUEST_SECONDS = Histogram('frontend_request_seconds', 'HTTP request latency (until the response starts)',
+                            ['endpoint'], buckets=LATENCY_BUCKETS)
+IN_FLIGHT = Gauge('frontend_requests_in_flight', 'HTTP requests currently being handled')
+PROXY_SECONDS = Histogram('frontend_proxy_seconds', 'Backend call latency, until the response is fully relayed',
+                          ['endpoint'], buckets=LATENCY_BUCKETS)
+PROXY_IN_FLIGHT = Gauge('frontend_proxy_in_flight', 'Backend calls currently open')
+DOCUMENT_BYTES = Counter('frontend_document_bytes_total', 'Document bytes uploaded by the browser and relayed back',
+                         ['direction'])
+
+def resolve_stylesheet(stylesheet):
+    """
+    Return the XSLT source for a pipeline stage given either as
+    {'id': '<preset file name>'} or {'content': '<xslt source>'}.
+    """
+    if stylesheet.get('content'):
+        return stylesheet['content']
+
+    stylesheet_id = stylesheet.get('id', '')
+    path = os.path.join(XSL_DIR, os.path.basename(stylesheet_id))
+    if stylesheet_id != os.path.basename(stylesheet_id) or not os.path.isfile(path):
+        raise ValueError(f"Unknown stylesheet: {stylesheet_id}")
+    with open(path, encoding='utf-8') as file:
+        return file.read()
+
+def read_pipeline_request():
+    """
+    Build the backend pipeline payload {inputXML, xslTransformations, parameters, pretty, validate}
+    from a JSON request {inputXML, stylesheets, parameters, pretty, validate}, as sent when
+    uploaded stylesheets are involved. Raises ValueError for unknown stylesheets.
+
+    Raw XML requests (presets only, given in the query string) are streamed to the backend as they are.
+    """
+    input_data = request.get_json()
+    return {
+        'inputXML': input_data.get('inputXML'),
+        'xslTransformations': [resolve_stylesheet(stylesheet) for stylesheet in input_data.get('stylesheets', [])],
+        'parameters': input_data.get('parameters', {}),
+        'pretty': input_data.get('pretty') is True,
+        'validate': input_data.get('validate') is True
+    }
+
+def endpoint_label():
+    # The route pattern, so job ids don't create one series per job
+    return request.url_rule.rule if request.url_rule else 'unmatched'
+
+def proxy_to_backend(path, payload=None, method='POST', raw=False):
+    """
+    Send a request (with an optional JSON payload) to the backend and stream its response
+    back to the browser chunk by chunk, without buffering it or wrapping it in another JSON document.
+    With raw, the body and query string of the browser's request are streamed to the backend
+    instead, without decoding them.
+    """
+    endpoint = endpoint_label()
+    start = time.perf_counter()
+    if request.content_length:
+        DOCUMENT_BYTES.labels('upload').inc(request.content_length)
+
+    PROXY_IN_FLIGHT.inc()
+    try:
+        if raw:
+            response = backend_session.request(method, f'{BACKEND_URL}{path}', params=request.args, data=request.stream,
+                                               headers={'Content-Type': request.content_type or 'application/xml'},
+                                               stream=True, timeout=BACKEND_TIMEOUT)
+        else:
+            response = backend_session.request(method, f'{BACKEND_URL}{path}', json=payload, stream=True,
+                                               timeout=BACKEND_TIMEOUT)
+    except (requests.Timeout, requests.ConnectionError) as e:
+        PROXY_IN_FLIGHT.dec()
+        PROXY_SECONDS.labels(endpoint).observe(time.perf_counter() - start)
+        if isinstance(e, requests.Timeout):
+            return jsonify({'error': 'The backend did not respond in time.'}), 504
+        return jsonify({'error': f'Backend unavailable: {e}'}), 502
+
+    content_type = response.headers.get('Content-Type', 'application/json')
+    if response.status_code == 200 and not content_type.startswith('application/json'):
+        # Transformation results
+        content_type = 'application/xml; charset=utf-8'
+
+    def relay():
+        for chunk in response.iter_content(chunk_size=STREAM_CHUNK_SIZE):
+            DOCUMENT_BYTES.labels('download').inc(len(chunk))
+            yield chunk
+
+    released = False
+
+    def release():
+        # Hand the connection back to the pool. The WSGI server closes the response even when its
+        # body is never read (HEAD requests, clients that disconnect early), unlike a generator's finally.
+        nonlocal released
+        if released:
+            return
+        released = True
+        response.close()
+        PROXY_IN_FLIGHT.dec()
+        PROXY_SECONDS.labels(endpoint).observe(time.perf_counter() - start)
+
+    # The backend's summary of the structural check of a transformed model, if any
+    headers = {name: response.headers[name] for name in FORWARDED_HEADERS if name in response.headers}
+    proxied = Response(stream_with_context(relay()), status=response.status_code, content_type=content_type,
+                       headers=headers)
+    proxied.call_on_close(release)
+    return proxied
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    IN_FLIGHT.inc()
+
+@app.after_request
+def count_request(response):
+    REQUESTS.labels(endpoint_label(), request.method, str(response.status_code)).inc()
+    return response
+
+@app.teardown_request
+def stop_request_timer(exception=None):
+    # Streamed responses tear the request down again once the stream ends; only count it once
+    start = g.pop('request_start', None)
+    if start is not None:
+        REQUEST_SECONDS.labels(endpoint_label()).observe(time.perf_counter() - start)
+        IN_FLIGHT.dec()
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return generate_latest(), 200, {'Content-Type': CONTENT_TYPE_LATEST}
+
 # Route for the homepage
 @app.route('/')
 def index():
     return render_template('index.html')
 
-# Route to handle file uploads and interact with the backend
+def forward_pipeline_request(path):
+    if not request.is_json:
+        # Raw XML: the backend reads the preset stylesheets and the options from the query string
+        return proxy_to_backend(path, raw=True)
+    try:
+        payload = read_pipeline_request()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    return proxy_to_backend(path, payload)
+
+# Route to transform an XML document with one stylesheet, either as a raw XML body
+# (POST /transform?stylesheet=<preset file name>[&pretty=true]) or as JSON
+# {inputXML, stylesheet: {id} or {content}, pretty} for an uploaded stylesheet
 @app.route('/transform', methods=['POST'])
 def transform():
-    input_xml = request.form['inputXML']
-    xsl_transformation = request.form['xslFile']  # Ensure this contains the actual XSLT content
-    
-    # Send the files to your Node.js backend
-    response = requests.post('http://backend:3000/transform', json={
-        'inputXML': input_xml,
-        'xslTransformation': xsl_transformation
+    if not request.is_json:
+        return proxy_to_backend('/transform', raw=True)
+    input_data = request.get_json()
+    try:
+        xsl_transformation = resolve_stylesheet(input_data.get('stylesheet') or {})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    return proxy_to_backend('/transform', {
+        'inputXML': input_data.get('inputXML'),
+        'xslTransformation': xsl_transformation,
+        'pretty': input_data.get('pretty') is True
     })
 
-    # Return the transformed XML result
-    return jsonify({'output': response.text})  # Return wrapped in a key
+# Route to run a whole chain of XSLT stylesheets in a single (blocking) backend call
+@app.route('/pipeline', methods=['POST'])
+def pipeline():
+    return forward_pipeline_request('/pipeline')
+
+# Routes to run the same chain as a background job: submit it, poll its status,
+# fetch its result and cancel it
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    return forward_pipeline_request('/jobs')
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    return proxy_to_backend(f'/jobs/{job_id}', method='GET')
+
+@app.route('/jobs/<job_id>/result', methods=['GET'])
+def job_result(job_id):
+    return proxy_to_backend(f'/jobs/{job_id}/result', method='GET')
+
+@app.route('/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    return proxy_to_backend(f'/jobs/{job_id}', method='DELETE')
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)
-
@@ -1,6 +1,11 @@
 <?xml version="1.0" encoding="UTF-8"?>
 <xsl:stylesheet version="1.0" xmlns:xsl="http://www.w3.org/1999/XSL/Transform">
   
+  <!-- Indexes used for every id-based lookup, so each lookup is a hash access instead of a document scan -->
+  <xsl:key name="objectById" match="object" use="@id" />
+  <xsl:key name="linksBySource" match="object[mxCell/@source]" use="mxCell/@source" />
+  <xsl:key name="linksByTarget" match="object[mxCell/@target]" use="mxCell/@target" />
+  
   <!-- Identity transformation to copy everything by default -->
   <xsl:template match="@*|node()">
     <xsl:copy>
@@ -35,16 +40,16 @@
     <xsl:param name="objectId" />
     
     <!-- Get the parent boundary ID -->
-    <xsl:variable name="boundaryId" select="../object[@id=$objectId]/mxCell/@parent" />
+    <xsl:variable name="boundaryId" select="key('objectById', $objectId, ..)/mxCell/@parent" />
     
     <!-- Get the 'owns' relationship where the boundary is the target -->
-    <xsl:variable name="ownsId" select="../object[@type='owns' and mxCell/@target=$boundaryId]/@id" />
+    <xsl:variable name="ownsId" select="key('linksByTarget', $boundaryId, ..)[@type='owns']/@id" />
     
     <!-- Get the actor/role/agent that owns the boundary (source of 'owns' relationship) -->
-    <xsl:variable name="actorId" select="../object[@id=../object[@type='owns' and @id=$ownsId]/mxCell/@source]/@id" />
+    <xsl:variable name="actorId" select="key('objectById', key('objectById', $ownsId, ..)[@type='owns']/mxCell/@source, ..)/@id" />
     
     <!-- Check if the actor/role/agent has is_a_cpc='true' -->
-    <xsl:variable name="isCPC" select="../object[@id=$actorId and (@type='actor' or @type='agent' or @type='role') and @is_a_cpc='true']" />
+    <xsl:variable name="isCPC" select="key('objectById', $actorId, ..)[(@type='actor' or @type='agent' or @type='role') and @is_a_cpc='true']" />
     
     <!-- Output true if it matches, otherwise false -->
     <xsl:choose>
@@ -63,11 +68,11 @@
     <xsl:param name="type" />
     
     <!-- Process contributions or qualifications linked to the object -->
-    <xsl:for-each select="//object[@type=$type and (mxCell/@source = $id or mxCell/@target = $id)]">
+    <xsl:for-each select="(key('linksBySource', $id) | key('linksByTarget', $id))[@type=$type]">
       <xsl:variable name="relatedObjectId" select="if (mxCell/@source = $id) then mxCell/@target else mxCell/@source" />
-      <xsl:variable name="relatedObjectLabel" select="//object[@id = $relatedObjectId]/@label" />
+      <xsl:variable name="relatedObjectLabel" select="key('objectById', $relatedObjectId)/@label" />
       <xsl:variable name="relationshipValue" select="@value" />
-      <xsl:variable name="relatedObjectType" select="//object[@id = $relatedObjectId]/@type" />
+      <xsl:variable name="relatedObjectType" select="key('objectById', $relatedObjectId)/@type" />
       
       <!-- Determine if the related object is a softgoal or another type -->
       <xsl:variable name="isSoftgoal" select="$relatedObjectType = 'softgoal'" />
@@ -109,21 +114,23 @@
     <xsl:param name="operatorHeight" />
     
     <!-- Capture the geometry of the source element -->
-    <xsl:variable name="sourceX" select="//object[@id=$sourceId]/mxCell/mxGeometry/@x" />
-    <xsl:variable name="sourceY" select="//object[@id=$sourceId]/mxCell/mxGeometry/@y" />
+    <xsl:variable name="sourceGeometry" select="key('objectById', $sourceId)/mxCell/mxGeometry" />
+    <xsl:variable name="sourceX" select="$sourceGeometry/@x" />
+    <xsl:variable name="sourceY" select="$sourceGeometry/@y" />
     
-    <xsl:variable name="sourceWidth" select="//object[@id=$sourceId]/mxCell/mxGeometry/@width" />
-    <xsl:variable name="sourceHeight" select="//object[@id=$sourceId]/mxCell/mxGeometry/@height" />
+    <xsl:variable name="sourceWidth" select="$sourceGeometry/@width" />
+    <xsl:variable name="sourceHeight" select="$sourceGeometry/@height" />
     
     <xsl:variable name="sourceCenterX" select="$sourceX + ($sourceWidth div 2)" />
     <xsl:variable name="sourceCenterY" select="$sourceY + ($sourceHeight div 2)" />
     
     <!-- Capture the geometry of the target element -->
-    <xsl:variable name="targetX" select="//object[@id=$targetId]/mxCell/mxGeometry/@x" />
-    <xsl:variable name="targetY" select="//object[@id=$targetId]/mxCell/mxGeometry/@y" />
+    <xsl:variable name="targetGeometry" select="key('objectById', $targetId)/mxCell/mxGeometry" />
+    <xsl:variable name="targetX" select="$targetGeometry/@x" />
+    <xsl:variable name="targetY" select="$targetGeometry/@y" />
     
-    <xsl:variable name="targetWidth" select="//object[@id=$targetId]/mxCell/mxGeometry/@width" />
-    <xsl:variable name="targetHeight" select="//object[@id=$targetId]/mxCell/mxGeometry/@height" />
+    <xsl:variable name="targetWidth" select="$targetGeometry/@width" />
+    <xsl:variable name="targetHeight" select="$targetGeometry/@height" />
     
     <xsl:variable name="targetCenterX" select="$targetX + ($targetWidth div 2)" />
     <xsl:variable name="targetCenterY" select="$targetY + ($targetHeight div 2)" />
@@ -145,16 +152,18 @@
     <xsl:param name="scale" />
     
     <!-- Capture and determine geometry of the mobile object -->
-    <xsl:variable name="objectX" select="//object[@id=$objectId]/mxCell/mxGeometry/@x" />
-    <xsl:variable name="objectY" select="//object[@id=$objectId]/mxCell/mxGeometry/@y" />
+    <xsl:variable name="objectGeometry" select="key('objectById', $objectId)/mxCell/mxGeometry" />
+    <xsl:variable name="objectX" select="$objectGeometry/@x" />
+    <xsl:variable name="objectY" select="$objectGeometry/@y" />
     <xsl:variable name="objectCenterX" select="$objectX + ($objectWidth div 2)" />
     <xsl:variable name="objectCenterY" select="$objectY + ($objectHeight div 2)" />
     
     <!-- Capture ande determine geometry of the rectangle -->
-    <xsl:variable name="rectangleX" select="//object[@id=$rectangleId]/mxCell/mxGeometry/@x" />
-    <xsl:variable name="rectangleY" select="//object[@id=$rectangleId]/mxCell/mxGeometry/@y" />
-    <xsl:variable name="rectangleBaseWidth" select="//object[@id=$rectangleId]/mxCell/mxGeometry/@width" />
-    <xsl:variable name="rectangleBaseHeight" select="//object[@id=$rectangleId]/mxCell/mxGeometry/@height" />
+    <xsl:variable name="rectangleGeometry" select="key('objectById', $rectangleId)/mxCell/mxGeometry" />
+    <xsl:variable name="rectangleX" select="$rectangleGeometry/@x" />
+    <xsl:variable name="rectangleY" select="$rectangleGeometry/@y" />
+    <xsl:variable name="rectangleBaseWidth" select="$rectangleGeometry/@width" />
+    <xsl:variable name="rectangleBaseHeight" select="$rectangleGeometry/@height" />
     <xsl:variable name="rectangleCenterX" select="$rectangleX + $rectangleBaseWidth div 2" />
     <xsl:variable name="rectangleCenterY" select="$rectangleY + $rectangleBaseHeight div 2" />
     <xsl:variable name="rectangleWidth" select="$rectangleBaseWidth * $scale" />
@@ -213,16 +222,16 @@
     <xsl:if test="not(./mxCell[@style='group;allowArrows=0;'])">
       
       <!-- Extract the 'owns' relationship element -->
-      <xsl:variable name="owns" select="../object[@type='owns' and mxCell/@source=$agentId]" />
+      <xsl:variable name="owns" select="key('linksBySource', $agentId, ..)[@type='owns']" />
       
       <!-- Extract the target boundary ID from the owns relationship -->
       <xsl:variable name="boundaryId" select="$owns/mxCell/@target" />
       
       <!-- Extract the boundary element based on the boundaryId -->
-      <xsl:variable name="boundary" select="../object[@id=$boundaryId]" />
+      <xsl:variable name="boundary" select="key('objectById', $boundaryId, ..)" />
       
       <!-- Extract the parent of the boundary element -->
-      <xsl:variable name="boundaryParent" select="../object[@id=$boundary/mxCell/@parent]" />
+      <xsl:variable name="boundaryParent" select="key('objectById', $boundary/mxCell/@parent, ..)" />
       
       <object label="{@label}" type="cps_component" id_cim_parent="{$agentId}" id="{$boundaryId}" name="{@label}" description="{@description}">
         <mxCell style="swimlane;whiteSpace=wrap;html=1;" vertex="1" parent="1">
@@ -488,8 +497,8 @@
   <!-- Match any object of type resource, softgoal, goal, or task -->
   <xsl:template match="object[@type=('resource', 'softgoal', 'goal', 'task') and (mxCell/@parent='1')]">
     
-    <xsl:variable name="dependeeId" select="//object[@type='dependency-link' and (mxCell/@source = current()/@id)]/mxCell/@target"/>
-    <xsl:variable name="dependerId" select="//object[@type='dependency-link' and (mxCell/@target = current()/@id)]/mxCell/@source"/>
+    <xsl:variable name="dependeeId" select="key('linksBySource', @id)[@type='dependency-link']/mxCell/@target"/>
+    <xsl:variable name="dependerId" select="key('linksByTarget', @id)[@type='dependency-link']/mxCell/@source"/>
     <xsl:variable name="isDependerCPC">
       <xsl:call-template name="check-cpc-ownership">
         <xsl:with-param name="objectId" select="$dependerId" />
@@ -523,8 +532,9 @@
       
        
       <!-- Determine the required attributes for the dependee and depender -->   
-      <xsl:variable name="dependeeType" select="//object[@id=$dependeeId]/@type"/>
-      <xsl:variable name="dependeeLabel" select="//object[@id=$dependeeId]/@label"/>
+      <xsl:variable name="dependee" select="key('objectById', $dependeeId)"/>
+      <xsl:variable name="dependeeType" select="$dependee/@type"/>
+      <xsl:variable name="dependeeLabel" select="$dependee/@label"/>
       <xsl:variable name="dependeeQualifications">
         <xsl:call-template name="calculate_array">
           <xsl:with-param name="id" select="$dependeeId" />
@@ -539,8 +549,9 @@
       </xsl:variable>
       
       
-      <xsl:variable name="dependerType" select="//object[@id=$dependerId]/@type"/>
-      <xsl:variable name="dependerLabel" select="//object[@id=$dependerId]/@label"/>
+      <xsl:variable name="depender" select="key('objectById', $dependerId)"/>
+      <xsl:variable name="dependerType" select="$depender/@type"/>
+      <xsl:variable name="dependerLabel" select="$depender/@label"/>
       <xsl:variable name="dependerQualifications">
         <xsl:call-template name="calculate_array">
           <xsl:with-param name="id" select="$dependerId" />
@@ -555,13 +566,13 @@
       </xsl:variable>
       
       <!-- Determine the parent boundary's geometry for dependee -->
-      <xsl:variable name="dependeeParent" select="//object[@id=$dependeeId]/mxCell/@parent"/>
-      <xsl:variable name="dependeeBoundary" select="//object[@id=$dependeeParent]/mxCell/@parent"/>
+      <xsl:variable name="dependeeParent" select="$dependee/mxCell/@parent"/>
+      <xsl:variable name="dependeeBoundary" select="key('objectById', $dependeeParent)/mxCell/@parent"/>
       
       
       <!-- Determine the parent boundary's geometry for depender -->
-      <xsl:variable name="dependerParent" select="//object[@id=$dependerId]/mxCell/@parent"/>
-      <xsl:variable name="dependerBoundary" select="//object[@id=$dependerParent]/mxCell/@parent"/>
+      <xsl:variable name="dependerParent" select="$depender/mxCell/@parent"/>
+      <xsl:variable name="dependerBoundary" select="key('objectById', $dependerParent)/mxCell/@parent"/>
       
       <!-- Scale that alters how close are the listener thread and comm thread to the center of the Actor/Role/Agent when generated -->
       <xsl:variable name="scale" select="0.65"/>
@@ -652,7 +663,7 @@
         <object label="" type="comm_relation" id="{$commRelationDependeeId}" id_cim_parent="{@id}">
           <mxCell style="endArrow=classic;html=1;rounded=0;edgeStyle=orthogonalEdgeStyle;
 " 
-                  edge="1" parent="{//object[@id=$dependeeId]/mxCell/@parent}" source="{$dependeeId}" target="{$commThreadId}">
+                  edge="1" parent="{$dependeeParent}" source="{$dependeeId}" target="{$commThreadId}">
             <mxGeometry relative="1" as="geometry">
               <mxPoint x="230" y="580" as="sourcePoint" />
               <mxPoint x="210" y="400" as="targetPoint" />
@@ -682,7 +693,7 @@
         <object label="" type="comm_relation" id="{$commRelationDependerId}" id_cim_parent="{@id}">
           <mxCell style="endArrow=classic;html=1;rounded=0;edgeStyle=orthogonalEdgeStyle;
 " 
-                  edge="1" parent="{//object[@id=$dependerId]/mxCell/@parent}" source="{$listenerThreadId}" target="{$dependerId}">
+                  edge="1" parent="{$dependerParent}" source="{$listenerThreadId}" target="{$dependerId}">
             <mxGeometry relative="1" as="geometry">
               <mxPoint x="230" y="580" as="sourcePoint" />
               <mxPoint x="210" y="400" as="targetPoint" />
@@ -3,18 +3,35 @@
                 xmlns:xsl="http://www.w3.org/1999/XSL/Transform"
                 exclude-result-prefixes="#all">
   
+  <!-- Indexes so each component's members and every id-based lookup are found without rescanning the document -->
+  <xsl:key name="objectsByTypeAndParent" match="object" use="for $parent in mxCell/@parent return concat(@type, '|', $parent)"/>
+  <xsl:key name="objectById" match="object" use="@id"/>
+  <xsl:key name="linksBySource" match="object[mxCell/@source]" use="mxCell/@source"/>
+  <xsl:key name="linksByTarget" match="object[mxCell/@target]" use="mxCell/@target"/>
+  
+  <!-- Target platform and communication technology, supplied by the pipeline caller -->
+  <xsl:param name="platform" select="''"/>
+  <xsl:param name="comm_tech" select="''"/>
+  
   <!-- Root transformation template -->
   <xsl:template match="/">
     <root id="{/mxfile/diagram/@id}" name="{/mxfile/diagram/@name}">
+      <xsl:if test="$platform != ''">
+        <xsl:attribute name="platform" select="$platform"/>
+      </xsl:if>
+      <xsl:if test="$comm_tech != ''">
+        <xsl:attribute name="comm_tech" select="$comm_tech"/>
+      </xsl:if>
       <!-- Group by cps_component using its ID -->
       <xsl:for-each-group select="//object[@type='cps_component']" group-by="@id">
         <cpc id="{@id}" 
              name="{@name}" 
              description="{@description}" 
              id_cim_parent="{@id_cim_parent}">
+          <xsl:variable name="cpcId" select="current-grouping-key()"/>
           
           <!-- Extract all sw_resources related to this cps_component using mxCell/parent -->
-          <xsl:for-each select="//object[@type='sw_resource'][mxCell/@parent = current-grouping-key()]">
+          <xsl:for-each select="key('objectsByTypeAndParent', concat('sw_resource|', $cpcId))">
             <sw_resource id="{@id}" 
                          name="{@name}" 
                          id_cim_parent="{@id_cim_parent}"
@@ -22,7 +39,7 @@
           </xsl:for-each>
           
           <!-- Extract all hw_resources related to this cps_component using mxCell/parent -->
-          <xsl:for-each select="//object[@type='hw_resource'][mxCell/@parent = current-grouping-key()]">
+          <xsl:for-each select="key('objectsByTypeAndParent', concat('hw_resource|', $cpcId))">
             <hw_resource id="{@id}" 
                          name="{@name}" 
                          id_cim_parent="{@id_cim_parent}"
@@ -30,7 +47,7 @@
           </xsl:for-each>
           
           <!-- Extract all actions related to this cps_component using mxCell/parent -->
-          <xsl:for-each select="//object[@type='action'][mxCell/@parent = current-grouping-key()]">
+          <xsl:for-each select="key('objectsByTypeAndParent', concat('action|', $cpcId))">
             <function id="{@id}" 
                       name="{@name}"
                       id_cim_parent="{@id_cim_parent}" 
@@ -46,7 +63,7 @@
           </xsl:for-each>
           
           <!-- Extract all operational_goals related to this cps_component using mxCell/parent -->
-          <xsl:for-each select="//object[@type='operational_goal'][mxCell/@parent = current-grouping-key()]">
+          <xsl:for-each select="key('objectsByTypeAndParent', concat('operational_goal|', $cpcId))">
             <thread id="{@id}" 
                     name="{@name}"
                     id_cim_parent="{@id_cim_parent}" 
@@ -59,15 +76,15 @@
           </xsl:for-each>
           
           <!-- Extract all relation_from_to related to this cps_component using mxCell/parent -->
-          <xsl:for-each select="//object[@type='relation_from_to'][mxCell/@parent = current-grouping-key()]">
+          <xsl:for-each select="key('objectsByTypeAndParent', concat('relation_from_to|', $cpcId))">
             <xsl:variable name="sourceElement" select="mxCell/@source"/>
             <xsl:variable name="targetElement" select="mxCell/@target"/>
             
             <!-- Check if the target is connected to an 'and_ref_operator' -->
             <xsl:variable name="andRefOperatorTarget" 
-              select="//object[@type='and_ref_operator'][@id = $targetElement]"/>
+              select="key('objectById', $targetElement)[@type='and_ref_operator']"/>
             <xsl:variable name="andRefOperatorSource" 
-              select="//object[@type='and_ref_operator'][@id = $sourceElement]"/>
+              select="key('objectById', $sourceElement)[@type='and_ref_operator']"/>
             
             <xsl:choose>
               <!-- If connected to an and_ref_operator (via target), handle the relation accordingly -->
@@ -77,7 +94,7 @@
                 <!-- If the target is connected to an and_ref_operator -->
                 <xsl:if test="$andRefOperatorTarget and not($andRefOperatorSource)">
                   <xsl:variable name="targetRelation" 
-                    select="//object[@type='relation_from_to'][mxCell/@source = $andRefOperatorTarget/@id]"/>
+                    select="key('linksBySource', $andRefOperatorTarget/@id)[@type='relation_from_to']"/>
                   <relation id="{@id}" 
                             id_cim_parent="{@id_cim_parent}"
                             source="{$sourceElement}"
@@ -98,10 +115,10 @@
           </xsl:for-each>
           
           <!-- Corrected Code -->
-          <xsl:for-each select="//object[@type='comm_thread'][mxCell/@parent = current-grouping-key()]">
+          <xsl:for-each select="key('objectsByTypeAndParent', concat('comm_thread|', $cpcId))">
             <xsl:variable name="commThreadId" select="@id"/>
-            <xsl:variable name="commRelation" select="//object[@type='comm_relation'][mxCell/@source=$commThreadId]"/>
-            <xsl:variable name="listenerThread" select="//object[@type='listener_thread'][@id=$commRelation/mxCell/@target]"/>
+            <xsl:variable name="commRelation" select="key('linksBySource', $commThreadId)[@type='comm_relation']"/>
+            <xsl:variable name="listenerThread" select="key('objectById', $commRelation/mxCell/@target)[@type='listener_thread']"/>
             <commThread id="{@id}"
                         name="{@name}"
                         id_cim_parent="{@id_cim_parent}"
@@ -119,14 +136,14 @@
                         listener_threadId="{$listenerThread/@id}"/>
           </xsl:for-each>
           
-          <xsl:for-each select="//object[@type='listener_thread'][mxCell/@parent = current-grouping-key()]">
+          <xsl:for-each select="key('objectsByTypeAndParent', concat('listener_thread|', $cpcId))">
             <!-- Corrected variable definitions -->
             <xsl:variable name="listenerId" select="@id"/>
             
-            <xsl:variable name="commRelation" select="//object[@type='comm_relation'][mxCell/@target=$listenerId]"/>
-            <xsl:variable name="commThread" select="//object[@type='comm_thread'][@id=$commRelation/mxCell/@source]"/>
+            <xsl:variable name="commRelation" select="key('linksByTarget', $listenerId)[@type='comm_relation']"/>
+            <xsl:variable name="commThread" select="key('objectById', $commRelation/mxCell/@source)[@type='comm_thread']"/>
             <xsl:variable name="commThreadParent" select="$commThread/mxCell/@parent"/>
-            <xsl:variable name="commThreadParent" select="//object[@type='cps_component'][@id=$commThreadParent]"/>
+            <xsl:variable name="commThreadParent" select="key('objectById', $commThreadParent)[@type='cps_component']"/>
             
             <listenerThread id="{@id}"
                             name="{@name}"
@@ -146,7 +163,7 @@
                             comm_threadCPCId="{$commThreadParent/@id}"/>
           </xsl:for-each>
           
-          <xsl:for-each select="//object[@type='comm_relation'][mxCell/@parent = current-grouping-key()]">
+          <xsl:for-each select="key('objectsByTypeAndParent', concat('comm_relation|', $cpcId))">
             <commRelation id="{@id}"
                           id_cim_parent="{@id_cim_parent}"
                           source="{mxCell/@source}"
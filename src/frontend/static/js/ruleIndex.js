@@ -0,0 +1,186 @@
+// Rule compiler for the questionnaire rules ("modifications" in CIM-PIM-Rules.json and PIM-PSM-Rules.json).
+//
+// Every rule selects the elements it asks about with an XPath such as
+//     //object[@type='goal' and not(mxCell/@parent='1')]
+// Rules of the form //name[predicate] are compiled into JavaScript tests, and all of them
+// are run while walking the elements of the model once. Any other XPath falls back to a
+// single document.evaluate. The result is an index that the questionnaire form and the
+// modification pass share, so the model is never queried again.
+
+// Tokens of a predicate: strings, names, operators and brackets
+const PREDICATE_TOKEN = /\s*('[^']*'|"[^"]*"|!=|[()=\/@]|[A-Za-z_][\w.\-]*)/y;
+
+// Compile an XPath predicate (what is inside //name[...]) into a test on an element.
+// Supports @attribute and child/@attribute paths, = and !=, and, or, not() and parentheses;
+// returns null for anything else.
+function compilePredicate(predicate) {
+    const tokens = [];
+    PREDICATE_TOKEN.lastIndex = 0;
+    while (PREDICATE_TOKEN.lastIndex < predicate.length) {
+        const start = PREDICATE_TOKEN.lastIndex;
+        const match = PREDICATE_TOKEN.exec(predicate);
+        if (!match) {
+            if (predicate.slice(start).trim() === '') break;
+            return null;
+        }
+        tokens.push(match[1]);
+    }
+
+    let position = 0;
+    const peek = () => tokens[position];
+    const next = () => tokens[position++];
+    const expect = token => {
+        if (next() !== token) throw new Error(`Expected ${token}`);
+    };
+
+    function parseOr() {
+        let test = parseAnd();
+        while (peek() === 'or') {
+            next();
+            const left = test, right = parseAnd();
+            test = node => left(node) || right(node);
+        }
+        return test;
+    }
+
+    function parseAnd() {
+        let test = parseUnary();
+        while (peek() === 'and') {
+            next();
+            const left = test, right = parseUnary();
+            test = node => left(node) && right(node);
+        }
+        return test;
+    }
+
+    function parseUnary() {
+        if (peek() === 'not' && tokens[position + 1] === '(') {
+            next();
+            next();
+            const inner = parseOr();
+            expect(')');
+            return node => !inner(node);
+        }
+        if (peek() === '(') {
+            next();
+            const inner = parseOr();
+            expect(')');
+            return inner;
+        }
+        return parseComparison();
+    }
+
+    // path [= literal | != literal], compared like XPath: true if any selected value matches
+    function parseComparison() {
+        const steps = [];
+        let attribute = null;
+        if (peek() === '@') {
+            next();
+            attribute = next();
+        } else {
+            steps.push(next());
+            while (peek() === '/') {
+                next();
+                if (peek() === '@') {
+                    next();
+                    attribute = next();
+                    break;
+                }
+                steps.push(next());
+            }
+        }
+        [attribute, ...steps].forEach(name => {
+            if (name !== null && !/^[A-Za-z_][\w.\-]*$/.test(name || '')) throw new Error('Expected a name');
+        });
+
+        let operator = null, literal = null;
+        if (peek() === '=' || peek() === '!=') {
+            operator = next();
+            literal = next() || '';
+            if (!/^('.*'|".*")$/.test(literal)) throw new Error('Expected a string');
+            literal = literal.slice(1, -1);
+        }
+
+        const accepts = selected => {
+            if (attribute === null) return true;
+            const value = selected.getAttribute(attribute);
+            if (value === null) return false;
+            if (operator === '=') return value === literal;
+            if (operator === '!=') return value !== literal;
+            return true;
+        };
+        // Depth-first over the child steps, stopping at the first element that satisfies the comparison
+        const select = (node, depth) => {
+            if (depth === steps.length) return accepts(node);
+            for (let child = node.firstElementChild; child; child = child.nextElementSibling) {
+                if (child.nodeName === steps[depth] && select(child, depth + 1)) return true;
+            }
+            return false;
+        };
+        return node => select(node, 0);
+    }
+
+    try {
+        const test = parseOr();
+        return position === tokens.length ? test : null;
+    } catch (error) {
+        return null;
+    }
+}
+
+// Match every rule against a parsed model in one walk over its elements.
+//
+// Returns the index:
+//   matches         the elements of each rule, in document order (as the XPath would return them)
+//   rulesByElement  element -> [{ modIndex, elemIndex }] of the rules that select it, in rule order
+//   objectsById     id -> first <object> with that id
+//   ownerByBoundary boundary id -> source id of the "owns" edge pointing to it
+function compileRules(xmlDoc, modifications) {
+    const index = {
+        xmlDoc,
+        matches: modifications.map(() => []),
+        rulesByElement: new Map(),
+        objectsById: new Map(),
+        ownerByBoundary: new Map()
+    };
+
+    const compiled = [];
+    const fallback = [];
+    modifications.forEach((modification, modIndex) => {
+        const match = /^\s*\/\/([A-Za-z_][\w.\-]*)\s*\[([\s\S]*)\]\s*$/.exec(modification.xpath || '');
+        const test = match ? compilePredicate(match[2]) : null;
+        if (test) {
+            compiled.push({ modIndex, nodeName: match[1], test });
+        } else {
+            fallback.push(modIndex);
+        }
+    });
+
+    const elements = xmlDoc.getElementsByTagName('*');
+    for (let i = 0; i < elements.length; i++) {
+        const node = elements[i];
+        if (node.nodeName === 'object') {
+            const id = node.getAttribute('id');
+            if (id !== null && !index.objectsById.has(id)) index.objectsById.set(id, node);
+            if (node.getAttribute('type') === 'owns') {
+                const cell = Array.from(node.children).find(child => child.nodeName === 'mxCell');
+                // The last "owns" edge of a boundary wins, as it did with the former lookup
+                if (cell && cell.hasAttribute('target')) index.ownerByBoundary.set(cell.getAttribute('target'), cell.getAttribute('source'));
+            }
+        }
+        for (const rule of compiled) {
+            if (node.nodeName === rule.nodeName && rule.test(node)) index.matches[rule.modIndex].push(node);
+        }
+    }
+    fallback.forEach(modIndex => {
+        index.matches[modIndex] = evaluateXPath(xmlDoc, modifications[modIndex].xpath);
+    });
+
+    index.matches.forEach((nodes, modIndex) => {
+        nodes.forEach((node, elemIndex) => {
+            if (!index.rulesByElement.has(node)) index.rulesByElement.set(node, []);
+            index.rulesByElement.get(node).push({ modIndex, elemIndex });
+        });
+    });
+    return index;
+}
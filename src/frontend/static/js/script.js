@@ -21,6 +21,12 @@ const PRESET_FILES = {
 };
 
 let currentPreset = "cim-pim"; // Default preset
+let currentJobId = null; // Transformation job currently running on the server
+let transformationCount = 0; // Clicks on Transform so far; each run keeps its own number to tell if it was superseded
+let questionnaireIndex = null; // Rules matched against the model shown in the questionnaire (see ruleIndex.js)
+let questionnaireAnswers = {}; // Answers of the questionnaire by field name; unanswered fields keep their default
+const QUESTIONNAIRE_PAGE_SIZE = 20; // Elements shown per page of the questionnaire
+const JOB_POLL_INTERVAL_MS = 1000;
 
 // Function to read the uploaded XML file and display its content in the textarea
 function handleXMLUpload(inputElement) {
@@ -103,62 +109,154 @@ document.getElementById('jsonFileInput').addEventListener('change', function ()
 document.getElementById('transformBtn').addEventListener('click', function () {
     const inputXML = document.getElementById('inputXML').value;
 
-    // Function to recursively process each XSLT file in sequence
-    function processTransformation(xml, xsltIndex) {
-        if (xsltIndex >= xsltFiles.length) {
-            // Check if the "pim-psm" mode is selected
-            const isPimPsmSelected = document.getElementById('pimPSMPreset').checked;
-
-            if (isPimPsmSelected) {
-                // Get the selected values for platform and comm_tech
-                const platform = document.getElementById('platforms').value;
-                const commTech = document.getElementById('commTechs').value;
-
-                // Parse the XML and add the new attributes to the <root> element
-                const parser = new DOMParser();
-                const xmlDoc = parser.parseFromString(xml, 'application/xml');
-                const rootElement = xmlDoc.documentElement;
-
-                // Add the 'platform' and 'comm_tech' attributes
-                rootElement.setAttribute('platform', platform);
-                rootElement.setAttribute('comm_tech', commTech);
-
-                // Serialize the modified XML back to a string
-                const serializer = new XMLSerializer();
-                xml = serializer.serializeToString(xmlDoc);
-            }
+    // Run the whole chain of XSLT files as a server-side background job
+    function processTransformation(xml) {
+        const parameters = {};
+
+        // Check if the "pim-psm" mode is selected
+        const isPimPsmSelected = document.getElementById('pimPSMPreset').checked;
 
-            // All transformations are done, display the final output
-            document.getElementById('outputXML').value = xml;
-            return;
+        if (isPimPsmSelected) {
+            // The 'platform' and 'comm_tech' root attributes are set by the stylesheet
+            parameters.platform = document.getElementById('platforms').value;
+            parameters.comm_tech = document.getElementById('commTechs').value;
+        }
+
+        let request;
+        if (xsltFiles.every(file => file.preset)) {
+            // Presets only: send the XML as the raw body and reference the stylesheets by name
+            // The result is shown to the user, so ask the server to indent it
+            const query = new URLSearchParams({ pretty: 'true' });
+            xsltFiles.forEach(file => query.append('stylesheet', file.name));
+            Object.entries(parameters).forEach(([name, value]) => query.append(name, value));
+
+            request = fetch(`/jobs?${query}`, {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/xml' },
+                body: xml
+            });
+        } else {
+            // Uploaded stylesheets are sent inline, presets by name
+            const stylesheets = xsltFiles.map(file => file.preset ? { id: file.name } : { content: file.content });
+
+            request = fetch('/jobs', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({
+                    inputXML: xml,
+                    stylesheets: stylesheets,
+                    parameters: parameters,
+                    pretty: true
+                })
+            });
         }
 
-        const xsltFileContent = xsltFiles[xsltIndex].content;
+        const outputArea = document.getElementById('outputXML');
+        let finishedJob = null;
 
-        fetch('/transform', {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/x-www-form-urlencoded' },
-            body: new URLSearchParams({
-                'inputXML': xml,
-                'xslFile': xsltFileContent
-            })
-        })
+        request
+            .then(checkResponse)
             .then(response => response.json())
-            .then(data => {
-                // Pass the transformed result to the next XSLT transformation
-                processTransformation(data.output, xsltIndex + 1);
+            .then(job => {
+                if (run !== transformationCount) {
+                    // Clicked again while this job was being created: drop it
+                    fetch(`/jobs/${job.id}`, { method: 'DELETE' });
+                    throw new Error('cancelled');
+                }
+                currentJobId = job.id;
+                return waitForJob(job.id, status => {
+                    outputArea.value = `Transformation ${status.status}` +
+                        (status.progress ? ` (${status.progress})` : '') + '...';
+                });
             })
-            .catch(error => console.error('Error:', error));
+            .then(job => {
+                finishedJob = job;
+                return fetch(`/jobs/${job.id}/result`);
+            })
+            .then(checkResponse)
+            // The transformed XML is streamed back as is
+            .then(response => response.text())
+            .then(output => {
+                if (run !== transformationCount) {
+                    throw new Error('cancelled');
+                }
+                // All transformations are done, display the final output
+                outputArea.value = output;
+                reportStructuralCheck(finishedJob.structure);
+            })
+            .catch(error => {
+                if (error.message !== 'cancelled') {
+                    console.error('Error:', error);
+                    outputArea.value = `Error: ${error.message}`;
+                }
+            });
+    }
+
+    // A new transformation replaces the one still running, if any. A job still being
+    // created is deleted by its own run once its id is known
+    const run = ++transformationCount;
+    if (currentJobId) {
+        fetch(`/jobs/${currentJobId}`, { method: 'DELETE' });
+        currentJobId = null;
     }
 
     if (xsltFiles.length > 0) {
-        // Start the transformation chain with the first XSLT file
-        processTransformation(inputXML, 0);
+        // Start the transformation chain
+        processTransformation(inputXML);
     } else {
         alert('Please upload at least one XSLT file.');
     }
 });
 
+// Warn about a transformed PIM or PSM that breaks the structural rules of the PIM DSL
+function reportStructuralCheck(structure) {
+    if (!structure || structure.conforms) {
+        return;
+    }
+    const messages = structure.violations.map(violation => `- ${violation.message}`);
+    alert(`The ${structure.format.toUpperCase()} breaks ${messages.length} structural rule(s):\n${messages.join('\n')}`);
+}
+
+// Throw the server's error message for non-2xx responses
+function checkResponse(response) {
+    if (!response.ok) {
+        return response.json()
+            .catch(() => ({ error: response.statusText }))
+            .then(data => { throw new Error(data.error); });
+    }
+    return response;
+}
+
+// Poll a transformation job until it finishes, reporting each status on the way
+function waitForJob(jobId, onStatus) {
+    return new Promise((resolve, reject) => {
+        function poll() {
+            fetch(`/jobs/${jobId}`)
+                .then(checkResponse)
+                .then(response => response.json())
+                .then(job => {
+                    if (jobId !== currentJobId) {
+                        // Replaced by a newer transformation
+                        reject(new Error('cancelled'));
+                        return;
+                    }
+                    onStatus(job);
+                    if (job.status === 'done') {
+                        currentJobId = null;
+                        resolve(job);
+                    } else if (job.status === 'failed' || job.status === 'cancelled') {
+                        currentJobId = null;
+                        reject(new Error(job.error || `Transformation ${job.status}`));
+                    } else {
+                        setTimeout(poll, JOB_POLL_INTERVAL_MS);
+                    }
+                })
+                .catch(reject);
+        }
+        poll();
+    });
+}
+
 // Download output XML functionality
 document.getElementById('downloadBtn').addEventListener('click', function () {
     const outputXML = document.getElementById('outputXML').value;
@@ -213,14 +311,19 @@ function applyModifications(inputXML, modificationRules, formData) {
         return inputXML; // Return unmodified XML if no rules are provided
     }
 
-    const parser = new DOMParser();
-    const xmlDoc = parser.parseFromString(inputXML, "text/xml");
-
-    modificationRules.forEach((rule, modIndex) => {
-        const xpathResult = evaluateXPath(xmlDoc, rule.xpath);
+    // Reuse the index of the questionnaire when it was built from this model and these rules
+    const rulesKey = JSON.stringify(modificationRules);
+    let index = questionnaireIndex;
+    if (!index || index.inputXML !== inputXML || index.rulesKey !== rulesKey) {
+        const parser = new DOMParser();
+        index = compileRules(parser.parseFromString(inputXML, "text/xml"), modificationRules);
+    }
+    questionnaireIndex = null; // The indexed model is modified below
 
-        xpathResult.forEach((node, elemIndex) => {
-            rule.attributes.forEach(attribute => {
+    // Each element gets the answers of every rule that selects it, in rule order
+    index.rulesByElement.forEach((entries, node) => {
+        entries.forEach(({ modIndex, elemIndex }) => {
+            modificationRules[modIndex].attributes.forEach(attribute => {
                 const baseFieldName = `modification_${modIndex}_element_${elemIndex}_${attribute.name}`;
 
                 // Recursive function to handle nested attributes
@@ -274,25 +377,72 @@ function applyModifications(inputXML, modificationRules, formData) {
 
     // Serialize the modified XML back to a string and return it
     const serializer = new XMLSerializer();
-    return serializer.serializeToString(xmlDoc);
+    return serializer.serializeToString(index.xmlDoc);
+}
+
+// Attributes of a rule that are asked for an element: those without a conditional, or whose conditional the element meets
+function applicableAttributes(modification, node) {
+    return modification.attributes.filter(attribute => {
+        if (!attribute.conditional) return true;
+        const conditionalAttribute = Object.keys(attribute.conditional)[0];
+        return (node.getAttribute(conditionalAttribute) || '') === attribute.conditional[conditionalAttribute];
+    });
 }
 
-// Updated populateQuestionnaireForm to include each matched element in the questionnaire
+// Value of a field before it is answered, as its input shows it
+function defaultAnswer(attribute, node) {
+    if (attribute.options) return attribute.options[0];
+    if (attribute.parametersTable) {
+        if (!attribute.derivate_from) return [];
+        // Rows derived from the element, keyed by the lowercase headers like the rows added in the form
+        const dropdowns = attribute.parametersTable.dropdown_box_values || {};
+        const derivedData = JSON.parse(node.getAttribute(attribute.derivate_from) || '[]') || [];
+        return derivedData.map(rowData => {
+            const row = {};
+            attribute.parametersTable.headers.forEach(header => {
+                const value = rowData[header] || '';
+                // A dropdown shows no value when the derived one is not among its options
+                row[header.toLowerCase()] = dropdowns[header] && !dropdowns[header].includes(value) ? '' : value;
+            });
+            return row;
+        });
+    }
+    if (attribute.number) return '200';
+    return '';
+}
+
+// Answer of a field, starting from its default the first time it is asked for
+function questionnaireAnswer(name, attribute, node) {
+    if (!(name in questionnaireAnswers)) {
+        questionnaireAnswers[name] = defaultAnswer(attribute, node);
+    }
+    return questionnaireAnswers[name];
+}
+
+// Updated populateQuestionnaireForm to include each matched element in the questionnaire, one page at a time
 function populateQuestionnaireForm(modifications) {
     const form = document.getElementById('questionnaireForm');
-    form.innerHTML = ''; // Clear the form first
     form.classList.add('modal-form'); // Add modal class to the form
 
+    // Match all rules against the model once; the pages and the submission reuse the same index
+    const inputXML = document.getElementById('inputXML').value;
     const parser = new DOMParser();
-    const xmlDoc = parser.parseFromString(document.getElementById('inputXML').value, 'text/xml');
+    const index = compileRules(parser.parseFromString(inputXML, 'text/xml'), modifications);
+    index.inputXML = inputXML;
+    index.rulesKey = JSON.stringify(modifications);
+    index.modifications = modifications;
+    questionnaireIndex = index;
+    questionnaireAnswers = {};
 
     // Helper function to extract data from an XML node
     function getNodeAttribute(node, attribute) {
         return node.getAttribute(attribute) || '';
     }
 
-    // Recursive function to process attributes
+    // Recursive function to process attributes; every input reads and writes its answer in questionnaireAnswers
     function createAttributeInputs(attribute, modIndex, elemIndex, baseName, node) {
+        const name = `${baseName}_${attribute.name}`;
+        const answer = questionnaireAnswer(name, attribute, node);
         const container = document.createElement('div'); // Container for this attribute's inputs
         container.classList.add('attribute-container');
 
@@ -341,7 +491,6 @@ function populateQuestionnaireForm(modifications) {
             // Table with headers based on parametersTable.headers
             const table = document.createElement('table');
             table.classList.add('modal-parameters-table');
-            table.id = `${baseName}_${attribute.name}`;
 
             // Header row
             const tableHeaders = document.createElement('tr');
@@ -356,33 +505,41 @@ function populateQuestionnaireForm(modifications) {
             tableHeaders.appendChild(removeHeader);
             table.appendChild(tableHeaders);
 
-            // Pre-fill table rows if `derivate_from` exists
-            const derivedData = attribute.derivate_from ? JSON.parse(getNodeAttribute(node, attribute.derivate_from)) || [] : [];
-            derivedData.forEach(rowData => {
+            // Row bound to one entry of the table's answer
+            const appendRow = rowData => {
                 const row = document.createElement('tr');
-                attribute.parametersTable.headers.forEach((header, index) => {
+                attribute.parametersTable.headers.forEach(header => {
+                    const key = header.toLowerCase();
                     const cell = document.createElement('td');
                     cell.classList.add('modal-parameters-table-cell');
-                    const cellInput = document.createElement('input');
-                    cellInput.type = 'text';
-                    cellInput.classList.add('modal-parameters-table-input');
-                    cellInput.value = rowData[header] || '';
-                    if (attribute.parametersTable.dropdown_box_values && attribute.parametersTable.dropdown_box_values[header]) {
-                        // Convert input to dropdown if dropdown values exist for this header
-                        const dropdown = document.createElement('select');
-                        dropdown.classList.add('modal-parameters-table-select');
+
+                    let cellInput;
+                    if (attribute.parametersTable.sequence_values && Object.keys(attribute.parametersTable.sequence_values).includes(key)) {
+                        // Sequence value logic
+                        cellInput = document.createElement('input');
+                        cellInput.type = 'number';
+                        cellInput.classList.add('modal-parameters-table-input');
+                        cellInput.onkeydown = allowOnlyNumbers;
+                    } else if (attribute.parametersTable.dropdown_box_values && attribute.parametersTable.dropdown_box_values[header]) {
+                        // Dropdown box logic
+                        cellInput = document.createElement('select');
+                        cellInput.classList.add('modal-parameters-table-select');
                         attribute.parametersTable.dropdown_box_values[header].forEach(option => {
                             const optionElement = document.createElement('option');
                             optionElement.value = option;
                             optionElement.textContent = option;
-                            dropdown.appendChild(optionElement);
+                            cellInput.appendChild(optionElement);
                         });
-                        dropdown.value = rowData[header] || '';
-                        cellInput.replaceWith(dropdown);
-                        cell.appendChild(dropdown);
                     } else {
-                        cell.appendChild(cellInput);
+                        // Default to a text input for other cases
+                        cellInput = document.createElement('input');
+                        cellInput.type = 'text';
+                        cellInput.classList.add('modal-parameters-table-input');
                     }
+                    cellInput.value = rowData[key] || '';
+                    cellInput.addEventListener('input', () => { rowData[key] = cellInput.value; });
+
+                    cell.appendChild(cellInput);
                     row.appendChild(cell);
                 });
 
@@ -393,12 +550,18 @@ function populateQuestionnaireForm(modifications) {
                 removeButton.type = 'button';
                 removeButton.textContent = 'X';
                 removeButton.classList.add('modal-remove-row-button');
-                removeButton.onclick = () => row.remove(); // Removes the row when clicked
+                removeButton.onclick = () => { // Removes the row when clicked
+                    answer.splice(answer.indexOf(rowData), 1);
+                    row.remove();
+                };
                 removeCell.appendChild(removeButton);
                 row.appendChild(removeCell);
 
                 table.appendChild(row);
-            });
+            };
+
+            // Rows answered so far, pre-filled from `derivate_from` if it exists
+            answer.forEach(appendRow);
 
             // Add the "Add Parameter" button to all tables
             const addRowButton = document.createElement('button');
@@ -406,56 +569,20 @@ function populateQuestionnaireForm(modifications) {
             addRowButton.textContent = "Add Parameter";
             addRowButton.classList.add('modal-add-row-button');
             addRowButton.onclick = () => {
-                const row = document.createElement('tr');
+                const rowData = {};
                 attribute.parametersTable.headers.forEach(header => {
-                    const cell = document.createElement('td');
-                    cell.classList.add('modal-parameters-table-cell');
-
-                    if (attribute.parametersTable.sequence_values && Object.keys(attribute.parametersTable.sequence_values).includes(header.toLowerCase())) {
-                        // Sequence value logic
+                    const key = header.toLowerCase();
+                    if (attribute.parametersTable.sequence_values && Object.keys(attribute.parametersTable.sequence_values).includes(key)) {
                         const column = Object.keys(attribute.parametersTable.sequence_values)[0];
-                        let value = attribute.parametersTable.sequence_values[column]++;
-                        const sequenceInput = document.createElement('input');
-                        sequenceInput.type = 'number';
-                        sequenceInput.value = value;
-                        sequenceInput.classList.add('modal-parameters-table-input');
-                        sequenceInput.onkeydown = allowOnlyNumbers;
-
-                        cell.appendChild(sequenceInput);
+                        rowData[key] = String(attribute.parametersTable.sequence_values[column]++);
                     } else if (attribute.parametersTable.dropdown_box_values && attribute.parametersTable.dropdown_box_values[header]) {
-                        // Dropdown box logic
-                        const dropdown = document.createElement('select');
-                        dropdown.classList.add('modal-parameters-table-select');
-                        attribute.parametersTable.dropdown_box_values[header].forEach(option => {
-                            const optionElement = document.createElement('option');
-                            optionElement.value = option;
-                            optionElement.textContent = option;
-                            dropdown.appendChild(optionElement);
-                        });
-                        cell.appendChild(dropdown);
+                        rowData[key] = attribute.parametersTable.dropdown_box_values[header][0];
                     } else {
-                        // Default to a text input for other cases
-                        const cellInput = document.createElement('input');
-                        cellInput.type = 'text';
-                        cellInput.classList.add('modal-parameters-table-input');
-                        cell.appendChild(cellInput);
+                        rowData[key] = '';
                     }
-
-                    row.appendChild(cell);
                 });
-
-                // Add remove button cell
-                const removeCell = document.createElement('td');
-                removeCell.classList.add('modal-parameters-table-cell');
-                const removeButton = document.createElement('button');
-                removeButton.type = 'button';
-                removeButton.textContent = 'X';
-                removeButton.classList.add('modal-remove-row-button');
-                removeButton.onclick = () => row.remove(); // Removes the row when clicked
-                removeCell.appendChild(removeButton);
-                row.appendChild(removeCell);
-
-                table.appendChild(row);
+                answer.push(rowData);
+                appendRow(rowData);
             };
 
             tableContainer.appendChild(table);
@@ -471,7 +598,6 @@ function populateQuestionnaireForm(modifications) {
             input = document.createElement('input');
             input.type = 'number';
             input.min = '0';
-            input.value = '200';
             input.step = '10';
             input.onkeydown = allowOnlyNumbers;
             input.classList.add('modal-number-input');
@@ -482,32 +608,38 @@ function populateQuestionnaireForm(modifications) {
             input.classList.add('modal-text-input');
         }
 
+        if (!attribute.parametersTable) {
+            input.value = answer;
+            input.addEventListener('input', () => { questionnaireAnswers[name] = input.value; });
+        }
+
         // Assign unique name for form data identification
-        input.name = `${baseName}_${attribute.name}`;
+        input.name = name;
         container.appendChild(questionLabel);
         container.appendChild(input);
 
         // Handle recursive `additionalAttribute`
         if (attribute.additionalAttribute) {
-            const toggleAdditionalInputs = () => {
-                const isVisible = input.value === attribute.additionalAttribute.conditional;
-                nestedInputsContainer.style.display = isVisible ? 'block' : 'none';
-            };
-
-            // Create nested container for additional attributes
+            // Create nested container for additional attributes, built the first time it is shown
             const nestedInputsContainer = document.createElement('div');
             nestedInputsContainer.classList.add('nested-attribute-container');
             nestedInputsContainer.style.display = 'none'; // Initially hidden
-            const nestedInputs = createAttributeInputs(
-                attribute.additionalAttribute.attribute,
-                modIndex,
-                elemIndex,
-                `${baseName}_${attribute.name}`,
-                node
-            );
-            nestedInputsContainer.appendChild(nestedInputs);
             container.appendChild(nestedInputsContainer);
 
+            const toggleAdditionalInputs = () => {
+                const isVisible = input.value === attribute.additionalAttribute.conditional;
+                if (isVisible && !nestedInputsContainer.hasChildNodes()) {
+                    nestedInputsContainer.appendChild(createAttributeInputs(
+                        attribute.additionalAttribute.attribute,
+                        modIndex,
+                        elemIndex,
+                        name,
+                        node
+                    ));
+                }
+                nestedInputsContainer.style.display = isVisible ? 'block' : 'none';
+            };
+
             // Add event listener for toggle logic
             input.addEventListener('change', toggleAdditionalInputs);
 
@@ -517,202 +649,186 @@ function populateQuestionnaireForm(modifications) {
         return container;
     }
 
-    // Process modifications and generate form
-    modifications.forEach((modification, modIndex) => {
-        const elements = evaluateXPath(xmlDoc, modification.xpath);
+    // Fieldset with the questions of a rule about one element
+    function createElementFieldset(modIndex, elemIndex) {
+        const node = index.matches[modIndex][elemIndex];
+        if (debug) {
+            console.log("----------------------------------------------");
+            console.log("Node: " + getNodeAttribute(node, "label"));
+        }
 
-        elements.forEach((node, elemIndex) => {
-            if (debug) {
-                console.log("----------------------------------------------");
-                console.log("Node: " + getNodeAttribute(node, "label"));
-            }
+        // Get 'label' and 'type' attributes for descriptive legends
+        const type = node.getAttribute('type') || 'Unknown Type';
+        const label = node.getAttribute('label') || `Element ${elemIndex + 1}`;
 
-            // Get 'label' and 'type' attributes for descriptive legends
-            const type = node.getAttribute('type') || 'Unknown Type';
-            const label = node.getAttribute('label') || `Element ${elemIndex + 1}`;
-            if (debug) {
-                console.log("Current Node: " + label)
-            }
+        // Retrieve parent information
+        const mxCell = node.querySelector('mxCell');
+        const parentId = mxCell ? mxCell.getAttribute('parent') : null;
+        if (debug) {
+            console.log("ParentNodeID: " + parentId)
+        }
+        let parentLabel = '';
 
-            // Retrieve parent information
-            const mxCell = node.querySelector('mxCell');
-            const parentId = mxCell ? mxCell.getAttribute('parent') : null;
-            if (debug) {
-                console.log("ParentNodeID: " + parentId)
+        if (parentId && parentId !== "1") {
+            // Find the initial parent node
+            let currentParentNode = index.objectsById.get(parentId) || null;
+            if (debug && currentParentNode) {
+                console.log("ParentNode: " + currentParentNode.getAttribute("type"))
             }
-            let parentLabel = '';
-
-            if (parentId && parentId !== "1") {
-                // Find the initial parent node
-                let currentParentNode = xmlDoc.querySelector(`object[id="${parentId}"]`);
-                if (debug) {
-                    console.log("ParentNode: " + currentParentNode.getAttribute("type"))
-                }
 
-                // Traverse ancestry if the parent isn't a "cps_component"
-                while (currentParentNode) {
-                    const parentType = currentParentNode.getAttribute('type');
-
-                    if (parentType === "cps_component") {
-                        // If it's a cps_component, retrieve its label
-                        parentLabel = currentParentNode.getAttribute('label') || '';
-                        break;
-                    } else if (parentType === "boundary") {
-                        // Handle "boundary" by finding an "owns" relationship
-                        // Get all 'object' elements with type="owns"
-                        // Get the ID of the current parent node
-                        const targetId = currentParentNode.getAttribute("id");
-
-                        // Get all 'object' elements with type="owns"
-                        const objects = xmlDoc.querySelectorAll('object[type="owns"]');
-
-                        let ownsEdge = null;
-
-                        // Loop through and find the correct object
-                        objects.forEach(obj => {
-                            const mxCell = obj.querySelector(`mxCell[target="${targetId}"]`);
-                            if (mxCell) {
-                                ownsEdge = obj; // Found the matching object
-                            }
-                        });
-
-                        // Log or use the `ownsEdge`
-                        if (ownsEdge) {
-                            console.log('Found node:', ownsEdge);
-                        } else {
-                            console.log('No matching node found.');
-                        }
+            // Traverse ancestry if the parent isn't a "cps_component"
+            while (currentParentNode) {
+                const parentType = currentParentNode.getAttribute('type');
+
+                if (parentType === "cps_component") {
+                    // If it's a cps_component, retrieve its label
+                    parentLabel = currentParentNode.getAttribute('label') || '';
+                    break;
+                } else if (parentType === "boundary") {
+                    // Handle "boundary" through the "owns" relationship that targets it
+                    const sourceId = index.ownerByBoundary.get(currentParentNode.getAttribute("id"));
+                    if (debug) {
+                        console.log('Source ID:', sourceId);
+                    }
 
-                        if (ownsEdge) {
-                            // Move to the next node in the relationship
-                            // Get the child mxCell of the ownsEdge node
-                            const mxCell = ownsEdge.querySelector('mxCell');
-
-                            if (mxCell) {
-                                // Get the 'source' attribute of the mxCell
-                                const sourceId = mxCell.getAttribute('source');
-                                console.log('Source ID:', sourceId);
-                                currentParentNode = xmlDoc.querySelector(`object[id="${sourceId}"]`);
-                                console.log("True parent: "+currentParentNode.getAttribute("label"));
-                                parentLabel = currentParentNode.getAttribute("label");
-                            } else {
-                                console.log('No mxCell found as a child of ownsEdge.');
+                    if (sourceId !== undefined) {
+                        // Move to the next node in the relationship
+                        currentParentNode = index.objectsById.get(sourceId) || null;
+                        if (currentParentNode) {
+                            parentLabel = currentParentNode.getAttribute("label");
+                            if (debug) {
+                                console.log("True parent: " + parentLabel);
                             }
-
-                            
-                        } else {
-                            // Stop if no valid "owns" edge is found
-                            currentParentNode = null;
                         }
                     } else {
-                        // For other types, stop the search
+                        // Stop if no valid "owns" edge is found
                         currentParentNode = null;
                     }
+                } else {
+                    // For other types, stop the search
+                    currentParentNode = null;
                 }
             }
+        }
 
+        //-----------------------------------------------------------------------------------
+        /**
+        * 🛠️ User-facing type label mapping (customization layer)
+        *
+        * This map customizes the display names of element types in the form shown
+        * during the PIM → PSM transformation. It only affects the GUI (not the model logic).
+        *
+        * To change the label for a construct, uncomment its entry and provide a new value.
+        * Keys must match the lowercase 'type' value used internally in the XML model.
+        *
+        * Available types you may customize:
+        *  - operational_goal
+        *  - action
+        *  - hw_resource
+        *  - sw_resource
+        *  - comm_thread
+        *  - comm_listener
+        *  - and_refinement_operator
+        *  - or_refinement_operator
+        *  - relation
+        *  - comm_relation
+        *  - cpc_container
+        */
+
+        const typeLabelMap = {
+            "operational_goal": "on interval action",
+            "action": "on demand action",
+            "comm_thread": "message sender",
+            "comm_listener": "message receiver",
+            "cpc_container": "cp component"
+
+            // To customize more types, just uncomment and rename as desired:
+            // "hw_resource": "hw_resource",
+            // "sw_resource": "sw_resource",
+            // "and_refinement_operator": "and_ref",
+            // "or_refinement_operator": "or_ref",
+            // "relation": "rel",
+            // "comm_relation": "comm_rel"
+        };
 
-            // Compose the legend text
-            //const legendText = parentLabel
-            //    ? `${parentLabel} > ${type.charAt(0).toUpperCase() + type.slice(1)}: ${label}`
-            //    : `${type.charAt(0).toUpperCase() + type.slice(1)}: ${label}`;
-            
-            //-----------------------------------------------------------------------------------
-            /**
-            * 🛠️ User-facing type label mapping (customization layer)
-            * 
-            * This map customizes the display names of element types in the form shown
-            * during the PIM → PSM transformation. It only affects the GUI (not the model logic).
-            * 
-            * To change the label for a construct, uncomment its entry and provide a new value.
-            * Keys must match the lowercase 'type' value used internally in the XML model.
-            * 
-            * Available types you may customize:
-            *  - operational_goal
-            *  - action
-            *  - hw_resource
-            *  - sw_resource
-            *  - comm_thread
-            *  - comm_listener
-            *  - and_refinement_operator
-            *  - or_refinement_operator
-            *  - relation
-            *  - comm_relation
-            *  - cpc_container
-            */
-
-            const typeLabelMap = {
-                "operational_goal": "on interval action",
-                "action": "on demand action",
-                "comm_thread": "message sender",
-                "comm_listener": "message receiver",
-                "cpc_container": "cp component"
-                
-                // To customize more types, just uncomment and rename as desired:
-                // "hw_resource": "hw_resource",
-                // "sw_resource": "sw_resource",
-                // "and_refinement_operator": "and_ref",
-                // "or_refinement_operator": "or_ref",
-                // "relation": "rel",
-                // "comm_relation": "comm_rel"
-            };
-
-
-            // Normalizes the type by removing any suffix or additional description.
-            const baseType = type.split(":")[0].trim().toLowerCase(); // e.g., "Comm_thread: Dato ..." → "comm_thread"
-            const readableType = typeLabelMap[baseType] || baseType;
-            const legendText = parentLabel
-                ? `${parentLabel} > ${readableType}: ${label}`
-                : `${readableType}: ${label}`;
-            //-----------------------------------------------------------------------------------
-
-
-            // Create and style fieldset with legend
-            const fieldset = document.createElement('fieldset');
-            fieldset.classList.add('modal-fieldset');
-            const legend = document.createElement('legend');
-            legend.textContent = legendText;
-            legend.classList.add('modal-legend');
-            fieldset.appendChild(legend);
-
-            modification.attributes.forEach(attribute => {
-                // Check conditions for this specific attribute
-                let conditionsMet = true;
 
-                if (attribute.conditional) {
-                    const conditionalAttribute = Object.keys(attribute.conditional)[0];
-                    const conditionalValue = attribute.conditional[conditionalAttribute];
+        // Normalizes the type by removing any suffix or additional description.
+        const baseType = type.split(":")[0].trim().toLowerCase(); // e.g., "Comm_thread: Dato ..." → "comm_thread"
+        const readableType = typeLabelMap[baseType] || baseType;
+        const legendText = parentLabel
+            ? `${parentLabel} > ${readableType}: ${label}`
+            : `${readableType}: ${label}`;
+        //-----------------------------------------------------------------------------------
 
-                    if (debug) {
-                        console.log("----------------------------------------------");
-                        console.log("Node: " + getNodeAttribute(node, "label"));
-                        console.log("Attribute Name: " + attribute.name);
-                        console.log("Conditional attribute: " + conditionalAttribute);
-                        console.log("True Value: " + getNodeAttribute(node, conditionalAttribute));
-                        console.log("Conditional Value: " + conditionalValue);
-                    }
 
-                    conditionsMet = getNodeAttribute(node, conditionalAttribute) === conditionalValue;
+        // Create and style fieldset with legend
+        const fieldset = document.createElement('fieldset');
+        fieldset.classList.add('modal-fieldset');
+        const legend = document.createElement('legend');
+        legend.textContent = legendText;
+        legend.classList.add('modal-legend');
+        fieldset.appendChild(legend);
 
-                    if (debug) {
-                        console.log("Condition is met for attribute: " + conditionsMet);
-                        console.log("----------------------------------------------");
-                    }
-                }
+        // Only the attributes whose conditions are met
+        applicableAttributes(modifications[modIndex], node).forEach(attribute => {
+            const baseName = `modification_${modIndex}_element_${elemIndex}`;
+            fieldset.appendChild(createAttributeInputs(attribute, modIndex, elemIndex, baseName, node));
+        });
+        return fieldset;
+    }
 
-                // Only process the attribute if conditions are met
-                if (conditionsMet) {
-                    const baseName = `modification_${modIndex}_element_${elemIndex}`;
-                    const attributeInputs = createAttributeInputs(attribute, modIndex, elemIndex, baseName, node);
-                    fieldset.appendChild(attributeInputs);
+    // First element at or after a position that has questions to answer, or null past the last one
+    function nextEntry(modIndex, elemIndex) {
+        while (modIndex < index.matches.length) {
+            if (elemIndex < index.matches[modIndex].length) {
+                if (applicableAttributes(modifications[modIndex], index.matches[modIndex][elemIndex]).length > 0) {
+                    return { modIndex, elemIndex };
                 }
-            });
+                elemIndex++;
+            } else {
+                modIndex++;
+                elemIndex = 0;
+            }
+        }
+        return null;
+    }
 
-            // Only append fieldset if it has children beyond the legend
-            if (fieldset.children.length > 1) form.appendChild(fieldset);
-        });
-    });
+    // Only the page on screen has inputs; pageStarts holds the first element of each page reached so far
+    const pager = document.getElementById('questionnairePager');
+    const previousButton = document.getElementById('questionnairePreviousBtn');
+    const nextButton = document.getElementById('questionnaireNextBtn');
+    const pageStarts = [nextEntry(0, 0)];
+    let page = 0;
+
+    function renderPage() {
+        form.innerHTML = '';
+        let entry = pageStarts[page];
+        let shown = 0;
+        while (entry && shown < QUESTIONNAIRE_PAGE_SIZE) {
+            form.appendChild(createElementFieldset(entry.modIndex, entry.elemIndex));
+            shown++;
+            entry = nextEntry(entry.modIndex, entry.elemIndex + 1);
+        }
+        pageStarts[page + 1] = entry;
+
+        // The pager is only shown when the elements do not fit in one page
+        const first = page * QUESTIONNAIRE_PAGE_SIZE;
+        pager.style.display = page === 0 && !entry ? 'none' : 'flex';
+        document.getElementById('questionnairePageLabel').textContent = `Elements ${first + 1}–${first + shown}`;
+        previousButton.disabled = page === 0;
+        nextButton.disabled = !entry;
+        form.parentElement.scrollTop = 0;
+    }
 
+    previousButton.onclick = () => {
+        page--;
+        renderPage();
+    };
+    nextButton.onclick = () => {
+        page++;
+        renderPage();
+    };
+    renderPage();
 }
 
 
@@ -757,45 +873,29 @@ document.getElementById('submitAttributesBtn').addEventListener('click', functio
     }
 });
 
-// Function to collect all form data, including complex types
+// Function to collect the answers of the questionnaire, including the fields of pages that were never shown
 function collectFormData() {
-    const formData = new FormData(document.getElementById('questionnaireForm'));
     const data = {};
+    const index = questionnaireIndex;
+    if (!index) {
+        return data;
+    }
 
-    // Convert FormData to a plain object for easier handling
-    formData.forEach((value, key) => {
-        data[key] = value;
-    });
+    // A field and the fields of its nested additional attributes, as the form names them
+    function collectField(attribute, baseName, node) {
+        const name = `${baseName}_${attribute.name}`;
+        data[name] = questionnaireAnswer(name, attribute, node);
+        if (attribute.additionalAttribute) {
+            collectField(attribute.additionalAttribute.attribute, name, node);
+        }
+    }
 
-    // Collect data from tables (parametersTable)
-    document.querySelectorAll('.modal-parameters-table-container table').forEach(table => {
-        const rows = Array.from(table.querySelectorAll('tr')).slice(1); // Exclude header row
-        const headers = Array.from(table.querySelector('tr').querySelectorAll('th')).map(th => th.textContent.trim()); // Extract headers
-
-        const tableData = rows.map(row => {
-            const rowData = {};
-            Array.from(row.querySelectorAll('td')).forEach((cell, index) => {
-                // Use header as key if it exists and match to the cell value
-                if (index < headers.length - 1) { // Exclude the last column (Remove button)
-                    const header = headers[index].toLowerCase();
-                    const input = cell.querySelector('input, select'); // Collect value from input or select
-                    if (input) {
-                        rowData[header] = input.value;
-                    }
-                }
+    index.matches.forEach((nodes, modIndex) => {
+        nodes.forEach((node, elemIndex) => {
+            applicableAttributes(index.modifications[modIndex], node).forEach(attribute => {
+                collectField(attribute, `modification_${modIndex}_element_${elemIndex}`, node);
             });
-            return rowData;
         });
-
-        // Store table data using table's unique ID as key
-        data[table.id] = tableData;
-    });
-
-    // Collect data from conditional attributes
-    document.querySelectorAll('textarea').forEach(textarea => {
-        if (textarea.style.display !== 'none') { // Only include visible textareas
-            data[textarea.name] = textarea.value;
-        }
     });
 
     return data;
@@ -817,7 +917,8 @@ async function loadPresetFiles(preset) {
     xsltFiles = await Promise.all(
         presetData.xslt.map(path => fetch(path).then(res => res.text()).then(content => ({
             name: path.split('/').pop(),
-            content
+            content,
+            preset: true
         })))
     );
 
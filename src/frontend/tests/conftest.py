@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The frontend modules are imported by name, as when the app is run from src/frontend
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,117 @@
+from unittest import mock
+
+import pytest
+from prometheus_client import REGISTRY
+
+import app as frontend
+
+
+class BackendResponse:
+    """Stands in for the streamed requests.Response of a backend call."""
+
+    def __init__(self, body=b'{"status": "running"}'):
+        self.status_code = 200
+        self.headers = {'Content-Type': 'application/json'}
+        self.body = body
+        self.closed = 0
+        self.sent = None
+
+    def iter_content(self, chunk_size=1):
+        for position in range(0, len(self.body), chunk_size):
+            yield self.body[position:position + chunk_size]
+
+    def close(self):
+        self.closed += 1
+
+
+def in_flight():
+    return REGISTRY.get_sample_value('frontend_proxy_in_flight')
+
+
+@pytest.fixture
+def backend():
+    response = BackendResponse()
+
+    def request(method, url, data=None, **kwargs):
+        # Read a streamed body while the request is sent, as requests does
+        if data is not None:
+            response.sent = data.read()
+        return response
+
+    with mock.patch.object(frontend.backend_session, 'request', side_effect=request):
+        yield response
+
+
+@pytest.fixture
+def client():
+    return frontend.app.test_client()
+
+
+def test_get_relays_the_body_and_releases_the_connection(client, backend):
+    before = in_flight()
+    result = client.get('/jobs/abc')
+    assert result.status_code == 200
+    assert result.data == backend.body
+    result.close()  # the WSGI server closes the response once it is sent
+    assert backend.closed == 1
+    assert in_flight() == before
+
+
+def test_head_releases_the_connection(client, backend):
+    before = in_flight()
+    result = client.head('/jobs/abc')
+    assert result.status_code == 200
+    assert result.data == b''
+    result.close()
+    assert backend.closed == 1
+    assert in_flight() == before
+
+
+def test_unread_body_releases_the_connection(client, backend):
+    before = in_flight()
+    result = client.get('/jobs/abc', buffered=False)
+    assert in_flight() == before + 1
+    result.close()  # the client goes away without reading the body
+    assert backend.closed == 1
+    assert in_flight() == before
+
+
+@pytest.mark.parametrize('path', ['/transform', '/pipeline', '/jobs'])
+def test_raw_xml_is_streamed_with_its_query(client, backend, path):
+    backend.headers['X-Validation'] = '{"conforms": true, "violations": 0, "shapes": {}}'
+    result = client.post(f'{path}?stylesheet=CIM-PIM.xsl&validate=true&platform=arduino', data='<mxfile/>',
+                         content_type='application/xml')
+    call = frontend.backend_session.request.call_args
+    assert call.args == ('POST', f'{frontend.BACKEND_URL}{path}')
+    assert 'json' not in call.kwargs
+    assert call.kwargs['params'].to_dict(flat=False) == {
+        'stylesheet': ['CIM-PIM.xsl'], 'validate': ['true'], 'platform': ['arduino']}
+    assert call.kwargs['headers']['Content-Type'] == 'application/xml'
+    assert backend.sent == b'<mxfile/>'
+    assert result.headers['X-Validation'] == backend.headers['X-Validation']
+    result.close()
+
+
+@pytest.mark.parametrize('path', ['/pipeline', '/jobs'])
+def test_validate_flag_is_proxied(client, backend, path):
+    result = client.post(path, json={'inputXML': '<mxfile/>', 'stylesheets': [{'id': 'CIM-PIM.xsl'}], 'validate': True})
+    payload = frontend.backend_session.request.call_args.kwargs['json']
+    assert payload['validate'] is True
+    assert 'validate' not in payload['parameters']
+    result.close()
+
+    result = client.post(path, json={'inputXML': '<mxfile/>', 'stylesheets': [{'id': 'CIM-PIM.xsl'}]})
+    assert frontend.backend_session.request.call_args.kwargs['json']['validate'] is False
+    result.close()
+
+
+def test_transform_accepts_an_uploaded_stylesheet(client, backend):
+    stylesheet = '<xsl:stylesheet version="3.0" xmlns:xsl="http://www.w3.org/1999/XSL/Transform"/>'
+    result = client.post('/transform', json={'inputXML': '<mxfile/>', 'stylesheet': {'content': stylesheet},
+                                             'pretty': True})
+    assert frontend.backend_session.request.call_args.kwargs['json'] == {
+        'inputXML': '<mxfile/>', 'xslTransformation': stylesheet, 'pretty': True}
+    result.close()
+
+    result = client.post('/transform', json={'inputXML': '<mxfile/>', 'stylesheet': {'id': '../app.py'}})
+    assert result.status_code == 400